@@ -0,0 +1,256 @@
+"""
+Rebuilds the economy_data and market_news snapshots of past days, e.g. after an outage.
+
+The missing days of every source are split into chunks of consecutive days, which run on a pool of
+processes, each with its own database connection and a bounded HTTP connection pool. Every day is
+checkpointed in backfill_progress in the transaction that publishes its snapshot, so a backfill that
+was interrupted only loads the days still missing when started again. Days that already have a
+snapshot are left as they are.
+
+Backfilled snapshots are attached next to the existing ones. Like every earlier snapshot they are
+archived to ARCHIVE_ROOT and dropped by the next regular run, so a backfill refuses to start without
+it. Days are only begun and published while holding the ingest lock, for the moment that takes, so
+regular runs can't drop partitions in the middle of it, and only find the lock taken for that moment
+rather than for the whole backfill.
+
+econdb keeps no history of revisions, so a past day's economy snapshot holds the current values of
+the observations dated up to that day. News of a past day is requested with mediastack's date filter.
+
+Usage:
+    python backfill.py --start 2024-03-01 --end 2024-03-31 --sources economy news --processes 4
+"""
+import atexit
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from main import INGEST_LOCK, get_registry, new_cache, indicator_batches
+from config.settings import get_settings
+from src.runtime import RuntimeContext
+from src.database.db import Database
+from src.database.db_utils import (create_tables, is_partitioned_table, get_partitions, partition_day, begin_snapshot,
+                                  publish_snapshot, load_data, get_backfilled_days, mark_backfilled,
+                                  ECONOMY_DATA_COLUMNS, MARKET_NEWS_COLUMNS)
+from src.database.shards import try_advisory_lock
+from src.scripts.dedup import drop_near_duplicates
+from src.scripts.market_news import get_news_data
+from src.scripts.planner import plan_backfill
+
+
+logger = logging.getLogger("NewsAndInfo")
+
+# table and columns every source is backfilled into
+SOURCES = {
+    'economy': ('economy_data', ECONOMY_DATA_COLUMNS),
+    'news': ('market_news', MARKET_NEWS_COLUMNS),
+}
+
+# advisory lock held by a running backfill
+BACKFILL_LOCK = 'backfill'
+
+# runtime of a worker process, created by init_worker
+_runtime: Optional[RuntimeContext] = None
+
+
+def lock_ingest(conn) -> None:
+    """Waits for the ingest lock of regular runs and holds it until the caller's transaction ends."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (INGEST_LOCK,))
+
+
+def begin_day(conn, table_name: str, day: date) -> str:
+    """Prepares the table a backfilled day's snapshot is loaded into, see begin_snapshot."""
+
+    lock_ingest(conn)
+    return begin_snapshot(conn, table_name, day)
+
+
+def publish_day(conn, source: str, target: str, day: date, rows: int) -> None:
+    """Attaches a backfilled snapshot next to the others and checkpoints its day, in one transaction."""
+
+    lock_ingest(conn)
+    publish_snapshot(conn, SOURCES[source][0], target, day, replace=False)
+    mark_backfilled(conn, source, day, rows)
+
+
+def load_day(data, conn, source: str, day: date) -> None:
+    """Loads and publishes the snapshot of a single day, runs on the database thread."""
+
+    table_name, columns = SOURCES[source]
+    target = begin_day(conn, table_name, day)
+    load_data(data, conn, table_name=target, columns=columns)
+    publish_day(conn, source, target, day, len(data))
+
+
+def load_as_of(economy_data, conn, targets: dict) -> dict:
+    """
+    Loads the observations of a batch into the snapshot of every day, up to that day.
+
+    Returns:
+        Number of observations loaded for every day.
+    """
+
+    rows = {}
+    for day, target in targets.items():
+        snapshot = economy_data.as_of(day)
+        load_data(snapshot, conn, table_name=target, columns=ECONOMY_DATA_COLUMNS)
+        rows[day] = len(snapshot)
+    return rows
+
+
+async def backfill_economy(runtime: RuntimeContext, days: List[date]) -> int:
+    """
+    Fetches the indicators once and loads the economy snapshot of every day of a chunk from them.
+
+    Batches are loaded into all the chunk's snapshots as they are fetched, every snapshot is published
+    once the last batch is in.
+
+    Returns:
+        Number of loaded observations.
+    """
+
+    cache = new_cache()
+    targets = {}
+    for day in days:
+        targets[day] = await runtime.db.transaction(begin_day, table_name='economy_data', day=day)
+
+    rows = dict.fromkeys(days, 0)
+    batches = indicator_batches(cache, runtime.get_session(), get_registry())
+    async for batch in batches:
+        loaded = await runtime.db.transaction(load_as_of, batch, targets=targets)
+        for day in days:
+            rows[day] += loaded[day]
+
+    for day in days:
+        await runtime.db.transaction(publish_day, source='economy', target=targets[day], day=day, rows=rows[day])
+    return sum(rows.values())
+
+
+async def backfill_news(runtime: RuntimeContext, days: List[date]) -> int:
+    """
+    Fetches and loads the news of every day of a chunk, one day after the other.
+
+    Returns:
+        Number of loaded articles.
+    """
+
+    rows = 0
+    for day in days:
+        news_data = await get_news_data(session=runtime.get_session(), day=day)
+        news_data, _ = drop_near_duplicates(news_data, (), threshold=get_settings().news_dedup_threshold)
+        await runtime.db.transaction(load_day, news_data, source='news', day=day)
+        rows += len(news_data)
+    return rows
+
+
+def init_worker(concurrency: int) -> None:
+    """Creates the runtime of a worker process, with at most concurrency requests in flight, closed on exit."""
+
+    global _runtime
+    settings = get_settings()
+    _runtime = RuntimeContext(
+        db_params=settings.db_params,
+        pool_limit=concurrency,
+        pool_limit_per_host=concurrency,
+        dns_ttl=settings.http_dns_ttl,
+        keepalive_timeout=settings.http_keepalive_timeout,
+        db_max_idle=settings.db_max_idle,
+    )
+    atexit.register(_runtime.close)
+
+
+def run_chunk(source: str, days: List[date]) -> int:
+    """Backfills a chunk in a worker process, returns the number of loaded rows."""
+
+    backfill = backfill_economy if source == 'economy' else backfill_news
+    return _runtime.run(backfill(_runtime, days))
+
+
+def pending_chunks(conn, sources: List[str], start: date, end: date, chunk_days: int) -> list:
+    """Returns the chunks of days every source still misses, checkpointed or published days are left out."""
+
+    done = {}
+    for source in sources:
+        table_name, _ = SOURCES[source]
+        if not is_partitioned_table(conn, table_name):
+            raise ValueError(f"{table_name} isn't partitioned by day, it can't hold backfilled snapshots.")
+        published = {partition_day(partition) for partition in get_partitions(conn, table_name)}
+        done[source] = get_backfilled_days(conn, source, start, end) | published
+    return plan_backfill(sources, start, end, done, chunk_days)
+
+
+def backfill(sources: List[str], start: date, end: date, processes: int, chunk_days: int, concurrency: int) -> bool:
+    """
+    Backfills sources between start and end, both inclusive.
+
+    Returns:
+        Whether every chunk was loaded, a backfill that wasn't can be started again to load the rest.
+    """
+
+    if get_settings().archive_root is None:
+        logger.error("ARCHIVE_ROOT is not set, the next run would drop the backfilled snapshots without archiving.")
+        return False
+
+    db = Database(**get_settings().db_params)
+    conn = db.get_connection()
+    try:
+        create_tables(conn)
+        conn.commit()
+        # chunks of two backfills at once would load the same days, the lock is held until disconnecting
+        if not try_advisory_lock(conn, BACKFILL_LOCK):
+            logger.warning("Another backfill is in progress, exiting.")
+            return False
+
+        try:
+            chunks = pending_chunks(conn, sources, start, end, chunk_days)
+        except ValueError as error:
+            logger.error(error)
+            return False
+        conn.commit()
+        logger.info(f"Backfilling {sum(len(chunk.days) for chunk in chunks)} missing days in {len(chunks)} chunks.")
+
+        failed = 0
+        # workers import main afresh, with runtimes of their own
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_worker,
+                                 initargs=(concurrency,)) as pool:
+            futures = {pool.submit(run_chunk, chunk.source, chunk.days): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                label = f"{chunk.source} {chunk.days[0]}..{chunk.days[-1]}"
+                try:
+                    logger.info(f"Backfilled {label}, loaded {future.result()} rows.")
+                except Exception as error:
+                    failed += 1
+                    logger.error(f"Backfilling {label} failed: {error}")
+    finally:
+        db.disconnect()
+
+    if failed:
+        logger.error(f"{failed} of {len(chunks)} chunks failed, start the backfill again to load them.")
+    return not failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', type=date.fromisoformat, required=True, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day, YYYY-MM-DD, yesterday when not given')
+    parser.add_argument('--sources', nargs='+', choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument('--processes', type=int, default=4, help='number of worker processes')
+    parser.add_argument('--chunk-days', type=int, default=7,
+                        help='days per chunk, the indicators are fetched once per chunk')
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight per worker process')
+    args = parser.parse_args()
+
+    today = datetime.today().date()
+    end = args.end or today - timedelta(days=1)
+    if end >= today:
+        parser.error("today's snapshots are loaded by the regular run, end the backfill before today")
+    if args.start > end:
+        parser.error("start is after end")
+
+    raise SystemExit(0 if backfill(args.sources, args.start, end, args.processes, args.chunk_days,
+                                   args.concurrency) else 1)
@@ -0,0 +1,73 @@
+"""
+Compares decoding econdb and mediastack payloads with stdlib json against the typed schema decoders.
+
+Recorded payloads can be passed with --econdb/--news, otherwise synthetic payloads of the given size
+are generated. The typed path uses msgspec or orjson when installed, see src/scripts/schemas.py.
+
+Usage:
+    python -m benchmarks.bench_decode --points 5000 --articles 100
+    python -m benchmarks.bench_decode --econdb CPIUS.json --news technology.json
+"""
+import json
+import time
+import random
+import argparse
+from datetime import date, timedelta
+from src.scripts import schemas
+from src.scripts.schemas import EconSeries, NewsPage, decode_payload
+
+
+def synthetic_econdb(points: int) -> bytes:
+    start = date(1950, 1, 1)
+    dates = [(start + timedelta(days=30 * i)).isoformat() for i in range(points)]
+    values = [None if i % 50 == 0 else round(random.uniform(0, 1000), 3) for i in range(points)]
+    return json.dumps({'ticker': 'SYNTH', 'description': 'Synthetic series',
+                       'data': {'dates': dates, 'values': values}}).encode()
+
+
+def synthetic_news(articles: int) -> bytes:
+    data = [{'author': None, 'title': f"Headline {i}", 'description': 'Lorem ipsum dolor sit amet. ' * 8,
+             'url': f"https://example.com/news/{i}", 'source': 'example', 'image': None,
+             'category': 'business', 'language': 'en', 'country': 'us',
+             'published_at': '2023-04-07T10:00:00+00:00'} for i in range(articles)]
+    return json.dumps({'pagination': {'limit': articles, 'offset': 0, 'count': articles, 'total': articles},
+                       'data': data}).encode()
+
+
+def best_of(function, repeat: int, number: int) -> float:
+    """Returns the best time in microseconds of a single call."""
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--econdb', help='recorded econdb series payload')
+    parser.add_argument('--news', help='recorded mediastack news payload')
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--articles', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    payloads = {
+        'econdb': (open(args.econdb, 'rb').read() if args.econdb else synthetic_econdb(args.points), EconSeries),
+        'news': (open(args.news, 'rb').read() if args.news else synthetic_news(args.articles), NewsPage),
+    }
+    backend = 'msgspec' if schemas.msgspec else 'orjson' if schemas.orjson else 'json'
+
+    for name, (body, schema) in payloads.items():
+        baseline = best_of(lambda: json.loads(body), args.repeat, args.number)
+        typed = best_of(lambda: decode_payload(body, schema), args.repeat, args.number)
+        print(f"{name:>7} ({len(body):,} bytes): json.loads {baseline:10,.1f} us | "
+              f"typed ({backend}) {typed:10,.1f} us | {baseline / typed:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
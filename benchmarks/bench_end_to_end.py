@@ -0,0 +1,232 @@
+"""
+Offline end-to-end benchmark of the fetch, dedup and load stages of main.tasks.
+
+A local aiohttp server, running in its own process, stands in for econdb and mediastack and serves
+synthetic payloads of configurable size with injected latency. The real get_all_indicators_data and
+get_news_data fetch from it. When the DB_* environment variables are set, the data is also loaded
+into temporary tables with the same loaders main.py uses; otherwise the load stage is skipped.
+
+Wall time, per-stage time, rows/sec and peak RSS are printed and saved as JSON under --output-dir,
+and --compare prints the change against an earlier result file.
+
+Usage:
+    python -m benchmarks.bench_end_to_end --series 200 --points 2000 --latency-ms 50
+    python -m benchmarks.bench_end_to_end --compare benchmarks/results/<earlier>.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import multiprocessing
+from datetime import date, datetime, timedelta
+from aiohttp import web
+from src.scripts.economy_data import get_all_indicators_data
+from src.scripts.market_news import get_news_data
+from src.scripts.dedup import drop_near_duplicates
+
+
+CATEGORIES = ['technology', 'science', 'business', 'health', 'sports', 'entertainment', 'general']
+WORDS = ['market', 'rates', 'inflation', 'growth', 'bank', 'earnings', 'oil', 'stocks', 'bond', 'yield',
+         'jobs', 'trade', 'chip', 'energy', 'housing', 'retail', 'dollar', 'gold', 'crypto', 'policy']
+
+
+def make_app(points: int, total_articles: int, latency: float) -> web.Application:
+    """Builds the stand-in server. Payloads are derived from the request, so runs are reproducible."""
+
+    async def series(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        symbol = request.match_info['symbol']
+        rng = random.Random(symbol)
+        start = date(2023, 1, 1) - timedelta(days=30 * points)
+        return web.json_response({
+            'ticker': symbol,
+            'description': f"Synthetic series {symbol}",
+            'data': {
+                'dates': [(start + timedelta(days=30 * i)).isoformat() for i in range(points)],
+                'values': [None if i % 97 == 0 else round(rng.uniform(0, 1000), 3) for i in range(points)],
+            },
+        })
+
+    async def news(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        category = request.query['categories']
+        offset, limit = int(request.query.get('offset', 0)), int(request.query.get('limit', 25))
+        articles = []
+        for i in range(offset, min(offset + limit, total_articles)):
+            rng = random.Random(f"{category}{i}")
+            articles.append({
+                'author': None,
+                'title': ' '.join(rng.choices(WORDS, k=8)),
+                'description': ' '.join(rng.choices(WORDS, k=40)),
+                'url': f"https://news.example.com/{category}/{i}?utm_source=feed",
+                'source': 'example', 'image': None, 'category': category, 'language': 'en', 'country': 'us',
+                'published_at': '2023-01-01T00:00:00+00:00',
+            })
+        return web.json_response({'pagination': {'limit': limit, 'offset': offset, 'count': len(articles),
+                                                 'total': total_articles}, 'data': articles})
+
+    app = web.Application()
+    app.router.add_get('/api/series/{symbol}/', series)
+    app.router.add_get('/v1/news', news)
+    return app
+
+
+def serve(port: int, points: int, total_articles: int, latency: float) -> None:
+    web.run_app(make_app(points, total_articles, latency), host='127.0.0.1', port=port, print=None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Stand-in server didn't start.")
+
+
+def load(economy_data, news_data) -> dict:
+    """Loads both data sets into temporary tables and returns the time each load took."""
+
+    from config.settings import get_settings
+    from src.database.db import Database
+    from src.database.db_utils import load_data, ECONOMY_DATA_COLUMNS, MARKET_NEWS_COLUMNS
+
+    db = Database(**get_settings().db_params)
+    conn = db.get_connection()
+    timings = {}
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE economy_data (ticker_name VARCHAR(40) NOT NULL, dates DATE NOT NULL, "
+                           "values FLOAT, date_created DATE NOT NULL, "
+                           "PRIMARY KEY (ticker_name, dates, date_created))")
+            cursor.execute("CREATE TEMP TABLE market_news (id SERIAL PRIMARY KEY, title TEXT, description TEXT, "
+                           "url TEXT, source TEXT, image TEXT, category VARCHAR(20), language VARCHAR(10), "
+                           "country VARCHAR(5), url_hash CHAR(40), date_created DATE NOT NULL)")
+        start = time.perf_counter()
+        load_data(economy_data, conn, 'economy_data', ECONOMY_DATA_COLUMNS)
+        timings['load_economy'] = time.perf_counter() - start
+        start = time.perf_counter()
+        load_data(news_data, conn, 'market_news', MARKET_NEWS_COLUMNS)
+        timings['load_news'] = time.perf_counter() - start
+    finally:
+        conn.rollback()
+        db.disconnect()
+    return timings
+
+
+async def fetch(port: int, series: int, categories: dict) -> tuple:
+    """Runs both fetchers concurrently against the stand-in server and returns their data and timings."""
+
+    indicators = [{'symbol': f"S{i:05d}", 'url': f"http://127.0.0.1:{port}/api/series/S{i:05d}/?format=json",
+                   'frequency': 'M'} for i in range(series)]
+    timings = {}
+
+    async def timed(name, coroutine):
+        start = time.perf_counter()
+        result = await coroutine
+        timings[name] = time.perf_counter() - start
+        return result
+
+    economy_data, news_data = await asyncio.gather(
+        timed('fetch_economy', get_all_indicators_data(indicators=indicators)),
+        timed('fetch_news', get_news_data(categories=categories, base_url=f"http://127.0.0.1:{port}/v1/news",
+                                          api_key='benchmark')),
+    )
+    return economy_data, news_data, timings
+
+
+def run(args: argparse.Namespace) -> dict:
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port, args.points, args.articles, args.latency_ms / 1000),
+                                     daemon=True)
+    server.start()
+    try:
+        wait_for_port(port)
+        categories = {category: args.articles for category in CATEGORIES[:args.categories]}
+
+        start = time.perf_counter()
+        economy_data, news_data, stages = asyncio.run(fetch(port, args.series, categories))
+
+        dedup_start = time.perf_counter()
+        news_data, _ = drop_near_duplicates(news_data, [])
+        stages['dedup_news'] = time.perf_counter() - dedup_start
+
+        if os.environ.get('DB_HOST') and not args.no_db:
+            stages.update(load(economy_data, news_data))
+        wall = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.join()
+
+    rows = len(economy_data) + len(news_data)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'python': sys.version.split()[0],
+        'params': {'series': args.series, 'points': args.points, 'categories': args.categories,
+                   'articles': args.articles, 'latency_ms': args.latency_ms},
+        'rows': {'economy': len(economy_data), 'news': len(news_data)},
+        'wall_seconds': wall,
+        'stage_seconds': stages,
+        'rows_per_second': rows / wall,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def report(result: dict, previous: dict = None) -> None:
+    def line(name, value, old, unit):
+        change = f"  ({(value - old) / old:+.1%})" if old else ''
+        print(f"{name:>16}: {value:12,.3f} {unit}{change}")
+
+    previous = previous or {}
+    print(f"rows: {result['rows']['economy']:,} economy, {result['rows']['news']:,} news")
+    line('wall', result['wall_seconds'], previous.get('wall_seconds'), 's')
+    for stage, seconds in result['stage_seconds'].items():
+        line(stage, seconds, previous.get('stage_seconds', {}).get(stage), 's')
+    line('rows/sec', result['rows_per_second'], previous.get('rows_per_second'), '')
+    line('peak rss', result['peak_rss_mb'], previous.get('peak_rss_mb'), 'MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--series', type=int, default=100, help='number of econdb series')
+    parser.add_argument('--points', type=int, default=1000, help='observations per series')
+    parser.add_argument('--categories', type=int, default=4, choices=range(1, len(CATEGORIES) + 1))
+    parser.add_argument('--articles', type=int, default=300, help='articles per category')
+    parser.add_argument('--latency-ms', type=float, default=50, help='latency injected into every response')
+    parser.add_argument('--no-db', action='store_true', help='skip the load stage even if DB_* is set')
+    parser.add_argument('--label', default='')
+    parser.add_argument('--output-dir', default=os.path.join(os.path.dirname(__file__), 'results'))
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+
+    result = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+    report(result, previous)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    name = f"{result['created'].replace(':', '')}{'-' + args.label if args.label else ''}.json"
+    with open(os.path.join(args.output_dir, name), 'w') as result_file:
+        json.dump(result, result_file, indent=2)
+    print(f"saved {os.path.join(args.output_dir, name)}")
+
+
+if __name__ == '__main__':
+    main()
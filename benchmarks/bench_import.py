@@ -0,0 +1,71 @@
+"""
+Measures the cold-start import time of the lambda handler with python -X importtime.
+
+Every repeat imports the module in a fresh interpreter, with an empty environment so a missing
+setting can't fail the import. The median cumulative time is reported with the slowest modules
+imported along the way. The run fails when the median exceeds --max-ms, or when the import pulls
+in a module that should only load once a run needs it.
+
+Usage:
+    python -m benchmarks.bench_import --repeat 10
+    python -m benchmarks.bench_import --max-ms 200
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported by the runs themselves, never by importing the handler
+HEAVY_MODULES = ('aiohttp', 'psycopg2', 'numpy', 'pyarrow', 'dotenv', 'msgspec')
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Imports module in a fresh interpreter and returns the self and cumulative microseconds of every import."""
+
+    environ = {'PATH': os.environ.get('PATH', '')}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT, env=environ,
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='number of slowest modules to list')
+    parser.add_argument('--max-ms', type=float, help='fail when the median import time is higher')
+    args = parser.parse_args()
+
+    # the first import may write bytecode caches, it isn't timed
+    import_times(args.module)
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    median_ms = statistics.median(times[args.module][1] for times in runs) / 1000
+
+    print(f"import {args.module}: {median_ms:.1f} ms median of {args.repeat}")
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"  {name:<40} {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative")
+
+    failed = False
+    heavy = [name for name in HEAVY_MODULES if name in runs[-1]]
+    if heavy:
+        print(f"import {args.module} loads {', '.join(heavy)}, they should load when first used")
+        failed = True
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"import {args.module} takes {median_ms:.1f} ms, more than {args.max_ms:.1f} ms")
+        failed = True
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares rows/sec of the execute_batch and COPY load paths.
+
+Needs the same DB_* environment variables as main.py. Rows are loaded into a
+temporary table that only lives for the duration of the run.
+
+Usage:
+    python -m benchmarks.bench_insert --rows 100000 --repeat 3
+"""
+import time
+import argparse
+from datetime import date, timedelta
+from config.settings import get_settings
+from src.database.db import Database
+from src.database.db_utils import insert_data, copy_data, ECONOMY_DATA_COLUMNS
+
+
+def generate_rows(count: int) -> tuple:
+    """Returns economy_data shaped rows, with every tenth value set to NULL."""
+
+    today = date.today()
+    start = date(1950, 1, 1)
+    return tuple(
+        (f"TICKER{i % 500}", start + timedelta(days=i // 500), None if i % 10 == 0 else i * 0.25, today)
+        for i in range(count)
+    )
+
+
+def run(conn, rows: tuple, repeat: int) -> dict:
+    """Loads rows with both paths and returns the best rows/sec of each."""
+
+    insert_query = ('INSERT INTO bench_economy_data '
+                    '(ticker_name, dates, values, date_created) '
+                    'VALUES (%s, %s, %s, %s)')
+    loaders = {
+        'execute_batch': lambda: insert_data(rows, conn, insert_query),
+        'copy': lambda: copy_data(rows, conn, 'bench_economy_data', ECONOMY_DATA_COLUMNS),
+    }
+
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            CREATE TEMP TABLE bench_economy_data (
+                ticker_name VARCHAR(40) NOT NULL,
+                dates date NOT NULL,
+                values FLOAT,
+                date_created DATE NOT NULL,
+                PRIMARY KEY (ticker_name, dates, date_created)
+            )
+        ''')
+
+    results = {}
+    for name, loader in loaders.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            loader()
+            best = min(best, time.perf_counter() - start)
+            with conn.cursor() as cursor:
+                cursor.execute("TRUNCATE bench_economy_data")
+        results[name] = len(rows) / best
+
+    conn.rollback()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db = Database(**get_settings().db_params)
+    try:
+        results = run(db.get_connection(), generate_rows(args.rows), args.repeat)
+    finally:
+        db.disconnect()
+
+    for name, rows_per_sec in results.items():
+        print(f"{name:>14}: {rows_per_sec:>12,.0f} rows/sec")
+    print(f"{'speedup':>14}: {results['copy'] / results['execute_batch']:>12.1f}x")
+
+
+if __name__ == '__main__':
+    main()
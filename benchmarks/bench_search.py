@@ -0,0 +1,145 @@
+"""
+Compares keyword search latency of a sequential ILIKE scan and the GIN indexed full text search.
+
+Needs the same DB_* environment variables as main.py. Synthetic articles are loaded into a temporary
+table with the search_vector column and index of market_news, which only lives for the duration of
+the run. Word frequencies follow a Zipf distribution, so the queries cover common and rare terms.
+
+Usage:
+    python -m benchmarks.bench_search --rows 500000 --repeat 5
+"""
+import time
+import random
+import argparse
+from datetime import date, timedelta
+from config.settings import get_settings
+from src.database.db import Database
+from src.database.db_utils import copy_data, MARKET_NEWS_COLUMNS
+from src.database.queries import search_news
+
+CATEGORIES = ['technology', 'science', 'business', 'health', 'sports', 'entertainment', 'general']
+
+# search terms by rank in the vocabulary, from a word in most articles to one in a handful
+QUERIES = {'common': 0, 'frequent': 20, 'uncommon': 500, 'rare': 5000}
+
+
+def vocabulary(size: int) -> list:
+    """Returns size distinct made up words."""
+
+    syllables = ['ba', 'ko', 'ri', 'te', 'lu', 'mon', 'sa', 'vel', 'dor', 'ny', 'qua', 'pex']
+    words, number = [], 0
+    while len(words) < size:
+        word, rest = '', number
+        for _ in range(4):
+            word += syllables[rest % len(syllables)]
+            rest //= len(syllables)
+        words.append(word)
+        number += 1
+    return words
+
+
+def generate_rows(count: int, words: list, days: int) -> list:
+    """Returns market_news shaped rows with 8 word titles and 40 word descriptions, spread over days."""
+
+    rng = random.Random(0)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    today = date.today()
+    rows = []
+    for i in range(count):
+        text = rng.choices(words, weights=weights, k=48)
+        rows.append((
+            ' '.join(text[:8]).capitalize(), ' '.join(text[8:]), f"https://example.com/news/{i}", 'example',
+            None, CATEGORIES[i % len(CATEGORIES)], 'en', 'us', f"{i:040x}", today - timedelta(days=i % days)
+        ))
+    return rows
+
+
+def best_of(repeat: int, search) -> tuple:
+    """Runs search repeat times, returns the fastest time in milliseconds and the last results."""
+
+    best, results = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = search()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, results
+
+
+def run(conn, rows: list, words: list, repeat: int) -> dict:
+    """Times both searches of every query term, with and without a category filter."""
+
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            CREATE TEMP TABLE bench_market_news (
+                id SERIAL PRIMARY KEY,
+                title TEXT,
+                description TEXT,
+                url TEXT,
+                source TEXT,
+                image TEXT,
+                category VARCHAR(20),
+                language VARCHAR(10),
+                country VARCHAR(5),
+                url_hash CHAR(40),
+                date_created DATE NOT NULL,
+                search_vector tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('english', coalesce(description, '')), 'B')
+                ) STORED
+            )
+        ''')
+    copy_data(rows, conn, 'bench_market_news', MARKET_NEWS_COLUMNS)
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE INDEX ON bench_market_news USING GIN (search_vector)")
+        cursor.execute("ANALYZE bench_market_news")
+
+    def ilike(term: str, category):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''SELECT title, description, url, source, image, category, date_created
+                   FROM bench_market_news
+                   WHERE (title ILIKE %(pattern)s OR description ILIKE %(pattern)s)
+                     AND (%(category)s::varchar IS NULL OR category = %(category)s)
+                   ORDER BY date_created DESC, id DESC
+                   LIMIT 20''',
+                {'pattern': f"%{term}%", 'category': category}
+            )
+            return cursor.fetchall()
+
+    results = {}
+    for label, rank in QUERIES.items():
+        term = words[rank]
+        for category in (None, 'business'):
+            name = f"{label} {term}" + (f" in {category}" if category else '')
+            ilike_ms, _ = best_of(repeat, lambda: ilike(term, category))
+            search_ms, matches = best_of(repeat, lambda: search_news(conn, term, category=category,
+                                                                     table_name='bench_market_news'))
+            results[name] = {'ilike_ms': ilike_ms, 'search_ms': search_ms, 'matches': len(matches)}
+
+    conn.rollback()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--words', type=int, default=20_000, help='vocabulary size')
+    parser.add_argument('--days', type=int, default=30, help='snapshot days the articles are spread over')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db = Database(**get_settings().db_params)
+    words = vocabulary(args.words)
+    try:
+        results = run(db.get_connection(), generate_rows(args.rows, words, args.days), words, args.repeat)
+    finally:
+        db.disconnect()
+
+    print(f"{'query':>36} {'ilike ms':>10} {'search ms':>10} {'speedup':>8}")
+    for name, result in results.items():
+        speedup = result['ilike_ms'] / result['search_ms']
+        print(f"{name:>36} {result['ilike_ms']:>10.1f} {result['search_ms']:>10.1f} {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+# Derived metrics computed for every economy series at ingest, see src/scripts/derived.py.
+# kind: 'change' is the percent change against the observation `months` calendar months earlier,
+# 'rolling_mean' the mean and 'zscore' the standard score of the observations in the trailing `months` months.
+# frequencies: series frequencies the metric is computed for, all of them when left out.
+DERIVED_METRICS = {
+    'yoy': {'kind': 'change', 'months': 12},
+    'mom': {'kind': 'change', 'months': 1, 'frequencies': 'DWM'},
+    'mean_12m': {'kind': 'rolling_mean', 'months': 12},
+    'zscore_5y': {'kind': 'zscore', 'months': 60},
+}
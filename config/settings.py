@@ -0,0 +1,175 @@
+"""
+Runtime settings, read from the environment and an optional .env file.
+
+Every setting is read and validated once, when get_settings() is first called, instead of when
+modules are imported, and all invalid or missing values are reported together.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Mapping, Optional, Sequence
+
+
+class ConfigError(Exception):
+    """Custom exception for missing or invalid settings."""
+
+    def __init__(self, message) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Validated settings of the process, see load_settings for the environment variable of each."""
+
+    db_host: str
+    db_name: str
+    db_port: int
+    db_user: str
+    db_password: str
+    api_key: str
+    # 'snapshot' reloads every observation under today's date, 'incremental' merges only new or revised ones
+    economy_load_mode: str = 'snapshot'
+    # JSON lines file listing the indicators to track, config.urls.INDICATORS is used when not set
+    indicators_file: Optional[str] = None
+    # indicators are fetched and loaded economy_batch_size at a time
+    economy_batch_size: int = 200
+    # fetch econdb_tickers_per_request econdb series per request from the multi-series endpoint
+    econdb_multi_series: bool = False
+    econdb_tickers_per_request: int = 50
+    # split runs into that many economy shards, claimed by any number of concurrent workers (parallel
+    # invocations, or processes started with --workers), 0 runs everything in one process
+    ingest_shards: int = 0
+    # on-disk cache of econdb responses, /tmp is the only writable path in lambda and survives warm starts
+    http_cache_dir: str = '/tmp/econdb_cache'
+    http_cache_max_bytes: int = 64 * 1024 * 1024
+    http_cache_ttl: int = 6 * 60 * 60
+    # near-duplicate news detection, articles are compared with those loaded in the last news_dedup_days days
+    # (0 compares within today only, older days are only worth it while their articles are kept around)
+    news_dedup_days: int = 0
+    news_dedup_threshold: float = 0.7
+    # earlier snapshots are archived as Parquet files under archive_root, a directory or an s3:// URI, before
+    # they are dropped, needs pyarrow. Unset, they are dropped without archiving.
+    archive_root: Optional[str] = None
+    # 'record' stores every HTTP response under http_recording_dir, 'replay' serves them from there instead
+    # of the network, delayed by their recorded time times http_replay_latency_scale
+    http_recording_mode: Optional[str] = None
+    http_recording_dir: str = '/tmp/http_recording'
+    http_replay_latency_scale: float = 0
+    # profile the invocation with cProfile, the stats are written to profile_path
+    profile_run: bool = False
+    profile_path: str = '/tmp/tasks.prof'
+    # shared HTTP connection pool, kept alive with the database connection between warm invocations
+    http_pool_limit: int = 20
+    http_pool_limit_per_host: int = 8
+    http_dns_ttl: int = 300
+    http_keepalive_timeout: float = 60
+    # seconds the database connection may stay unused before it is health-checked, a warm invocation
+    # within that window reuses it without an extra round trip
+    db_max_idle: float = 30
+    # daemon mode (--daemon), seconds between refreshes of each source. Economy refreshes only fetch the
+    # indicators the planner finds due, so checking hourly still downloads each series about once a day.
+    news_refresh_interval: float = 15 * 60
+    economy_refresh_interval: float = 60 * 60
+    # seconds running refreshes get to finish when the daemon is asked to stop
+    daemon_shutdown_timeout: float = 120
+
+    @property
+    def db_params(self) -> dict:
+        """Keyword arguments for Database."""
+        return dict(host=self.db_host, database=self.db_name, user=self.db_user, password=self.db_password,
+                    port=self.db_port)
+
+
+_REQUIRED = object()
+_TRUE, _FALSE = ('1', 'true', 'yes', 'on'), ('', '0', 'false', 'no', 'off')
+
+
+def _flag(value: str) -> bool:
+    if value.lower() not in _TRUE + _FALSE:
+        raise ValueError(f"expected one of {', '.join(_TRUE + _FALSE[1:])}")
+    return value.lower() in _TRUE
+
+
+class _Reader:
+    """Reads environment variables, collecting every problem instead of stopping at the first one."""
+
+    def __init__(self, environ: Mapping[str, str]) -> None:
+        self.environ = environ
+        self.errors = []
+
+    def __call__(self, name: str, default=_REQUIRED, parse: Callable = str, choices: Optional[Sequence] = None,
+                 minimum: Optional[float] = None):
+        value = self.environ.get(name)
+        if value is None or (value == '' and default is not _REQUIRED):
+            if default is _REQUIRED:
+                self.errors.append(f"{name} is required")
+            return default
+
+        try:
+            parsed = parse(value)
+        except ValueError as error:
+            self.errors.append(f"{name}={value!r} is invalid: {error}")
+            return default
+        if choices is not None and parsed not in choices:
+            self.errors.append(f"{name}={value!r} is invalid, expected one of {', '.join(map(str, choices))}")
+        elif minimum is not None and parsed < minimum:
+            self.errors.append(f"{name}={value!r} is invalid, expected at least {minimum}")
+        return parsed
+
+
+def load_settings(environ: Mapping[str, str]) -> Settings:
+    """
+    Reads the settings from environ.
+
+    Raises:
+        ConfigError: Listing every missing or invalid setting.
+    """
+
+    read = _Reader(environ)
+    settings = Settings(
+        db_host=read('DB_HOST'),
+        db_name=read('DB_NAME'),
+        db_port=read('DB_PORT', parse=int, minimum=1),
+        db_user=read('DB_USER'),
+        db_password=read('DB_PASSWORD'),
+        api_key=read('API_KEY'),
+        economy_load_mode=read('ECONOMY_LOAD_MODE', 'snapshot', choices=('snapshot', 'incremental')),
+        indicators_file=read('INDICATORS_FILE', None),
+        economy_batch_size=read('ECONOMY_BATCH_SIZE', 200, parse=int, minimum=1),
+        econdb_multi_series=read('ECONDB_MULTI_SERIES', False, parse=_flag),
+        econdb_tickers_per_request=read('ECONDB_TICKERS_PER_REQUEST', 50, parse=int, minimum=1),
+        ingest_shards=read('INGEST_SHARDS', 0, parse=int, minimum=0),
+        http_cache_dir=read('HTTP_CACHE_DIR', '/tmp/econdb_cache'),
+        http_cache_max_bytes=read('HTTP_CACHE_MAX_BYTES', 64 * 1024 * 1024, parse=int, minimum=0),
+        http_cache_ttl=read('HTTP_CACHE_TTL', 6 * 60 * 60, parse=int, minimum=0),
+        news_dedup_days=read('NEWS_DEDUP_DAYS', 0, parse=int, minimum=0),
+        news_dedup_threshold=read('NEWS_DEDUP_THRESHOLD', 0.7, parse=float, minimum=0),
+        archive_root=read('ARCHIVE_ROOT', None),
+        http_recording_mode=read('HTTP_RECORDING_MODE', None, choices=('record', 'replay')),
+        http_recording_dir=read('HTTP_RECORDING_DIR', '/tmp/http_recording'),
+        http_replay_latency_scale=read('HTTP_REPLAY_LATENCY_SCALE', 0, parse=float, minimum=0),
+        profile_run=read('PROFILE_RUN', False, parse=_flag),
+        profile_path=read('PROFILE_PATH', '/tmp/tasks.prof'),
+        http_pool_limit=read('HTTP_POOL_LIMIT', 20, parse=int, minimum=1),
+        http_pool_limit_per_host=read('HTTP_POOL_LIMIT_PER_HOST', 8, parse=int, minimum=1),
+        http_dns_ttl=read('HTTP_DNS_TTL', 300, parse=int, minimum=0),
+        http_keepalive_timeout=read('HTTP_KEEPALIVE_TIMEOUT', 60, parse=float, minimum=0),
+        db_max_idle=read('DB_MAX_IDLE', 30, parse=float, minimum=0),
+        news_refresh_interval=read('NEWS_REFRESH_INTERVAL', 15 * 60, parse=float, minimum=1),
+        economy_refresh_interval=read('ECONOMY_REFRESH_INTERVAL', 60 * 60, parse=float, minimum=1),
+        daemon_shutdown_timeout=read('DAEMON_SHUTDOWN_TIMEOUT', 120, parse=float, minimum=0),
+    )
+    if read.errors:
+        raise ConfigError(f"Invalid configuration: {'; '.join(read.errors)}.")
+    return settings
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Returns the settings of the process, loading .env and reading the environment on first call."""
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return load_settings(os.environ)
@@ -1,100 +1,137 @@
+# frequency: how often the series gets a new observation, D(aily), W(eekly), M(onthly), Q(uarterly) or A(nnual).
+# An entry may also set refresh_days, the maximum number of days between fetches while no new observation
+# is due, to pick up revisions. It defaults to a value derived from the frequency, see src/scripts/planner.py.
+# Larger registries are kept in a JSON lines file instead, see src/scripts/registry.py.
 INDICATORS = [
     {
         "symbol": "RGDPUS",
         "name": "United States - Real gross domestic product",
         "geo": "United States",
         "unit": "Chained Dollars [Billions of chained (2012) dollars]",
-        "url": "https://www.econdb.com/api/series/RGDPUS/?format=json"
+        "url": "https://www.econdb.com/api/series/RGDPUS/?format=json",
+        "frequency": "Q"
     },
     {
         "symbol": "RGDPPCUS",
         "name": "United States - Real GDP per capita",
         "geo": "United States",
         "unit": "Chained Dollars [Billions of chained (2012) dollars]",
-        "url": "https://www.econdb.com/api/series/RGDPPCUS/?format=json"
+        "url": "https://www.econdb.com/api/series/RGDPPCUS/?format=json",
+        "frequency": "Q"
     },
     {
         "symbol": "CPIUS",
         "name": "United States - Consumer price index",
         "geo": "United States",
         "unit": "index 1982-1984=100",
-        "url": "https://www.econdb.com/api/series/CPIUS/?format=json"
+        "url": "https://www.econdb.com/api/series/CPIUS/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "PPIUS",
         "name": "United States - Producer price index",
         "geo": "United States",
         "unit": "Percent",
-        "url": "https://www.econdb.com/api/series/PPIUS/?format=json"
+        "url": "https://www.econdb.com/api/series/PPIUS/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "URATEUS",
         "name": "United States - Unemployment",
         "geo": "United States",
         "unit": "Percent",
-        "url": "https://www.econdb.com/api/series/URATEUS/?format=json"
+        "url": "https://www.econdb.com/api/series/URATEUS/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "CONFUS",
         "name": "United States - Consumer confidence index",
         "geo": "United States",
         "unit": "Percent",
-        "url": "https://www.econdb.com/api/series/CONFUS/?format=json"
+        "url": "https://www.econdb.com/api/series/CONFUS/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "RETAUS",
         "name": "United States - Retail trade",
         "geo": "United States",
         "unit": "Millions of Dollars",
-        "url": "https://www.econdb.com/api/series/RETAUS/?format=json"
+        "url": "https://www.econdb.com/api/series/RETAUS/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "Y10YDUS",
         "name": "United States - Long term yield",
         "geo": "United States",
         "unit": "Percent: Per Year",
-        "url": "https://www.econdb.com/api/series/Y10YDUS/?format=json"
+        "url": "https://www.econdb.com/api/series/Y10YDUS/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "RGDPIN",
         "name": "United States - Real gross domestic product",
         "geo": "India",
         "unit": "10 Million INR, at 2011-2012 prices",
-        "url": "https://www.econdb.com/api/series/RGDPIN/?format=json"
+        "url": "https://www.econdb.com/api/series/RGDPIN/?format=json",
+        "frequency": "Q"
     },
     {
         "symbol": "IMPIN",
         "name": "India - Imports of goods and services",
         "geo": "India",
         "unit": "10 Million INR, at current prices",
-        "url": "https://www.econdb.com/api/series/IMPIN/?format=json"
+        "url": "https://www.econdb.com/api/series/IMPIN/?format=json",
+        "frequency": "Q"
     },
     {
         "symbol": "EXPIN",
         "name": "India - Exports of goods and services",
         "geo": "India",
         "unit": "10 Million INR, at current prices",
-        "url": "https://www.econdb.com/api/series/EXPIN/?format=json"
+        "url": "https://www.econdb.com/api/series/EXPIN/?format=json",
+        "frequency": "Q"
     },
     {
         "symbol": "CPIIN",
         "name": "India - Consumer price index",
         "geo": "India",
         "unit": "index",
-        "url": "https://www.econdb.com/api/series/CPIIN/?format=json"
+        "url": "https://www.econdb.com/api/series/CPIIN/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "PPIIN",
         "name": "India - Producer price index",
         "geo": "India",
         "unit": "Index, 2011-12=100",
-        "url": "https://www.econdb.com/api/series/PPIIN/?format=json"
+        "url": "https://www.econdb.com/api/series/PPIIN/?format=json",
+        "frequency": "M"
     },
     {
         "symbol": "Y10YDIN",
         "name": "India - Long term yield",
         "geo": "India",
         "unit": "Percent",
-        "url": "https://www.econdb.com/api/series/Y10YDIN/?format=json"
+        "url": "https://www.econdb.com/api/series/Y10YDIN/?format=json",
+        "frequency": "M"
     },
 ]
+
+# series endpoint of econdb, used for registry entries without a url
+ECONDB_SERIES_URL = "https://www.econdb.com/api/series/{symbol}/?format=json"
+
+# econdb endpoint returning several series per request, paginated through the `next` link
+ECONDB_MULTI_SERIES_URL = "https://www.econdb.com/api/series/"
+
+NEWS_URL = "http://api.mediastack.com/v1/news"
+
+# articles fetched per category, newest first, in pages of at most NEWS_PAGE_SIZE
+NEWS_CATEGORIES = {
+    "technology": 100,
+    "science": 100,
+    "business": 100,
+    "health": 100,
+}
+
+# largest limit mediastack accepts for a single request
+NEWS_PAGE_SIZE = 100
@@ -1,22 +1,41 @@
 import os
 import sys
+import signal
+import socket
 import asyncio
 import logging
-from datetime import datetime
-from dotenv import load_dotenv
-from src.database.db import Database
-from src.database.db_utils import create_tables, insert_data, delete_old_data, get_latest_date_created
-from src.scripts.economy_data import get_all_indicators_data
-from src.scripts.market_news import get_news_data
+import argparse
+import multiprocessing
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Sequence
+from config.settings import get_settings
+from src.lazy import lazy_import
+from src.scheduler import Scheduler
+from src.metrics import Metrics, span, traced, profiled
+from src.scripts.cache import ResponseCache
+from src.scripts.registry import IndicatorRegistry
 
+if TYPE_CHECKING:
+    from src.runtime import RuntimeContext
+    from src.database.async_db import AsyncDatabase
+    from src.database.shards import Shard
+    from src.scripts.replay import Recording
 
-load_dotenv()
+# loaded when first used, importing the handler doesn't import aiohttp, psycopg2, numpy or pyarrow
+db_utils = lazy_import('src.database.db_utils')
+shards = lazy_import('src.database.shards')
+queries = lazy_import('src.database.queries')
+economy = lazy_import('src.scripts.economy_data')
+market_news = lazy_import('src.scripts.market_news')
+planner = lazy_import('src.scripts.planner')
+dedup = lazy_import('src.scripts.dedup')
+derived = lazy_import('src.scripts.derived')
 
-DB_HOST = os.environ['DB_HOST']
-DB_NAME = os.environ['DB_NAME']
-DB_PORT = int(os.environ['DB_PORT'])
-DB_USER = os.environ['DB_USER']
-DB_PASSWORD = os.environ['DB_PASSWORD']
+
+# advisory lock held by a single process run
+INGEST_LOCK = 'ingest'
 
 
 # logging setup
@@ -39,85 +58,491 @@ else:
     logging.getLogger().addHandler(s_handler)
 
 
-async def tasks():
+@lru_cache(maxsize=None)
+def get_registry() -> IndicatorRegistry:
+    """Returns the tracked indicators, the file listing them is read when first used."""
+    return IndicatorRegistry(get_settings().indicators_file)
+
+
+@lru_cache(maxsize=None)
+def get_recording() -> Optional['Recording']:
+    """Returns the recording HTTP responses are recorded to or replayed from, if HTTP_RECORDING_MODE is set."""
+
+    settings = get_settings()
+    if settings.http_recording_mode is None:
+        return None
+    from src.scripts.replay import Recording
+
+    return Recording(settings.http_recording_dir, settings.http_recording_mode,
+                     latency_scale=settings.http_replay_latency_scale)
+
+
+@lru_cache(maxsize=None)
+def get_runtime() -> 'RuntimeContext':
+    """Returns the runtime of the process, created once per container and reused by every warm invocation."""
+
+    from src.runtime import RuntimeContext
+
+    settings = get_settings()
+    return RuntimeContext(
+        db_params=settings.db_params,
+        pool_limit=settings.http_pool_limit,
+        pool_limit_per_host=settings.http_pool_limit_per_host,
+        dns_ttl=settings.http_dns_ttl,
+        keepalive_timeout=settings.http_keepalive_timeout,
+        db_max_idle=settings.db_max_idle,
+    )
+
+
+def new_cache() -> ResponseCache:
+    """Returns the on-disk cache of econdb responses."""
+
+    settings = get_settings()
+    return ResponseCache(settings.http_cache_dir, max_bytes=settings.http_cache_max_bytes,
+                         default_ttl=settings.http_cache_ttl)
+
+
+def indicator_batches(cache: ResponseCache, session, indicators) -> AsyncIterator:
+    """Returns the batches of given indicators, fetched as they are iterated."""
+
+    settings = get_settings()
+    return economy.iter_indicator_batches(cache, session=session, indicators=indicators,
+                                          batch_size=settings.economy_batch_size,
+                                          multi_series=settings.econdb_multi_series,
+                                          tickers_per_request=settings.econdb_tickers_per_request)
+
+
+def store_economy_data(economy_data, conn, today, target: Optional[str]) -> None:
+    """
+    Loads a batch of economy data, updates its derived indicators and records the fetch of every loaded series.
+
+    Batches of a snapshot load go to the target returned by begin_snapshot, target is None for incremental
+    loads. Runs on the database thread.
+    """
+
+    if target is None:
+        # merge new or revised observations, unchanged ones are not written again
+        changed = db_utils.upsert_observations(economy_data, conn)
+        logger.info(f"Upserted {changed} new or revised economy observations.")
+        # only the windows around those observations need recomputing
+        touched = db_utils.get_revised_points(conn, today, list(economy_data.last_dates()))
+    else:
+        # the batch joins today's snapshot, which readers see once every batch is loaded
+        db_utils.load_data(economy_data, conn, table_name=target, columns=db_utils.ECONOMY_DATA_COLUMNS)
+        # a snapshot has no record of what changed, every point is recomputed and only changed values written
+        touched = None
+
+    with span('derive_economy'):
+        values = derived.compute_derived(economy_data, get_registry().frequencies(), touched=touched)
+        written = db_utils.upsert_derived(values, conn)
+    logger.info(f"Updated {written} derived indicator values.")
+
+    now = datetime.now()
+    db_utils.update_fetch_state(conn, [(ticker, now, last_observation)
+                                       for ticker, last_observation in economy_data.last_dates().items()])
+
+
+def store_news_data(news_data, conn, today, target: Optional[str] = None) -> None:
+    """
+    Collapses near-duplicate articles and loads the rest, runs on the database thread.
+
+    With a target from begin_snapshot the articles are only staged there, a sharded run publishes them.
+    """
+
+    settings = get_settings()
+    keep_since = today - timedelta(days=settings.news_dedup_days)
+    with span('dedup_news', articles=len(news_data)) as dedup_span:
+        news_data, signatures = dedup.drop_near_duplicates(news_data,
+                                                           db_utils.get_news_signatures(conn, since=keep_since),
+                                                           threshold=settings.news_dedup_threshold)
+        dedup_span['kept'] = len(news_data)
+    logger.info(f"Kept {len(news_data)} articles after dropping near-duplicates.")
+
+    if target is not None:
+        db_utils.load_data(news_data, conn, table_name=target, columns=db_utils.MARKET_NEWS_COLUMNS)
+        logger.info(f"Staged news data in {target}.")
+    # get latest date available in market data table then check and insert new data
+    elif db_utils.get_latest_date_created(conn=conn, table_name='market_news', date_column='date_created') != today:
+        # insert news data and drop old snapshots
+        db_utils.replace_snapshot(news_data, conn, table_name='market_news', columns=db_utils.MARKET_NEWS_COLUMNS,
+                                  day=today, archive_root=settings.archive_root)
+        logger.info("Replaced news data with today's snapshot.")
+    else:
+        # today's snapshot exists, only add articles it doesn't have yet
+        added = db_utils.merge_data(news_data, conn, table_name='market_news', columns=db_utils.MARKET_NEWS_COLUMNS,
+                                    conflict_columns=('url_hash', 'date_created'))
+        logger.info(f"Added {added} new articles to today's news data.")
+
+    db_utils.store_news_signatures(conn, signatures, day=today, keep_since=keep_since)
+
+
+async def load_economy_batches(db: 'AsyncDatabase', batches: AsyncIterator, today, target: Optional[str]) -> int:
+    """
+    Loads economy batches as they are fetched, each in its own transaction, while the next one downloads.
+
+    Returns:
+        Number of loaded observations.
+    """
+
+    rows = 0
+    async for batch in batches:
+        with span('load_economy', rows=len(batch)):
+            await db.transaction(store_economy_data, batch, today=today, target=target)
+        rows += len(batch)
+    return rows
+
+
+def publish_economy(conn, target: str, today, tickers: Sequence[str]) -> None:
+    """
+    Publishes today's economy snapshot, runs on the database thread.
+
+    Series of tickers that couldn't be fetched are carried over from the previous snapshot first, so a
+    partially failed fetch doesn't make them disappear for the day.
+    """
+
+    carried = db_utils.carry_over_series(conn, 'economy_data', target, today, tickers)
+    if carried:
+        logger.warning(f"Carried {carried} observations of series that couldn't be fetched over from the "
+                       f"previous snapshot.")
+    db_utils.publish_snapshot(conn, 'economy_data', target, today, archive_root=get_settings().archive_root)
+
+
+async def load_economy(db: 'AsyncDatabase', batches: AsyncIterator, today, tickers: Sequence[str]) -> None:
+    """Loads the economy batches of a single process run, publishing a snapshot load once its last batch is in."""
+
+    target = None
+    if get_settings().economy_load_mode != 'incremental':
+        # get latest date available in economy data table then check and insert new data
+        latest = await db.transaction(db_utils.get_latest_date_created, table_name='economy_data',
+                                      date_column='date_created')
+        if latest == today:
+            logger.warning("Latest economy data already exists.")
+            return
+        target = await db.transaction(db_utils.begin_snapshot, table_name='economy_data', day=today)
+
+    rows = await load_economy_batches(db, batches, today, target)
+    logger.info(f"Got all economy indicators data successfully, loaded {rows} observations.")
+
+    if target is not None:
+        # drop old snapshots and make today's visible, readers never see a partial snapshot
+        await db.transaction(publish_economy, target=target, today=today, tickers=tickers)
+        logger.info("Replaced economy indicators data with today's snapshot.")
+
+
+async def load_when_fetched(db: 'AsyncDatabase', fetch: asyncio.Task, store, name: str, today) -> None:
+    """Waits for a fetch to finish and loads its data in its own transaction, while other fetches go on."""
+
+    data = await fetch
+    logger.info(f"Got all {name} data successfully.")
+    with span(f"load_{name.split()[0]}", rows=len(data)):
+        await db.transaction(store, data, today=today)
+
+
+async def refresh_economy(runtime: 'RuntimeContext', indicators, cache: ResponseCache, session, today) -> None:
+    """Fetches and loads given indicators, then refreshes the latest values view."""
+
+    batches = indicator_batches(cache, session, indicators)
+    tickers = [indicator['symbol'] for indicator in indicators]
+    await traced('economy', load_economy(runtime.db, batches, today, tickers))
+    await refresh_views(runtime)
+
+
+async def refresh_news(runtime: 'RuntimeContext', session, today, target: Optional[str] = None) -> None:
+    """Fetches and loads the news, merging it into today's snapshot when there is one, see store_news_data."""
+
+    news_fetch = asyncio.create_task(traced('fetch_news', market_news.get_news_data(session=session)))
+    await load_when_fetched(runtime.db, news_fetch, partial(store_news_data, target=target), 'news', today)
+
+
+async def refresh_views(runtime: 'RuntimeContext') -> None:
+    """Refreshes the latest values view of the economy table being loaded."""
+
+    # readers see the new latest values once the view is refreshed, without being blocked meanwhile
+    sources = queries.ECONOMY_SOURCES
+    table_name, _ = sources.get(get_settings().economy_load_mode, sources['snapshot'])
     try:
-        db = Database(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT,
-        )
-            
-        conn = db.get_connection()
-        logger.info("Database connection successful.")
+        with span('refresh_latest_values'):
+            await runtime.db.transaction(queries.refresh_latest_values, table_name=table_name)
+    except Exception as error:
+        logger.error(error)
 
+
+async def tasks(runtime: 'RuntimeContext'):
+    today = datetime.today().date()
+    cache = new_cache()
+    session = runtime.get_session()
+
+    try:
         # create table if not exists
-        create_tables(conn)
+        await runtime.db.transaction(db_utils.create_tables)
+        await runtime.db.transaction(queries.create_read_models)
+        logger.info("Database connection successful.")
+
+        # two runs at once would both replace the snapshots, let only one through
+        if not await runtime.db.transaction(shards.try_advisory_lock, key=INGEST_LOCK):
+            logger.warning("Another run is in progress, exiting.")
+            return
+    except Exception as error:
+        logger.error(f"Error connecting to database: {error}")
+        return
 
+    try:
+        # decide what to download before any request is made
         try:
-            task1 = asyncio.create_task(get_all_indicators_data())
-            task2 = asyncio.create_task(get_news_data())
-
-            economy_data = await task1
-            logger.info("Got all economy indicators data successfully.")
-
-            news_data = await task2
-            logger.info("Got all news data successfully.")
-
-            today = datetime.today().date()
-
-            # get latest date available in economy data table then check and insert new data
-            latest_date_economy_table = get_latest_date_created(conn=conn, 
-                                                                table_name='economy_data', 
-                                                                date_column='date_created')
-            if latest_date_economy_table != today:
-                # insert economy data
-                economy_sql_query = ('INSERT INTO economy_data '
-                                     '(ticker_name, dates, values, date_created) '
-                                     'VALUES (%s, %s, %s ,%s)')
-                insert_data(economy_data, conn, economy_sql_query)
-                logger.info("Inserted new economy indicators data.")
-
-                # delete old economy data
-                delete_old_data(conn, table_name='economy_data', date_column='date_created')
-                logger.info("Deleted old economy indicators data.")
-            else:
-                logger.warning("Latest economy data already exists.")
-            
-            # get latest date available in market data table then check and insert new data
-            latest_date_news_table = get_latest_date_created(conn=conn,
-                                                             table_name='market_news', 
-                                                             date_column='date_created')
-            if latest_date_news_table != today:
-                # insert news data
-                news_sql_query = ('INSERT INTO market_news '
-                                  '(title, description, url, source, image, category, language, country, date_created) '
-                                  'VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s)')
-                insert_data(news_data, conn, news_sql_query)
-                logger.info("Inserted new news data.")
-
-                # delete old news data
-                delete_old_data(conn, table_name='market_news', date_column='date_created')
-                logger.info("Deleted old news data.")
-            else:
-                logger.warning("Latest news data already exists.")
+            with span('plan'):
+                plan = await runtime.db.transaction(planner.plan_fetches, indicators=get_registry(),
+                                                    now=datetime.now(),
+                                                    incremental=get_settings().economy_load_mode == 'incremental')
+        except Exception as error:
+            logger.error(f"Error planning fetches: {error}")
+            return
+
+        for source, reason in plan.skipped:
+            logger.info(f"Skipping {source}: {reason}.")
+
+        loads = []
+        if plan.indicators:
+            loads.append(refresh_economy(runtime, plan.indicators, cache, session, today))
+        if plan.fetch_news:
+            loads.append(refresh_news(runtime, session, today))
+
+        # each source is loaded as soon as its own download finishes
+        results = await asyncio.gather(*loads, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(result)
+    finally:
+        await runtime.db.transaction(shards.advisory_unlock, key=INGEST_LOCK)
+
+
+def plan_shards(conn, today, now, shard_count: int) -> None:
+    """
+    Plans today's sharded run and queues its shards, unless another worker already did.
+
+    Economy indicators due for fetching are split into shard_count shards, news gets a shard of its
+    own. A snapshot load gets its staging table here, every economy shard loads into it, and so does a
+    new news snapshot. Runs on the database thread.
+    """
+
+    shards.lock_run(conn, today)
+    if shards.get_shard_progress(conn, today):
+        return
+
+    incremental = get_settings().economy_load_mode == 'incremental'
+    plan = planner.plan_fetches(conn, indicators=get_registry(), now=now, incremental=incremental)
+    for source, reason in plan.skipped:
+        logger.info(f"Skipping {source}: {reason}.")
+
+    queued = []
+    if plan.indicators:
+        target = None if incremental else db_utils.begin_snapshot(conn, table_name='economy_data', day=today)
+        symbols = [indicator['symbol'] for indicator in plan.indicators]
+        size = -(-len(symbols) // shard_count)
+        queued += [(symbols[start:start + size], target) for start in range(0, len(symbols), size)]
+    if plan.fetch_news:
+        # news merges into today's snapshot when there is one, like in a single process run
+        latest = db_utils.get_latest_date_created(conn=conn, table_name='market_news', date_column='date_created')
+        news_target = None if latest == today else db_utils.begin_snapshot(conn, table_name='market_news', day=today)
+        queued.append(([shards.NEWS_SOURCE], news_target))
+
+    shards.enqueue_shards(conn, today, queued)
+    logger.info(f"Queued {len(queued)} shards for today's run.")
+
+
+async def run_shard(runtime: 'RuntimeContext', shard: 'Shard', cache: ResponseCache, session, today) -> None:
+    """Fetches and loads the sources of a claimed shard."""
+
+    if shard.sources == [shards.NEWS_SOURCE]:
+        await refresh_news(runtime, session, today, target=shard.target)
+        return
+
+    symbols = set(shard.sources)
+    indicators = [indicator for indicator in get_registry() if indicator['symbol'] in symbols]
+    batches = indicator_batches(cache, session, indicators)
+    rows = await load_economy_batches(runtime.db, batches, today, shard.target)
+    logger.info(f"Loaded {rows} economy observations of shard {shard.shard}.")
 
+
+async def shard_tasks(runtime: 'RuntimeContext'):
+    """
+    Runs one worker of a sharded run.
+
+    The worker claims shards of today's run until none is left, loading only their sources, then tries
+    to publish the run, which happens once every shard of every worker is done. Workers share the
+    ingest lock, which single process runs take for themselves.
+    """
+
+    today = datetime.today().date()
+    cache = new_cache()
+    session = runtime.get_session()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    try:
+        # create table if not exists
+        await runtime.db.transaction(db_utils.create_tables)
+        await runtime.db.transaction(queries.create_read_models)
+        logger.info("Database connection successful.")
+
+        if not await runtime.db.transaction(shards.try_advisory_lock, key=INGEST_LOCK, shared=True):
+            logger.warning("Another run is in progress, exiting.")
+            return
+    except Exception as error:
+        logger.error(f"Error connecting to database: {error}")
+        return
+
+    try:
+        try:
+            with span('plan'):
+                await runtime.db.transaction(plan_shards, today=today, now=datetime.now(),
+                                             shard_count=get_settings().ingest_shards)
         except Exception as error:
-            logger.error(error)
+            logger.error(f"Error planning shards: {error}")
+            return
+
+        while True:
+            shard = await runtime.db.transaction(shards.claim_shard, day=today, worker=worker)
+            if shard is None:
+                break
+            logger.info(f"Claimed shard {shard.shard} with {len(shard.sources)} sources, attempt {shard.attempts}.")
+
+            error = None
+            try:
+                with span('shard', shard=shard.shard, sources=len(shard.sources)):
+                    await run_shard(runtime, shard, cache, session, today)
+            except Exception as shard_error:
+                logger.error(f"Shard {shard.shard} failed: {shard_error}")
+                error = shard_error
+            await runtime.db.transaction(shards.finish_shard, shard=shard, error=error)
 
+        if await runtime.db.transaction(shards.publish_run, day=today, archive_root=get_settings().archive_root):
+            logger.info("All shards are done, published today's run.")
+            await refresh_views(runtime)
+    finally:
+        await runtime.db.transaction(shards.advisory_unlock, key=INGEST_LOCK, shared=True)
+
+
+async def locked_refresh(runtime: 'RuntimeContext', name: str, refresh) -> None:
+    """
+    Runs one refresh of the daemon under the ingest lock, emitting its metrics as a record of its own.
+
+    Refreshes of the daemon share its database session, where the lock is reentrant, so they run
+    alongside each other but never alongside a lambda invocation or another daemon.
+    """
+
+    metrics = Metrics()
+    with metrics.activate():
+        if not await runtime.db.transaction(shards.try_advisory_lock, key=INGEST_LOCK):
+            logger.warning(f"Another run is in progress, skipping this {name} refresh.")
+            return
+        try:
+            with span(f"refresh_{name}"):
+                await refresh(runtime, datetime.today().date())
         finally:
-            conn.commit()
-            db.disconnect()
-            logger.info("Disconnected database.")
+            await runtime.db.transaction(shards.advisory_unlock, key=INGEST_LOCK)
+    metrics.emit()
+
+
+async def daemon_economy(runtime: 'RuntimeContext', today, cache: ResponseCache) -> None:
+    """Refreshes the indicators the planner finds due, of daemon mode."""
+
+    plan = await runtime.db.transaction(planner.plan_fetches, indicators=get_registry(), now=datetime.now(),
+                                        incremental=get_settings().economy_load_mode == 'incremental')
+    if not plan.indicators:
+        logger.info(f"No economy indicators due, skipped {len(plan.skipped)}.")
+        return
+    await refresh_economy(runtime, plan.indicators, cache, runtime.get_session(), today)
 
+
+async def daemon_news(runtime: 'RuntimeContext', today) -> None:
+    """Refreshes the news of daemon mode, new articles are merged into today's snapshot."""
+
+    await refresh_news(runtime, runtime.get_session(), today)
+
+
+async def daemon(runtime: 'RuntimeContext') -> None:
+    """
+    Keeps refreshing every source on its own interval, until SIGTERM or SIGINT.
+
+    The database connection and HTTP pool stay open between refreshes. SIGHUP refreshes every
+    source right away. On shutdown no new refresh starts and running ones get DAEMON_SHUTDOWN_TIMEOUT
+    seconds to finish.
+    """
+
+    cache = new_cache()
+    try:
+        # create table if not exists
+        await runtime.db.transaction(db_utils.create_tables)
+        await runtime.db.transaction(queries.create_read_models)
+        logger.info("Database connection successful.")
     except Exception as error:
         logger.error(f"Error connecting to database: {error}")
+        return
+
+    settings = get_settings()
+    scheduler = Scheduler(shutdown_timeout=settings.daemon_shutdown_timeout)
+    scheduler.add('economy', settings.economy_refresh_interval,
+                  partial(locked_refresh, runtime, 'economy', partial(daemon_economy, cache=cache)))
+    scheduler.add('news', settings.news_refresh_interval, partial(locked_refresh, runtime, 'news', daemon_news))
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, scheduler.stop)
+    loop.add_signal_handler(signal.SIGHUP, scheduler.trigger)
+
+    logger.info(f"Refreshing news every {settings.news_refresh_interval:.0f}s and economy indicators every "
+                f"{settings.economy_refresh_interval:.0f}s.")
+    try:
+        await scheduler.run()
+    finally:
+        for signal_number in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            loop.remove_signal_handler(signal_number)
+    logger.info("Daemon stopped.")
+
+
+def recording_scope():
+    """Activates the HTTP recording if one is configured."""
+    recording = get_recording()
+    return recording.activate() if recording is not None else nullcontext()
 
 
 def main(event, context):
-    asyncio.run(tasks())
+    settings = get_settings()
+    runtime = get_runtime()
+    metrics = Metrics()
+    with metrics.activate(), profiled(settings.profile_run, settings.profile_path), recording_scope():
+        with span('invocation'):
+            runtime.run(shard_tasks(runtime) if settings.ingest_shards else tasks(runtime))
+    # one structured record per invocation, picked up by CloudWatch as embedded metrics
+    metrics.emit()
 
 
-if __name__ == '__main__':
+def run_worker() -> None:
     main(None, None)
+    get_runtime().close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes of a sharded run, needs INGEST_SHARDS')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and refresh every source on its own interval')
+    args = parser.parse_args()
+
+    if args.daemon:
+        runtime = get_runtime()
+        try:
+            with recording_scope():
+                runtime.run(daemon(runtime))
+        finally:
+            runtime.close()
+    elif args.workers > 1:
+        # every worker process imports this module afresh, with a runtime of its own
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=run_worker) for _ in range(args.workers)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+    else:
+        run_worker()
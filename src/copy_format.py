@@ -0,0 +1,19 @@
+"""
+Rendering of values in the Postgres COPY text format.
+
+Shared by the DB loaders and the parsers that pre-render column batches, without importing psycopg2.
+"""
+from datetime import date, datetime
+
+# characters with special meaning in the COPY text format
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def format_copy_value(value) -> str:
+    """Formats a single value for the COPY text format."""
+
+    if value is None:
+        return '\\N'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
@@ -0,0 +1,195 @@
+"""
+Columnar archive of the daily snapshots.
+
+Before an earlier snapshot of economy_data or market_news is dropped, its rows are written to a
+zstd compressed Parquet file under <root>/<table>/date_created=<day>/, so revision history survives
+and backtests can read it without querying Postgres. The root may be a local directory or any URI
+pyarrow supports, e.g. s3://bucket/prefix.
+
+pyarrow is an optional dependency, needed only when an archive root is configured.
+"""
+import uuid
+import logging
+from datetime import date
+from typing import Iterable, Iterator, List, Optional, Sequence
+from psycopg2.extensions import connection
+from psycopg2.sql import SQL, Identifier
+from src.database.db import DatabaseOperationError
+
+# imported by _require_pyarrow when first needed, pyarrow takes longer to import than the rest of a run's modules
+pa = ds = pafs = pq = None
+
+
+logger = logging.getLogger(__name__)
+
+# rows fetched from the database and written to the file at a time, one Parquet row group each
+ARCHIVE_BATCH_ROWS = 64 * 1024
+
+# archived columns of every table and the order rows are written in, date_created is kept in the path
+ARCHIVE_TABLES = {
+    'economy_data': {
+        'columns': ('ticker_name', 'dates', 'values'),
+        'order_by': ('ticker_name', 'dates'),
+    },
+    'market_news': {
+        'columns': ('title', 'description', 'url', 'source', 'image', 'category', 'language', 'country',
+                    'url_hash'),
+        'order_by': ('category', 'id'),
+    },
+}
+
+
+class ArchiveError(Exception):
+    """Custom exception if a snapshot can't be archived or read back."""
+
+    def __init__(self, message) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+def _require_pyarrow() -> None:
+    global pa, ds, pafs, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow.dataset as ds
+        import pyarrow.fs as pafs
+        import pyarrow.parquet as pq
+        import pyarrow as pa
+    except ImportError:
+        raise ArchiveError("The archive needs pyarrow, install it or unset the archive root.")
+
+
+def _schema(table_name: str) -> 'pa.Schema':
+    if table_name == 'economy_data':
+        return pa.schema([('ticker_name', pa.string()), ('dates', pa.date32()), ('values', pa.float64())])
+    return pa.schema([(column, pa.string()) for column in ARCHIVE_TABLES[table_name]['columns']])
+
+
+def _filesystem(root: str, memory_map: bool = False):
+    """Returns the filesystem of root and the path of root on it, memory mapping local files if asked to."""
+
+    filesystem, path = pafs.FileSystem.from_uri(root) if '://' in root else (pafs.LocalFileSystem(), root)
+    if memory_map and isinstance(filesystem, pafs.LocalFileSystem):
+        filesystem = pafs.LocalFileSystem(use_mmap=True)
+    return filesystem, path.rstrip('/')
+
+
+def snapshot_path(root: str, table_name: str, day: date) -> str:
+    """Returns the directory holding the archive of given day's snapshot of a table."""
+
+    return f"{root.rstrip('/')}/{table_name}/date_created={day.isoformat()}"
+
+
+def write_snapshot(batches: Iterable[Sequence[tuple]], root: str, table_name: str, day: date) -> int:
+    """
+    Writes the rows of a snapshot to its Parquet file, one row group per batch of rows.
+
+    The file is written under a dot-prefixed temporary name, which readers skip, and moved in place when
+    complete. Archiving the same day again replaces the file.
+
+    Returns:
+        Number of archived rows.
+    """
+
+    _require_pyarrow()
+    schema = _schema(table_name)
+    filesystem, path = _filesystem(snapshot_path(root, table_name, day))
+    final_path = f"{path}/part-0.parquet"
+    temporary_path = f"{path}/.part-0.{uuid.uuid4().hex}.tmp"
+
+    rows = 0
+    filesystem.create_dir(path, recursive=True)
+    with filesystem.open_output_stream(temporary_path) as output, \
+            pq.ParquetWriter(output, schema, compression='zstd') as writer:
+        for batch in batches:
+            columns = list(zip(*batch)) if batch else [[] for _ in schema]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            rows += len(batch)
+    filesystem.move(temporary_path, final_path)
+
+    return rows
+
+
+def _fetch_batches(conn: connection, query: SQL, params: tuple) -> Iterator[List[tuple]]:
+    """Streams query results with a server side cursor, ARCHIVE_BATCH_ROWS rows at a time."""
+
+    with conn.cursor(name=f"archive_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = ARCHIVE_BATCH_ROWS
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_BATCH_ROWS)
+            if not rows:
+                return
+            yield rows
+
+
+def archive_snapshot(conn: connection, root: str, table_name: str, day: date, source: Optional[str] = None) -> int:
+    """
+    Archives given day's snapshot of a table, reading it from source, a partition of the table or the table itself.
+
+    Returns:
+        Number of archived rows.
+    """
+
+    definition = ARCHIVE_TABLES[table_name]
+    query = SQL("SELECT {} FROM {} WHERE date_created = %s ORDER BY {}").format(
+        SQL(', ').join(map(Identifier, definition['columns'])),
+        Identifier(source or table_name),
+        SQL(', ').join(map(Identifier, definition['order_by']))
+    )
+    try:
+        rows = write_snapshot(_fetch_batches(conn, query, (day,)), root, table_name, day)
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't archive {table_name} snapshot of {day}: {error}")
+
+    logger.info(f"Archived {rows} rows of the {day} {table_name} snapshot.")
+    return rows
+
+
+def read_archive(root: str, table_name: str, tickers: Optional[Sequence[str]] = None,
+                 start: Optional[date] = None, end: Optional[date] = None, date_column: str = 'date_created',
+                 columns: Optional[Sequence[str]] = None) -> 'pa.Table':
+    """
+    Reads archived snapshots of a table, memory mapping local files.
+
+    Filters are pushed down to the scan: a date range on date_created skips whole snapshot directories,
+    tickers and a date range on dates skip the row groups whose statistics rule them out.
+
+    Args:
+        root: Archive root the snapshots were written to.
+        table_name: Archived table.
+        tickers: Ticker names to read, economy_data only.
+        start: First date to read, inclusive.
+        end: Last date to read, inclusive.
+        date_column: Column the date range applies to, date_created for snapshot days or dates for
+            observation dates of economy_data.
+        columns: Columns to read, all of them, date_created included, when not given.
+
+    Returns:
+        A pyarrow.Table with the matching rows.
+    """
+
+    _require_pyarrow()
+    filesystem, path = _filesystem(root, memory_map=True)
+    partitioning = ds.partitioning(pa.schema([('date_created', pa.date32())]), flavor='hive')
+    try:
+        dataset = ds.dataset(f"{path}/{table_name}", filesystem=filesystem, format='parquet',
+                             partitioning=partitioning)
+    except (FileNotFoundError, pa.ArrowInvalid) as error:
+        raise ArchiveError(f"Couldn't open the {table_name} archive: {error}")
+
+    condition = None
+    if tickers is not None:
+        condition = ds.field('ticker_name').isin(list(tickers))
+    if start is not None:
+        condition = _and(condition, ds.field(date_column) >= pa.scalar(start, type=pa.date32()))
+    if end is not None:
+        condition = _and(condition, ds.field(date_column) <= pa.scalar(end, type=pa.date32()))
+
+    return dataset.to_table(columns=list(columns) if columns is not None else None, filter=condition)
+
+
+def _and(condition, other):
+    return other if condition is None else condition & other
@@ -0,0 +1,69 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+from psycopg2.extensions import connection
+from src.database.db import Database, DEFAULT_MAX_IDLE
+
+
+class AsyncDatabase:
+    """
+    Awaitable front end for a Database, running every blocking psycopg2 call on one worker thread.
+
+    A psycopg2 connection must not be used by two threads at once, so all calls go through a single
+    thread executor. Each call is therefore atomic with respect to the others, while the event loop
+    keeps serving network fetches in the meantime.
+
+    Args:
+        db_params: Keyword arguments for Database.
+        max_idle: Seconds the connection may stay unused before it is health-checked.
+
+    Methods:
+        transaction(): Runs a db_utils style function with the connection and commits, or rolls back on error.
+        close(): Disconnects and stops the worker thread.
+    """
+
+    def __init__(self, db_params: dict, max_idle: float = DEFAULT_MAX_IDLE) -> None:
+        self.db_params = db_params
+        self.max_idle = max_idle
+        self._db: Optional[Database] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+
+    def _connection(self) -> connection:
+        if self._db is None:
+            self._db = Database(**self.db_params)
+            return self._db.get_connection()
+        return self._db.ensure_connection(max_idle=self.max_idle)
+
+    def _call(self, function: Callable, args: tuple, kwargs: dict):
+        conn = self._connection()
+        try:
+            result = function(*args, conn=conn, **kwargs)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        return result
+
+    async def _submit(self, function: Callable, args: tuple, kwargs: dict):
+        loop = asyncio.get_running_loop()
+        # executors don't carry context variables over, copy them so metrics recorded on the thread are kept
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, partial(context.run, self._call, function, args, kwargs))
+
+    async def transaction(self, function: Callable, *args, **kwargs):
+        """
+        Runs function(*args, conn=connection, **kwargs) on the database thread and returns its result.
+
+        Commits afterwards, or rolls back if function raised.
+        """
+        return await self._submit(function, args, kwargs)
+
+    def close(self) -> None:
+        """Disconnects from the database and stops the worker thread."""
+        if self._db is not None:
+            self._executor.submit(self._db.disconnect).result()
+            self._db = None
+        self._executor.shutdown()
@@ -1,5 +1,12 @@
+import time
 import psycopg2
-from psycopg2.extensions import connection
+from typing import List, Tuple
+from psycopg2.extensions import connection, cursor, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from src.metrics import increment
+
+
+# seconds a connection may stay unused before it is health-checked with a round trip
+DEFAULT_MAX_IDLE = 30
 
 
 class DatabaseConnectionError(Exception):
@@ -18,34 +25,156 @@ class DatabaseOperationError(Exception):
         super().__init__(self.message)
 
 
+class InstrumentedCursor(cursor):
+    """Cursor that counts the statements it sends as database round trips."""
+
+    def execute(self, query, vars=None):
+        increment('db.round_trips')
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        increment('db.round_trips')
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        increment('db.round_trips')
+        return super().copy_expert(sql, file, size)
+
+
+class SessionConnection(connection):
+    """Connection that keeps track of the session level advisory locks taken on it, see try_advisory_lock."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.advisory_locks: List[Tuple[str, bool]] = []
+
+
+def try_advisory_lock(conn: connection, key: str, shared: bool = False) -> bool:
+    """
+    Takes a session level advisory lock on key without waiting, returns whether it was taken.
+
+    Any number of sessions can hold a shared lock at once, but none while another holds it exclusively.
+    The locks are reentrant, a session taking a lock it holds gets it again.
+    """
+
+    function = 'pg_try_advisory_lock_shared' if shared else 'pg_try_advisory_lock'
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(hashtext(%s))", (key,))
+        taken = cursor.fetchone()[0]
+    if taken and isinstance(conn, SessionConnection):
+        conn.advisory_locks.append((key, shared))
+    return taken
+
+
+def advisory_unlock(conn: connection, key: str, shared: bool = False) -> None:
+    """Releases a session level advisory lock taken with try_advisory_lock."""
+
+    function = 'pg_advisory_unlock_shared' if shared else 'pg_advisory_unlock'
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(hashtext(%s))", (key,))
+    if isinstance(conn, SessionConnection) and (key, shared) in conn.advisory_locks:
+        conn.advisory_locks.remove((key, shared))
+
+
+def holds_advisory_lock(conn: connection, key: str) -> bool:
+    """Returns whether this session holds the advisory lock on key."""
+
+    with conn.cursor() as cursor:
+        # hashtext keys are int4, taken as bigint keys, which pg_locks splits into classid and objid
+        cursor.execute(
+            '''SELECT EXISTS (SELECT 1 FROM pg_locks
+                              WHERE locktype = 'advisory' AND pid = pg_backend_pid() AND objsubid = 1
+                                AND (classid::bigint << 32 | objid::bigint) = hashtext(%s)::bigint)''',
+            (key,)
+        )
+        return cursor.fetchone()[0]
+
+
 class Database:
     """
     A class for interacting with a PostgreSQL database.
 
     Methods:
         get_connection(): Get connection of database.
+        is_alive(): Checks whether the connection is still usable.
+        ensure_connection(): Get connection of database, reconnecting if it went stale.
         disconnect(): Disconnects from the database.
     """
 
     def __init__(self, host: str, database: str, user: str, password: str, port: int = 5432) -> None:
+        self._params = dict(host=host, database=database, user=user, password=password, port=port)
+        self._connection = None
+        self._connect()
+
+    def _connect(self) -> None:
         try:
-            self._connection = psycopg2.connect(
-                host=host,
-                database=database,
-                user=user,
-                password=password,
-                port=port
-            )
+            self._connection = psycopg2.connect(**self._params, connection_factory=SessionConnection,
+                                                cursor_factory=InstrumentedCursor)
         except Exception as error:
             raise DatabaseConnectionError(f"Unable to connect to database.{error=}")
+        self._last_used = time.monotonic()
 
     def get_connection(self) -> connection:
         """Connects to the database."""
         if self._connection:
+            self._last_used = time.monotonic()
             return self._connection
         else:
             raise DatabaseOperationError(f"Connection is closed. Create a new connection.")
 
+    def is_alive(self) -> bool:
+        """
+        Checks whether the connection is open and the server still answers on it.
+
+        Raises:
+            DatabaseOperationError: If a transaction is open on the connection, checking it would end it.
+        """
+        if not self._connection or self._connection.closed:
+            return False
+        if self._connection.get_transaction_status() not in (TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN):
+            raise DatabaseOperationError("Can't check a connection while a transaction is open on it.")
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            self._connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def ensure_connection(self, max_idle: float = DEFAULT_MAX_IDLE) -> connection:
+        """
+        Returns a usable connection, transparently reconnecting when the current one went stale.
+
+        A connection with an open transaction is returned as is, its caller isn't done with it. Advisory
+        locks held on a replaced connection are taken again on the new one.
+
+        Args:
+            max_idle: Seconds the connection may stay unused before it is health-checked with a round trip.
+
+        Raises:
+            DatabaseConnectionError: If another session took one of the locks while the connection was lost.
+        """
+        current = self._connection
+        if current and not current.closed:
+            if time.monotonic() - self._last_used <= max_idle or \
+                    current.get_transaction_status() not in (TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN):
+                return self.get_connection()
+        if not self.is_alive():
+            locks = list(getattr(current, 'advisory_locks', []))
+            if current and not current.closed:
+                current.close()
+            self._connect()
+            self._restore_locks(locks)
+        return self.get_connection()
+
+    def _restore_locks(self, locks: List[Tuple[str, bool]]) -> None:
+        for key, shared in locks:
+            if not try_advisory_lock(self._connection, key, shared=shared):
+                self._connection.rollback()
+                raise DatabaseConnectionError(f"Lost the connection and advisory lock {key} with it, "
+                                              f"another session holds it now.")
+        self._connection.commit()
+
     def disconnect(self):
         """Disconnects from the database."""
         if self._connection:
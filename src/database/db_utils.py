@@ -1,8 +1,25 @@
-from datetime import datetime
+import io
+import logging
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional, Sequence
 from psycopg2.extensions import connection
 from psycopg2.extras import execute_batch
-from psycopg2.sql import SQL, Identifier
+from psycopg2.sql import SQL, Identifier, Placeholder
 from src.database.db import DatabaseOperationError
+from src.database.archive import archive_snapshot
+from src.copy_format import format_copy_value
+from src.metrics import increment
+
+
+logger = logging.getLogger(__name__)
+
+ECONOMY_DATA_COLUMNS = ('ticker_name', 'dates', 'values', 'date_created')
+MARKET_NEWS_COLUMNS = ('title', 'description', 'url', 'source', 'image', 'category', 'language', 'country',
+                       'url_hash', 'date_created')
+DERIVED_INDICATORS_COLUMNS = ('ticker_name', 'metric', 'dates', 'value', 'date_computed')
+
+# size of the chunks handed to the server while streaming COPY data
+COPY_CHUNK_SIZE = 64 * 1024
 
 
 class LatestDataNotFoundError(Exception):
@@ -15,8 +32,11 @@ class LatestDataNotFoundError(Exception):
 
 def create_tables(conn: connection) -> None:
     """
-    Creates economy_data, market_news tables in database.
+    Creates economy_data, economy_observations, fetch_state, market_news, news_signatures, derived_indicators,
+    ingest_shards, backfill_progress tables in database.
 
+    economy_data and market_news are partitioned by date_created, one partition per daily snapshot.
+    Tables created by earlier versions are left as they are and keep using DELETE based retention.
     """
 
     economy_data_table = '''
@@ -26,6 +46,38 @@ def create_tables(conn: connection) -> None:
             values FLOAT,
             date_created DATE NOT NULL,
             PRIMARY KEY (ticker_name, dates, date_created)
+        ) PARTITION BY LIST (date_created);
+    '''
+
+    economy_observations_table = '''
+        CREATE TABLE IF NOT EXISTS economy_observations (
+            ticker_name VARCHAR(40) NOT NULL,
+            dates date NOT NULL,
+            values FLOAT,
+            first_seen DATE NOT NULL,
+            last_revised DATE NOT NULL,
+            PRIMARY KEY (ticker_name, dates)
+        );
+        CREATE INDEX IF NOT EXISTS economy_observations_last_revised_idx ON economy_observations (last_revised);
+    '''
+
+    derived_indicators_table = '''
+        CREATE TABLE IF NOT EXISTS derived_indicators (
+            ticker_name VARCHAR(40) NOT NULL,
+            metric VARCHAR(20) NOT NULL,
+            dates date NOT NULL,
+            value FLOAT NOT NULL,
+            date_computed DATE NOT NULL,
+            PRIMARY KEY (ticker_name, metric, dates)
+        );
+    '''
+
+    fetch_state_table = '''
+        CREATE TABLE IF NOT EXISTS fetch_state (
+            source VARCHAR(40) NOT NULL,
+            last_fetched TIMESTAMP NOT NULL,
+            last_observation DATE,
+            PRIMARY KEY (source)
         );
     '''
 
@@ -40,14 +92,81 @@ def create_tables(conn: connection) -> None:
             category VARCHAR(20),
             language VARCHAR(10),
             country VARCHAR(5),
+            url_hash CHAR(40),
+            date_created DATE NOT NULL,
+            PRIMARY KEY (id, date_created)
+        ) PARTITION BY LIST (date_created);
+    '''
+
+    news_signatures_table = '''
+        CREATE TABLE IF NOT EXISTS news_signatures (
+            url_hash CHAR(40) NOT NULL,
             date_created DATE NOT NULL,
-            PRIMARY KEY (id)
+            signature BYTEA NOT NULL,
+            PRIMARY KEY (url_hash, date_created)
         );
     '''
+
+    # work queue of sharded runs, see src/database/shards.py
+    ingest_shards_table = '''
+        CREATE TABLE IF NOT EXISTS ingest_shards (
+            run_date DATE NOT NULL,
+            shard INT NOT NULL,
+            sources TEXT[] NOT NULL,
+            target VARCHAR(63),
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            worker VARCHAR(100),
+            attempts INT NOT NULL DEFAULT 0,
+            claimed_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            error TEXT,
+            PRIMARY KEY (run_date, shard)
+        );
+    '''
+
+    # days loaded by backfills, see backfill.py
+    backfill_progress_table = '''
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            source VARCHAR(20) NOT NULL,
+            day DATE NOT NULL,
+            rows INT NOT NULL,
+            finished_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (source, day)
+        );
+    '''
+
+    # tables created before url_hash existed get the column and the constraint added
+    market_news_url_hash = 'ALTER TABLE market_news ADD COLUMN url_hash CHAR(40)'
+    market_news_url_hash_key = 'CREATE UNIQUE INDEX market_news_url_hash_key ON market_news (url_hash, date_created)'
+
+    # full text search document of every article, title matches rank above description ones, see search_news
+    market_news_search = '''
+        ALTER TABLE market_news ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    '''
+    market_news_search_idx = 'CREATE INDEX market_news_search_idx ON market_news USING GIN (search_vector)'
     try:
         with conn.cursor() as cursor:
             cursor.execute(economy_data_table)
+            cursor.execute(economy_observations_table)
+            cursor.execute(derived_indicators_table)
+            cursor.execute(fetch_state_table)
             cursor.execute(market_news_table)
+            # these lock the news table against readers, adding search_vector rewrites it too, they only
+            # run when something is missing
+            if not has_column(conn, 'market_news', 'url_hash'):
+                cursor.execute(market_news_url_hash)
+            if not has_index(conn, 'market_news_url_hash_key'):
+                cursor.execute(market_news_url_hash_key)
+            if not has_column(conn, 'market_news', 'search_vector'):
+                cursor.execute(market_news_search)
+            if not has_index(conn, 'market_news_search_idx'):
+                cursor.execute(market_news_search_idx)
+            cursor.execute(news_signatures_table)
+            cursor.execute(ingest_shards_table)
+            cursor.execute(backfill_progress_table)
     except Exception as error:
         raise DatabaseOperationError(f"Couldn't create tables: {error}")
 
@@ -67,6 +186,79 @@ def get_latest_date_created(conn: connection, table_name: str, date_column: str)
     return max_date
 
 
+def get_fetch_state(conn: connection) -> dict:
+    """Returns last fetch time and last observation date of every source, keyed by source name."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT source, last_fetched, last_observation FROM fetch_state")
+        return {source: (last_fetched, last_observation) for source, last_fetched, last_observation in cursor}
+
+
+def update_fetch_state(conn: connection, states: Iterable[tuple]) -> None:
+    """Records (source, last_fetched, last_observation) rows for sources that were fetched and loaded."""
+
+    try:
+        with conn.cursor() as cursor:
+            execute_batch(
+                cursor,
+                '''INSERT INTO fetch_state (source, last_fetched, last_observation) VALUES (%s, %s, %s)
+                   ON CONFLICT (source) DO UPDATE
+                   SET last_fetched = EXCLUDED.last_fetched, last_observation = EXCLUDED.last_observation''',
+                list(states),
+                page_size=1000
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't update fetch state: {error}")
+
+
+def get_backfilled_days(conn: connection, source: str, start: date, end: date) -> set:
+    """Returns the days between start and end, both inclusive, a backfill already loaded source for."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT day FROM backfill_progress WHERE source = %s AND day BETWEEN %s AND %s",
+                       (source, start, end))
+        return {row[0] for row in cursor}
+
+
+def mark_backfilled(conn: connection, source: str, day: date, rows: int) -> None:
+    """Records that a backfill loaded source for day, meant to commit with the load itself."""
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''INSERT INTO backfill_progress (source, day, rows) VALUES (%s, %s, %s)
+                   ON CONFLICT (source, day) DO UPDATE SET rows = EXCLUDED.rows, finished_at = now()''',
+                (source, day, rows)
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't record backfill of {source} on {day}: {error}")
+
+
+def get_news_signatures(conn: connection, since: date) -> list:
+    """Returns (url_hash, signature) of the articles loaded on or after since."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT url_hash, signature FROM news_signatures WHERE date_created >= %s", (since,))
+        return [(url_hash, bytes(signature)) for url_hash, signature in cursor]
+
+
+def store_news_signatures(conn: connection, signatures: Iterable[tuple], day: date, keep_since: date) -> None:
+    """Stores (url_hash, signature) of the articles loaded on day and removes those older than keep_since."""
+
+    try:
+        with conn.cursor() as cursor:
+            execute_batch(
+                cursor,
+                "INSERT INTO news_signatures (url_hash, date_created, signature) VALUES (%s, %s, %s) "
+                "ON CONFLICT DO NOTHING",
+                [(url_hash, day, signature) for url_hash, signature in signatures],
+                page_size=1000
+            )
+            cursor.execute("DELETE FROM news_signatures WHERE date_created < %s", (keep_since,))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't store news signatures: {error}")
+
+
 def insert_data(data: tuple, conn: connection, sql_query: str) -> None:
     """Inserts data into table in database."""
 
@@ -77,8 +269,235 @@ def insert_data(data: tuple, conn: connection, sql_query: str) -> None:
         raise DatabaseOperationError(f"Couldn't insert data: {error}")
 
 
-def delete_old_data(conn: connection, table_name: str, date_column: str) -> None:
-    """Delete old data after inserting new data."""
+def _copy_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    """Renders rows to lines of the COPY text format."""
+
+    return ('\t'.join(map(format_copy_value, row)) + '\n' for row in rows)
+
+
+class _CopyBuffer(io.TextIOBase):
+    """Read-only file-like object that pulls COPY text lazily from an iterator of strings, chunk by chunk."""
+
+    def __init__(self, lines: Iterator[str]) -> None:
+        super().__init__()
+        self._lines = lines
+        self._pending = ''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._pending]
+        length = len(self._pending)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+
+        data = ''.join(chunks)
+        if size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def copy_data(data: Iterable[tuple], conn: connection, table_name: str, columns: Sequence[str]) -> None:
+    """
+    Bulk loads data into table in database using COPY FROM STDIN.
+
+    Rows are streamed to the server in chunks of COPY_CHUNK_SIZE characters, so the whole
+    payload is never rendered in memory at once. None values are written as NULL.
+
+    Column batches such as SeriesBatch that provide their own copy_lines() are rendered by it
+    instead of row by row.
+    """
+
+    copy_query = SQL("COPY {} ({}) FROM STDIN").format(
+        Identifier(table_name),
+        SQL(', ').join(map(Identifier, columns))
+    )
+    try:
+        with conn.cursor() as cursor:
+            lines = data.copy_lines() if hasattr(data, 'copy_lines') else _copy_lines(data)
+            cursor.copy_expert(copy_query, _CopyBuffer(lines), size=COPY_CHUNK_SIZE)
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't copy data: {error}")
+
+
+def load_data(data: Sequence[tuple], conn: connection, table_name: str, columns: Sequence[str]) -> None:
+    """
+    Loads data into table in database with COPY, falling back to batched INSERTs.
+
+    COPY runs inside a savepoint so that if it fails the transaction is still usable
+    and the same rows are inserted with execute_batch instead.
+    """
+
+    with conn.cursor() as cursor:
+        cursor.execute("SAVEPOINT load_data")
+    try:
+        copy_data(data, conn, table_name, columns)
+    except DatabaseOperationError as error:
+        logger.warning(f"COPY into {table_name} failed, falling back to batched inserts: {error}")
+        with conn.cursor() as cursor:
+            cursor.execute("ROLLBACK TO SAVEPOINT load_data")
+        insert_query = SQL("INSERT INTO {} ({}) VALUES ({})").format(
+            Identifier(table_name),
+            SQL(', ').join(map(Identifier, columns)),
+            SQL(', ').join(Placeholder() * len(columns))
+        )
+        insert_data(data, conn, insert_query)
+
+    with conn.cursor() as cursor:
+        cursor.execute("RELEASE SAVEPOINT load_data")
+    increment('rows.inserted', len(data))
+
+
+def merge_data(data: Iterable[tuple], conn: connection, table_name: str, columns: Sequence[str],
+               conflict_columns: Sequence[str]) -> int:
+    """
+    Loads data into table, skipping rows that conflict with existing ones.
+
+    Rows are staged with COPY into a temporary table and moved with INSERT ... ON CONFLICT DO NOTHING,
+    so loading the same rows again is a no-op.
+
+    Returns:
+        Number of rows inserted.
+    """
+
+    stage_table = f"{table_name}_stage"
+    column_list = SQL(', ').join(map(Identifier, columns))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+                    Identifier(stage_table), column_list, Identifier(table_name))
+            )
+            copy_data(data, conn, stage_table, columns)
+            cursor.execute(
+                SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM {stage} "
+                    "ON CONFLICT ({conflict}) DO NOTHING").format(
+                    table=Identifier(table_name),
+                    columns=column_list,
+                    stage=Identifier(stage_table),
+                    conflict=SQL(', ').join(map(Identifier, conflict_columns)))
+            )
+            inserted = cursor.rowcount
+            cursor.execute(SQL("DROP TABLE {}").format(Identifier(stage_table)))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't merge data: {error}")
+
+    increment('rows.inserted', inserted)
+
+    return inserted
+
+
+def upsert_observations(data: Iterable[tuple], conn: connection,
+                        table_name: str = 'economy_observations') -> int:
+    """
+    Merges economy data rows into the incremental observations table.
+
+    Rows are staged with COPY into a temporary table and merged with INSERT ... ON CONFLICT DO UPDATE.
+    Only observations that are new, or whose value differs from the stored one, are written; their
+    last_revised column is set to the rows' date_created. Unchanged observations cost no writes.
+
+    Returns:
+        Number of new or revised observations.
+    """
+
+    stage_table = f"{table_name}_stage"
+    upsert_query = SQL('''
+        INSERT INTO {table} AS o (ticker_name, dates, values, first_seen, last_revised)
+        SELECT DISTINCT ON (ticker_name, dates) ticker_name, dates, values, date_created, date_created
+        FROM {stage}
+        ON CONFLICT (ticker_name, dates) DO UPDATE
+        SET values = EXCLUDED.values, last_revised = EXCLUDED.last_revised
+        WHERE o.values IS DISTINCT FROM EXCLUDED.values
+    ''').format(table=Identifier(table_name), stage=Identifier(stage_table))
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("CREATE TEMP TABLE {} (ticker_name VARCHAR(40), dates DATE, values FLOAT, date_created DATE) "
+                    "ON COMMIT DROP").format(Identifier(stage_table))
+            )
+            copy_data(data, conn, stage_table, ECONOMY_DATA_COLUMNS)
+            cursor.execute(upsert_query)
+            changed = cursor.rowcount
+            cursor.execute(SQL("DROP TABLE {}").format(Identifier(stage_table)))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't upsert observations: {error}")
+
+    increment('rows.upserted', changed)
+
+    return changed
+
+
+def get_revised_points(conn: connection, day: date, tickers: Sequence[str],
+                       table_name: str = 'economy_observations') -> dict:
+    """Returns dates of the observations of given tickers that were added or revised on day, keyed by ticker."""
+
+    points = {}
+    with conn.cursor() as cursor:
+        cursor.execute(
+            SQL("SELECT ticker_name, dates FROM {} WHERE last_revised = %s AND ticker_name = ANY(%s)").format(
+                Identifier(table_name)),
+            (day, list(tickers))
+        )
+        for ticker, observation_date in cursor:
+            points.setdefault(ticker, []).append(observation_date)
+
+    return points
+
+
+def upsert_derived(data: Iterable[tuple], conn: connection, table_name: str = 'derived_indicators') -> int:
+    """
+    Merges derived indicator rows into their table.
+
+    Rows are staged with COPY and merged with INSERT ... ON CONFLICT DO UPDATE, writing only values that
+    are new or changed. Rows without a value remove the stored one, as the metric is no longer defined there.
+
+    Returns:
+        Number of rows written or removed.
+    """
+
+    stage_table = f"{table_name}_stage"
+    upsert_query = SQL('''
+        INSERT INTO {table} AS d (ticker_name, metric, dates, value, date_computed)
+        SELECT ticker_name, metric, dates, value, date_computed FROM {stage} WHERE value IS NOT NULL
+        ON CONFLICT (ticker_name, metric, dates) DO UPDATE
+        SET value = EXCLUDED.value, date_computed = EXCLUDED.date_computed
+        WHERE d.value IS DISTINCT FROM EXCLUDED.value
+    ''').format(table=Identifier(table_name), stage=Identifier(stage_table))
+    delete_query = SQL('''
+        DELETE FROM {table} AS d USING {stage} AS s
+        WHERE s.value IS NULL AND d.ticker_name = s.ticker_name AND d.metric = s.metric AND d.dates = s.dates
+    ''').format(table=Identifier(table_name), stage=Identifier(stage_table))
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("CREATE TEMP TABLE {} (ticker_name VARCHAR(40), metric VARCHAR(20), dates DATE, value FLOAT, "
+                    "date_computed DATE) ON COMMIT DROP").format(Identifier(stage_table))
+            )
+            copy_data(data, conn, stage_table, DERIVED_INDICATORS_COLUMNS)
+            cursor.execute(upsert_query)
+            changed = cursor.rowcount
+            cursor.execute(delete_query)
+            changed += cursor.rowcount
+            cursor.execute(SQL("DROP TABLE {}").format(Identifier(stage_table)))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't upsert derived indicators: {error}")
+
+    increment('rows.derived', changed)
+
+    return changed
+
+
+def delete_old_data(conn: connection, table_name: str, date_column: str, archive_root: Optional[str] = None) -> None:
+    """Delete old data after inserting new data, archiving every deleted day to archive_root first if given."""
 
     try:
         with conn.cursor() as cursor:
@@ -86,6 +505,16 @@ def delete_old_data(conn: connection, table_name: str, date_column: str) -> None
             max_date = get_latest_date_created(conn, table_name, date_column)
 
             if max_date == today:
+                if archive_root is not None:
+                    cursor.execute(
+                        SQL("SELECT DISTINCT {column} FROM {table} WHERE {column} <> %s").format(
+                            column=Identifier(date_column),
+                            table=Identifier(table_name)
+                        ),
+                        (max_date,)
+                    )
+                    for (day,) in cursor.fetchall():
+                        archive_snapshot(conn, archive_root, table_name, day)
                 cursor.execute(
                     SQL("DELETE FROM {} where {} <> %s").format(
                         Identifier(table_name),
@@ -93,7 +522,250 @@ def delete_old_data(conn: connection, table_name: str, date_column: str) -> None
                     ),
                     (max_date,)
                 )
+                increment('rows.deleted', cursor.rowcount)
             else:
                 raise LatestDataNotFoundError("Couldn't find latest data.")
     except Exception as error:
         raise DatabaseOperationError(f"Couldn't delete old data: {error}")
+
+
+def is_partitioned_table(conn: connection, table_name: str) -> bool:
+    """Returns True if given table is a partitioned table."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+        result = cursor.fetchone()
+
+    return bool(result and result[0])
+
+
+def has_column(conn: connection, table_name: str, column: str) -> bool:
+    """Returns True if given table has given column."""
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = %s "
+            "AND NOT attisdropped)",
+            (table_name, column)
+        )
+        return cursor.fetchone()[0]
+
+
+def has_index(conn: connection, index_name: str) -> bool:
+    """Returns True if an index with given name exists."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(%s) AND relkind IN ('i', 'I'))",
+                       (index_name,))
+        return cursor.fetchone()[0]
+
+
+def partition_name(table_name: str, day: date) -> str:
+    """Returns name of the partition holding given day's snapshot."""
+
+    return f"{table_name}_{day:%Y%m%d}"
+
+
+def partition_day(partition: str) -> date:
+    """Returns the day whose snapshot a partition named by partition_name holds."""
+
+    return datetime.strptime(partition[-8:], '%Y%m%d').date()
+
+
+def create_snapshot_partition(conn: connection, table_name: str, day: date) -> str:
+    """
+    Creates a standalone table for given day's snapshot that can later be attached as a partition.
+
+    The table carries a CHECK constraint matching the partition bound so attaching it does not
+    need to scan the loaded rows. Generated columns are computed as rows are loaded, indexes are
+    left out and built once when the table is attached.
+
+    Returns:
+        Name of the created table.
+    """
+
+    partition = partition_name(table_name, day)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED, "
+                    "CHECK (date_created = %s))").format(Identifier(partition), Identifier(table_name)),
+                (day,)
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't create partition {partition}: {error}")
+
+    return partition
+
+
+def attach_partition(conn: connection, table_name: str, partition: str, day: date) -> None:
+    """Attaches loaded snapshot table to its parent, making it visible to readers on commit."""
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES IN (%s)").format(
+                    Identifier(table_name),
+                    Identifier(partition)
+                ),
+                (day,)
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't attach partition {partition}: {error}")
+
+
+def get_partitions(conn: connection, table_name: str) -> list:
+    """Returns names of all partitions attached to given table."""
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            (table_name,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def drop_old_partitions(conn: connection, table_name: str, keep: date, archive_root: Optional[str] = None) -> list:
+    """
+    Detaches and drops every partition of given table except the one holding the kept day.
+
+    When archive_root is given every partition is archived there before it is dropped.
+
+    Returns:
+        Names of the dropped partitions.
+    """
+
+    kept_partition = partition_name(table_name, keep)
+    old_partitions = [p for p in get_partitions(conn, table_name) if p != kept_partition]
+    try:
+        with conn.cursor() as cursor:
+            for partition in old_partitions:
+                if archive_root is not None:
+                    archive_snapshot(conn, archive_root, table_name, partition_day(partition), source=partition)
+                cursor.execute(
+                    SQL("ALTER TABLE {} DETACH PARTITION {}").format(Identifier(table_name), Identifier(partition))
+                )
+                cursor.execute(SQL("DROP TABLE {}").format(Identifier(partition)))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't drop old partitions: {error}")
+
+    increment('partitions.dropped', len(old_partitions))
+
+    return old_partitions
+
+
+def begin_snapshot(conn: connection, table_name: str, day: date) -> str:
+    """
+    Prepares the table given day's snapshot is loaded into, batch by batch, until publish_snapshot is called.
+
+    This is a new standalone table shaped like table, invisible to readers until the snapshot is published.
+    For partitioned tables it is attached as a partition, tables that are not partitioned get its rows
+    moved in. A table left unpublished by a failed run is dropped first.
+
+    Returns:
+        Name of the table to load the snapshot into.
+    """
+
+    partition = partition_name(table_name, day)
+    if is_partitioned_table(conn, table_name) and partition in get_partitions(conn, table_name):
+        raise DatabaseOperationError(f"Snapshot {partition} is already published.")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SQL("DROP TABLE IF EXISTS {}").format(Identifier(partition)))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't drop unpublished snapshot {partition}: {error}")
+
+    return create_snapshot_partition(conn, table_name, day)
+
+
+def carry_over_series(conn: connection, table_name: str, target: str, day: date, tickers: Sequence[str]) -> int:
+    """
+    Copies the series of tickers missing from given day's snapshot in target from the latest earlier snapshot.
+
+    A snapshot replaces the previous one whole, so without this a series that couldn't be fetched would
+    be gone until it is fetched again. Carried over rows are dated day like the rest of the snapshot.
+
+    Returns:
+        Number of carried over rows.
+    """
+
+    query = SQL('''
+        INSERT INTO {target} (ticker_name, dates, values, date_created)
+        SELECT previous.ticker_name, previous.dates, previous.values, %(day)s
+        FROM {table} AS previous
+        WHERE previous.date_created = (SELECT max(date_created) FROM {table} WHERE date_created < %(day)s)
+          AND previous.ticker_name = ANY(%(tickers)s)
+          AND NOT EXISTS (SELECT 1 FROM {target} AS loaded
+                          WHERE loaded.ticker_name = previous.ticker_name AND loaded.date_created = %(day)s)
+    ''').format(target=Identifier(target), table=Identifier(table_name))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, {'day': day, 'tickers': list(tickers)})
+            carried = cursor.rowcount
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't carry over missing series into {target}: {error}")
+
+    increment('rows.carried_over', carried)
+
+    return carried
+
+
+def move_snapshot(conn: connection, table_name: str, target: str) -> None:
+    """Moves the rows of a snapshot staged in target into table, which is not partitioned, and drops target."""
+
+    try:
+        with conn.cursor() as cursor:
+            # generated columns are computed again as the rows are inserted
+            cursor.execute(
+                "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 "
+                "AND NOT attisdropped AND attgenerated = '' ORDER BY attnum",
+                (table_name,)
+            )
+            columns = SQL(', ').join(Identifier(row[0]) for row in cursor.fetchall())
+            cursor.execute(
+                SQL("INSERT INTO {} ({columns}) SELECT {columns} FROM {}").format(
+                    Identifier(table_name), Identifier(target), columns=columns)
+            )
+            increment('rows.moved', cursor.rowcount)
+            cursor.execute(SQL("DROP TABLE {}").format(Identifier(target)))
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't move snapshot {target} into {table_name}: {error}")
+
+
+def publish_snapshot(conn: connection, table_name: str, target: str, day: date,
+                     archive_root: Optional[str] = None, replace: bool = True) -> None:
+    """
+    Makes a snapshot loaded into the target returned by begin_snapshot the only one in table.
+
+    Partitions are attached and the old ones dropped. Tables that are not partitioned get the staged rows
+    moved in and fall back to deleting older rows with delete_old_data. Older snapshots are archived to
+    archive_root first if given. With replace set to False the snapshot is added next to the others,
+    which backfills of past days do.
+    """
+
+    if target != table_name and not is_partitioned_table(conn, table_name):
+        move_snapshot(conn, table_name, target)
+        target = table_name
+
+    if target != table_name:
+        attach_partition(conn, table_name, target, day)
+        if replace:
+            drop_old_partitions(conn, table_name, keep=day, archive_root=archive_root)
+    elif replace:
+        delete_old_data(conn, table_name=table_name, date_column='date_created', archive_root=archive_root)
+
+
+def replace_snapshot(data: Sequence[tuple], conn: connection, table_name: str, columns: Sequence[str],
+                     day: date, archive_root: Optional[str] = None) -> None:
+    """
+    Loads given day's snapshot into table and removes earlier snapshots.
+
+    The rows are loaded into a fresh table from begin_snapshot, which publish_snapshot then attaches
+    or moves into table, all in the caller's transaction. Earlier snapshots are archived to
+    archive_root first if given.
+    """
+
+    target = begin_snapshot(conn, table_name, day)
+    load_data(data, conn, table_name=target, columns=columns)
+    publish_snapshot(conn, table_name, target, day, archive_root=archive_root)
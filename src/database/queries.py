@@ -0,0 +1,227 @@
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional, Sequence
+from psycopg2.extensions import connection
+from psycopg2.sql import SQL, Identifier
+from src.database.db import DatabaseOperationError
+
+
+logger = logging.getLogger(__name__)
+
+# economy tables the read path can serve from, with the column telling versions of an observation apart
+ECONOMY_SOURCES = {
+    'snapshot': ('economy_data', 'date_created'),
+    'incremental': ('economy_observations', 'last_revised'),
+}
+
+# text search configuration of the market_news search_vector column, queries must be parsed with the same one
+NEWS_SEARCH_CONFIG = 'english'
+
+
+@dataclass(frozen=True)
+class LatestValue:
+    """Most recent non-null observation of a series."""
+
+    ticker_name: str
+    dates: date
+    values: float
+
+
+@dataclass(frozen=True)
+class Observation:
+    """Single observation of a series."""
+
+    dates: date
+    values: Optional[float]
+
+
+@dataclass(frozen=True)
+class NewsItem:
+    """News article as shown to readers."""
+
+    title: Optional[str]
+    description: Optional[str]
+    url: str
+    source: Optional[str]
+    image: Optional[str]
+    category: Optional[str]
+    date_created: date
+
+
+@dataclass(frozen=True)
+class NewsMatch(NewsItem):
+    """News article matching a search, with its relevance."""
+
+    rank: float
+
+
+def latest_values_view(table_name: str) -> str:
+    """Returns name of the materialized view holding the latest value of every series in given table."""
+
+    return f"{table_name}_latest"
+
+
+def create_latest_values_view(conn: connection, table_name: str, version_column: str) -> None:
+    """
+    Creates the covering series index and the latest values materialized view of an economy table.
+
+    The index covers ticker_name, dates and the version column and includes values, so series and
+    latest value lookups are answered by index-only scans. The view gets a unique index on ticker_name,
+    which REFRESH MATERIALIZED VIEW CONCURRENTLY requires.
+    """
+
+    view = latest_values_view(table_name)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("CREATE INDEX IF NOT EXISTS {} ON {} (ticker_name, dates, {}) INCLUDE (values)").format(
+                    Identifier(f"{table_name}_series_idx"), Identifier(table_name), Identifier(version_column))
+            )
+            cursor.execute(
+                SQL('''CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS
+                       SELECT DISTINCT ON (ticker_name) ticker_name, dates, values
+                       FROM {table}
+                       WHERE values IS NOT NULL
+                       ORDER BY ticker_name, dates DESC, {version} DESC''').format(
+                    view=Identifier(view), table=Identifier(table_name), version=Identifier(version_column))
+            )
+            cursor.execute(
+                SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} (ticker_name)").format(
+                    Identifier(f"{view}_ticker_key"), Identifier(view))
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't create latest values view of {table_name}: {error}")
+
+
+def create_news_index(conn: connection, table_name: str = 'market_news') -> None:
+    """Creates the index serving recent news by category."""
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("CREATE INDEX IF NOT EXISTS {} ON {} (category, date_created DESC, id DESC)").format(
+                    Identifier(f"{table_name}_category_recent_idx"), Identifier(table_name))
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't create news index: {error}")
+
+
+def create_read_models(conn: connection) -> None:
+    """Creates the indexes and materialized views used by the read path, for every economy source."""
+
+    for table_name, version_column in ECONOMY_SOURCES.values():
+        create_latest_values_view(conn, table_name, version_column)
+    create_news_index(conn)
+
+
+def refresh_latest_values(conn: connection, table_name: str) -> None:
+    """
+    Refreshes the latest values view of given table.
+
+    The refresh runs CONCURRENTLY, so dashboards keep reading the previous contents meanwhile.
+    """
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}").format(Identifier(latest_values_view(table_name)))
+            )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't refresh latest values of {table_name}: {error}")
+
+
+def get_latest_values(conn: connection, tickers: Optional[Sequence[str]] = None,
+                      table_name: str = 'economy_data') -> List[LatestValue]:
+    """
+    Returns the latest non-null value of every series, or of the given tickers only.
+
+    Values are read from the materialized view, so they are as of the last refresh.
+    """
+
+    query = SQL("SELECT ticker_name, dates, values FROM {}").format(Identifier(latest_values_view(table_name)))
+    params = ()
+    if tickers is not None:
+        query += SQL(" WHERE ticker_name = ANY(%s)")
+        params = (list(tickers),)
+    query += SQL(" ORDER BY ticker_name")
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return [LatestValue(*row) for row in cursor]
+
+
+def get_series(conn: connection, ticker: str, start: Optional[date] = None, end: Optional[date] = None,
+               table_name: str = 'economy_data', version_column: str = 'date_created') -> List[Observation]:
+    """
+    Returns observations of a series between start and end, both inclusive, ordered by date.
+
+    If a date has several versions, e.g. rows of two snapshots while a new one is being loaded, the
+    latest version is returned.
+    """
+
+    query = SQL('''
+        SELECT DISTINCT ON (dates) dates, values
+        FROM {table}
+        WHERE ticker_name = %(ticker)s
+          AND (%(start)s::date IS NULL OR dates >= %(start)s)
+          AND (%(end)s::date IS NULL OR dates <= %(end)s)
+        ORDER BY dates, {version} DESC
+    ''').format(table=Identifier(table_name), version=Identifier(version_column))
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, {'ticker': ticker, 'start': start, 'end': end})
+        return [Observation(*row) for row in cursor]
+
+
+def get_recent_news(conn: connection, category: str, limit: int = 20, since: Optional[date] = None,
+                    table_name: str = 'market_news') -> List[NewsItem]:
+    """Returns the most recently loaded articles of a category, newest first."""
+
+    query = SQL('''
+        SELECT title, description, url, source, image, category, date_created
+        FROM {table}
+        WHERE category = %(category)s AND (%(since)s::date IS NULL OR date_created >= %(since)s)
+        ORDER BY date_created DESC, id DESC
+        LIMIT %(limit)s
+    ''').format(table=Identifier(table_name))
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, {'category': category, 'since': since, 'limit': limit})
+        return [NewsItem(*row) for row in cursor]
+
+
+def search_news(conn: connection, query: str, category: Optional[str] = None, since: Optional[date] = None,
+                until: Optional[date] = None, limit: int = 20, table_name: str = 'market_news') -> List[NewsMatch]:
+    """
+    Returns the articles matching a search, most relevant first.
+
+    The query takes web search syntax, e.g. "rate hike" -ecb or inflation OR cpi, and is matched against
+    the GIN indexed search_vector column, where words of the title weigh more than those of the
+    description. Articles of equal rank are ordered newest first.
+
+    Args:
+        query: Search terms.
+        category: Category to search in, all of them when not given.
+        since: First date_created to search, inclusive.
+        until: Last date_created to search, inclusive.
+        limit: Maximum number of articles returned.
+    """
+
+    statement = SQL('''
+        SELECT title, description, url, source, image, category, date_created,
+               ts_rank(search_vector, search_query) AS rank
+        FROM {table}, websearch_to_tsquery(%(config)s::regconfig, %(query)s) AS search_query
+        WHERE search_vector @@ search_query
+          AND (%(category)s::varchar IS NULL OR category = %(category)s)
+          AND (%(since)s::date IS NULL OR date_created >= %(since)s)
+          AND (%(until)s::date IS NULL OR date_created <= %(until)s)
+        ORDER BY rank DESC, date_created DESC, id DESC
+        LIMIT %(limit)s
+    ''').format(table=Identifier(table_name))
+
+    params = {'config': NEWS_SEARCH_CONFIG, 'query': query, 'category': category, 'since': since, 'until': until,
+              'limit': limit}
+    with conn.cursor() as cursor:
+        cursor.execute(statement, params)
+        return [NewsMatch(*row) for row in cursor]
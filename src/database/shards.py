@@ -0,0 +1,220 @@
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+from psycopg2.extensions import connection
+from psycopg2.sql import SQL, Identifier
+from src.database.db import DatabaseOperationError, try_advisory_lock, advisory_unlock, holds_advisory_lock
+from src.database.db_utils import get_partitions, publish_snapshot, carry_over_series
+
+
+logger = logging.getLogger(__name__)
+
+# source name of the shard loading the news
+NEWS_SOURCE = 'news'
+
+# tables the economy shards and the news shard load into
+ECONOMY_TABLE = 'economy_data'
+NEWS_TABLE = 'market_news'
+
+# attempts after which a shard that keeps failing is given up on, leaving the day unpublished
+MAX_SHARD_ATTEMPTS = 3
+
+
+@dataclass
+class Shard:
+    """Sources one worker fetches and loads, and the table they go to, None to merge into the published data."""
+
+    run_date: date
+    shard: int
+    sources: List[str]
+    target: Optional[str]
+    attempts: int
+
+
+def shard_lock_key(day: date, shard: int) -> str:
+    """Returns the advisory lock key a worker holds while it processes a shard."""
+
+    return f"ingest_shard:{day}:{shard}"
+
+
+def shard_table(sources: Sequence[str]) -> str:
+    """Returns the table a shard with given sources loads into."""
+
+    return NEWS_TABLE if list(sources) == [NEWS_SOURCE] else ECONOMY_TABLE
+
+
+def lock_run(conn: connection, day: date) -> None:
+    """Serializes planning and publishing of given day's run, until the caller's transaction ends."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"ingest_run:{day}",))
+
+
+def get_shard_progress(conn: connection, day: date) -> dict:
+    """Returns the number of shards of given day's run in every status."""
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT status, COUNT(*) FROM ingest_shards WHERE run_date = %s GROUP BY status", (day,))
+        return dict(cursor.fetchall())
+
+
+def enqueue_shards(conn: connection, day: date, shards: Sequence[Tuple[Sequence[str], Optional[str]]]) -> None:
+    """
+    Queues the shards of given day's run.
+
+    Args:
+        shards: Sources of every shard, with the table it is loaded into.
+    """
+
+    try:
+        with conn.cursor() as cursor:
+            for number, (sources, target) in enumerate(shards):
+                cursor.execute(
+                    "INSERT INTO ingest_shards (run_date, shard, sources, target) VALUES (%s, %s, %s, %s)",
+                    (day, number, list(sources), target)
+                )
+    except Exception as error:
+        raise DatabaseOperationError(f"Couldn't enqueue shards: {error}")
+
+
+def claim_shard(conn: connection, day: date, worker: str) -> Optional[Shard]:
+    """
+    Claims the next shard of given day's run for worker, or returns None when no shard is left.
+
+    Pending shards are picked with FOR UPDATE SKIP LOCKED, so concurrent workers never wait on each
+    other. The worker then holds the shard's advisory lock until finish_shard, on its own session:
+    a running shard whose lock is free belongs to a worker that died, and is claimed again. Rows a
+    dead worker already loaded into the snapshot table are removed before the shard is handed out.
+    The locks are reentrant, so shards whose lock this session already holds are never claimed.
+    """
+
+    skipped = []
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(
+                '''SELECT shard, sources, target, attempts FROM ingest_shards
+                   WHERE run_date = %s AND status IN ('pending', 'running') AND shard <> ALL(%s)
+                   ORDER BY status <> 'pending', shard
+                   LIMIT 1
+                   FOR UPDATE SKIP LOCKED''',
+                (day, skipped)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            shard = Shard(day, *row)
+            key = shard_lock_key(day, shard.shard)
+            if not holds_advisory_lock(conn, key) and try_advisory_lock(conn, key):
+                break
+            # running on a live worker, possibly this one
+            skipped.append(shard.shard)
+
+        try:
+            if shard.attempts and shard.target is not None:
+                logger.warning(f"Shard {shard.shard} was left unfinished, reloading it.")
+                if shard_table(shard.sources) == NEWS_TABLE:
+                    # the news shard alone loads its target, the signatures it stored go too
+                    cursor.execute(
+                        SQL("DELETE FROM news_signatures WHERE date_created = %(day)s AND url_hash IN "
+                            "(SELECT url_hash FROM {} WHERE date_created = %(day)s)").format(Identifier(shard.target)),
+                        {'day': day}
+                    )
+                    cursor.execute(SQL("DELETE FROM {} WHERE date_created = %s").format(Identifier(shard.target)),
+                                   (day,))
+                else:
+                    cursor.execute(
+                        SQL("DELETE FROM {} WHERE ticker_name = ANY(%s) AND date_created = %s").format(
+                            Identifier(shard.target)),
+                        (shard.sources, day)
+                    )
+            cursor.execute(
+                '''UPDATE ingest_shards
+                   SET status = 'running', worker = %s, attempts = attempts + 1, claimed_at = now(), error = NULL
+                   WHERE run_date = %s AND shard = %s''',
+                (worker, day, shard.shard)
+            )
+        except Exception as error:
+            # session level locks outlive the transaction, release it on a usable one
+            conn.rollback()
+            advisory_unlock(conn, shard_lock_key(day, shard.shard))
+            raise DatabaseOperationError(f"Couldn't claim shard {shard.shard}: {error}")
+
+    shard.attempts += 1
+    return shard
+
+
+def finish_shard(conn: connection, shard: Shard, error: Optional[Exception] = None) -> None:
+    """
+    Marks a claimed shard done, or failed with error, and releases its advisory lock.
+
+    A failed shard goes back to pending until it has failed MAX_SHARD_ATTEMPTS times. The run can't
+    be published then, so the staging partition the shard loaded into is dropped with it.
+    """
+
+    if error is None:
+        status = 'done'
+    else:
+        status = 'failed' if shard.attempts >= MAX_SHARD_ATTEMPTS else 'pending'
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''UPDATE ingest_shards SET status = %s, finished_at = now(), error = %s
+                   WHERE run_date = %s AND shard = %s''',
+                (status, None if error is None else str(error), shard.run_date, shard.shard)
+            )
+            table_name = shard_table(shard.sources)
+            if status == 'failed' and shard.target not in (None, table_name) \
+                    and shard.target not in get_partitions(conn, table_name):
+                logger.warning(f"Shard {shard.shard} failed {shard.attempts} times, dropping {shard.target}.")
+                cursor.execute(SQL("DROP TABLE IF EXISTS {}").format(Identifier(shard.target)))
+    except Exception as update_error:
+        conn.rollback()
+        advisory_unlock(conn, shard_lock_key(shard.run_date, shard.shard))
+        raise DatabaseOperationError(f"Couldn't finish shard {shard.shard}: {update_error}")
+
+    advisory_unlock(conn, shard_lock_key(shard.run_date, shard.shard))
+
+
+def publish_run(conn: connection, day: date, archive_root: Optional[str] = None) -> bool:
+    """
+    Publishes given day's economy and news snapshots once every shard of the run is done.
+
+    Every worker calls this after its last shard, the run lock makes sure only one of them publishes.
+    Shards are marked published with the snapshots, so later calls are no-ops. Economy series that
+    couldn't be fetched are carried over from the previous snapshot, older snapshots are archived to
+    archive_root first if given.
+
+    Returns:
+        Whether the snapshot was published by this call.
+    """
+
+    lock_run(conn, day)
+    progress = get_shard_progress(conn, day)
+    if set(progress) != {'done'}:
+        if progress and 'published' not in progress:
+            logger.info(f"Not publishing yet, shards by status: {progress}.")
+        return False
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT DISTINCT target, sources FROM ingest_shards WHERE run_date = %s AND target IS NOT NULL",
+                       (day,))
+        targets = {target: shard_table(sources) for target, sources in cursor.fetchall()}
+        cursor.execute(
+            "SELECT DISTINCT unnest(sources) FROM ingest_shards WHERE run_date = %s AND sources <> %s",
+            (day, [NEWS_SOURCE])
+        )
+        tickers = [row[0] for row in cursor.fetchall()]
+        for target, table_name in targets.items():
+            if target in get_partitions(conn, table_name):
+                continue
+            if table_name == ECONOMY_TABLE:
+                carried = carry_over_series(conn, table_name, target, day, tickers)
+                if carried:
+                    logger.warning(f"Carried {carried} observations of series that couldn't be fetched over "
+                                   f"from the previous snapshot.")
+            publish_snapshot(conn, table_name, target, day, archive_root=archive_root)
+        cursor.execute("UPDATE ingest_shards SET status = 'published' WHERE run_date = %s", (day,))
+
+    return True
@@ -0,0 +1,155 @@
+"""
+Lightweight per-invocation instrumentation.
+
+A Metrics object collects timed spans and counters for one invocation and emits them as a single
+CloudWatch Embedded Metric Format (EMF) JSON line. The active Metrics object and span are held in
+context variables, so code anywhere in the call tree records into them through the module level
+span(), annotate() and increment() helpers, which do nothing when no Metrics object is active.
+"""
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_metrics: ContextVar[Optional['Metrics']] = ContextVar('metrics', default=None)
+_span: ContextVar[Optional[dict]] = ContextVar('span', default=None)
+
+
+class Metrics:
+    """
+    Spans and counters of one invocation.
+
+    Args:
+        namespace: CloudWatch namespace of the emitted metrics.
+        dimensions: Dimension names and values attached to every metric.
+        max_spans: Maximum number of spans listed in the emitted record, which CloudWatch limits in size.
+    """
+
+    def __init__(self, namespace: str = 'NewsAndInfo', dimensions: Optional[dict] = None,
+                 max_spans: int = 500) -> None:
+        self.namespace = namespace
+        self.max_spans = max_spans
+        self.dimensions = dimensions or {'Function': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')}
+        self.spans = []
+        self.counters = defaultdict(float)
+        self.units = {}
+
+    @contextmanager
+    def activate(self) -> Iterator['Metrics']:
+        """Makes this the Metrics object the module level helpers record into."""
+        token = _metrics.set(self)
+        try:
+            yield self
+        finally:
+            _metrics.reset(token)
+
+    def record(self) -> dict:
+        """Returns the EMF record: summed span durations and counters as metrics, spans as a property."""
+
+        values, definitions = {}, []
+        durations = defaultdict(float)
+        for span_record in self.spans:
+            durations[f"{span_record['name']}.duration"] += span_record['duration_ms']
+        for name, value in durations.items():
+            values[name] = round(value, 3)
+            definitions.append({'Name': name, 'Unit': 'Milliseconds'})
+        for name, value in self.counters.items():
+            values[name] = value
+            definitions.append({'Name': name, 'Unit': self.units[name]})
+
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': definitions,
+                }],
+            },
+            **self.dimensions,
+            **values,
+            'spans': self.spans[:self.max_spans],
+            'spans_dropped': max(0, len(self.spans) - self.max_spans),
+        }
+
+    def emit(self, stream=None) -> None:
+        """Writes the EMF record as one JSON line, which CloudWatch turns into metrics."""
+        print(json.dumps(self.record(), default=str), file=stream or sys.stdout, flush=True)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[dict]:
+    """
+    Times the enclosed block as a span of the active Metrics object.
+
+    Yields the span's attribute dict, which annotate() also updates while the span is current.
+    """
+
+    metrics = _metrics.get()
+    span_record = {'name': name, **attributes}
+    if metrics is None:
+        yield span_record
+        return
+
+    token = _span.set(span_record)
+    start = time.perf_counter()
+    try:
+        yield span_record
+    except BaseException as error:
+        span_record['error'] = type(error).__name__
+        raise
+    finally:
+        span_record['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        _span.reset(token)
+        metrics.spans.append(span_record)
+
+
+def annotate(**attributes) -> None:
+    """Adds attributes to the current span, if any."""
+    span_record = _span.get()
+    if span_record is not None:
+        span_record.update(attributes)
+
+
+def increment(name: str, value: float = 1, unit: str = 'Count') -> None:
+    """Adds value to a counter of the active Metrics object, if any."""
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.counters[name] += value
+        metrics.units[name] = unit
+
+
+async def traced(name: str, awaitable, **attributes):
+    """Awaits awaitable inside a span, for timing work handed to asyncio.create_task."""
+    with span(name, **attributes):
+        return await awaitable
+
+
+@contextmanager
+def profiled(enabled: bool, path: str, top: int = 25) -> Iterator[None]:
+    """Profiles the enclosed block with cProfile when enabled, dumps the stats to path and logs the top entries."""
+
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        logger.info(f"Saved profile of the run to {path}, top {top} entries by cumulative time:")
+        stats.sort_stats('cumulative').print_stats(top)
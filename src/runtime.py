@@ -0,0 +1,57 @@
+import asyncio
+import aiohttp
+from typing import Optional
+from src.database.async_db import AsyncDatabase
+from src.database.db import DEFAULT_MAX_IDLE
+
+
+class RuntimeContext:
+    """
+    Keeps the event loop, database connection and HTTP connection pool alive between lambda invocations.
+
+    Lambda reuses the process of a warm container, so a context created at module level lets later
+    invocations skip the database and TLS handshakes. The event loop is kept as well, because an
+    aiohttp.ClientSession is bound to the loop it was created on and asyncio.run closes its loop.
+
+    Args:
+        db_params: Keyword arguments for Database, used by the AsyncDatabase in the db attribute.
+        pool_limit: Maximum number of open HTTP connections.
+        pool_limit_per_host: Maximum number of open HTTP connections per host.
+        dns_ttl: Seconds resolved host names are cached for.
+        keepalive_timeout: Seconds an idle HTTP connection is kept open.
+        db_max_idle: Seconds the database connection may stay unused before it is health-checked.
+    """
+
+    def __init__(self, db_params: dict, pool_limit: int = 20, pool_limit_per_host: int = 8,
+                 dns_ttl: int = 300, keepalive_timeout: float = 60, db_max_idle: float = DEFAULT_MAX_IDLE) -> None:
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.loop = asyncio.new_event_loop()
+        self.db = AsyncDatabase(db_params, max_idle=db_max_idle)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def run(self, coroutine):
+        """Runs coroutine to completion on the context's persistent event loop."""
+        asyncio.set_event_loop(self.loop)
+        return self.loop.run_until_complete(coroutine)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared HTTP session, creating it on first use. Must be called from the running loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def close(self) -> None:
+        """Closes the HTTP session, the database connection and the event loop."""
+        if self._session is not None and not self._session.closed:
+            self.loop.run_until_complete(self._session.close())
+        self.db.close()
+        self.loop.close()
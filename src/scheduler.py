@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """Source refreshed every interval seconds by calling refresh."""
+
+    name: str
+    interval: float
+    refresh: Callable[[], Awaitable[None]]
+    initial_delay: float = 0
+    runs: int = 0
+    wake: Optional[asyncio.Event] = field(default=None, repr=False)
+
+
+class Scheduler:
+    """
+    Runs every job on its own interval until stopped, each in a task of its own.
+
+    A job never overlaps itself: its next refresh starts interval seconds after the previous one
+    started, or right after it ends when it took longer, in which case the missed refreshes are
+    coalesced into that one. Refreshes requested with trigger() are coalesced the same way, however
+    many arrive while a refresh runs, a single one follows it.
+
+    Args:
+        shutdown_timeout: Seconds running refreshes get to finish once the scheduler is stopped,
+            they are cancelled afterwards.
+
+    Methods:
+        add(): Adds a job, before the scheduler runs.
+        trigger(): Requests an immediate refresh of a job.
+        run(): Runs the jobs until stop() is called.
+        stop(): Stops starting new refreshes and makes run() return once the running ones finish.
+    """
+
+    def __init__(self, shutdown_timeout: float = 60) -> None:
+        self.shutdown_timeout = shutdown_timeout
+        self.jobs: Dict[str, Job] = {}
+        self._stopping: Optional[asyncio.Event] = None
+
+    def add(self, name: str, interval: float, refresh: Callable[[], Awaitable[None]],
+            initial_delay: float = 0) -> Job:
+        job = Job(name, interval, refresh, initial_delay)
+        self.jobs[name] = job
+        return job
+
+    def trigger(self, name: Optional[str] = None) -> None:
+        """Requests an immediate refresh of the named job, or of every job when no name is given."""
+        for job in ([self.jobs[name]] if name is not None else self.jobs.values()):
+            if job.wake is not None:
+                job.wake.set()
+
+    def stop(self) -> None:
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self) -> None:
+        # events are bound to the running loop, so they are created here rather than in __init__
+        self._stopping = asyncio.Event()
+        for job in self.jobs.values():
+            job.wake = asyncio.Event()
+
+        tasks = [asyncio.create_task(self._run_job(job)) for job in self.jobs.values()]
+        await self._stopping.wait()
+
+        _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+        for task in pending:
+            logger.warning("Cancelling a refresh still running after the shutdown timeout.")
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_job(self, job: Job) -> None:
+        loop = asyncio.get_running_loop()
+        delay = job.initial_delay
+        while not await self._wait(job, delay):
+            job.wake.clear()
+            started = loop.time()
+            try:
+                await job.refresh()
+            except Exception as error:
+                logger.error(f"Refresh of {job.name} failed: {error}")
+            job.runs += 1
+
+            elapsed = loop.time() - started
+            if elapsed > job.interval:
+                logger.warning(f"Refresh of {job.name} took {elapsed:.0f}s, longer than its {job.interval:.0f}s "
+                               f"interval, the missed refreshes are coalesced into the next one.")
+            delay = max(0.0, job.interval - elapsed)
+
+    async def _wait(self, job: Job, delay: float) -> bool:
+        """Waits delay seconds, or until the job is triggered or the scheduler stopped, returns whether it stopped."""
+
+        if self._stopping.is_set():
+            return True
+        waiters = [asyncio.ensure_future(self._stopping.wait()), asyncio.ensure_future(job.wake.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return self._stopping.is_set()
@@ -0,0 +1,154 @@
+import os
+import re
+import json
+import time
+import hashlib
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+@dataclass
+class CachedResponse:
+    """A cached response body together with its validators and expiry time."""
+
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    expires: float = 0.0
+
+    def is_fresh(self) -> bool:
+        """Returns True if the response can be used without asking the server."""
+        return time.time() < self.expires
+
+    def conditional_headers(self) -> dict:
+        """Returns headers that turn a request for this response into a conditional one."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    File backed cache of HTTP responses keyed by URL.
+
+    Every entry is stored as a body file and a small JSON metadata file named after the hash of the URL.
+    Reads refresh the body file's modification time, which is used to evict the least recently used
+    entries once the bodies take more than max_bytes on disk.
+
+    Args:
+        directory: Directory holding the cache files, created if missing.
+        max_bytes: Upper bound for the total size of cached bodies.
+        default_ttl: Seconds a response without validators or caching headers is considered fresh.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, default_ttl: int = 6 * 60 * 60) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Returns the cached response for given URL or None if there is none."""
+
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, 'rb') as body_file:
+                body = body_file.read()
+            os.utime(body_path)
+        except (OSError, ValueError):
+            return None
+
+        return CachedResponse(body=body, **meta)
+
+    def put(self, url: str, body: bytes, headers: Mapping[str, str]) -> CachedResponse:
+        """Stores response body with the validators and expiry taken from its headers."""
+
+        cached = CachedResponse(
+            body=body,
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            expires=self._expires(headers),
+        )
+        meta_path, body_path = self._paths(url)
+        self._write(body_path, body)
+        self._write_meta(meta_path, cached)
+        self._evict()
+        return cached
+
+    def refresh(self, url: str, cached: CachedResponse, headers: Mapping[str, str]) -> CachedResponse:
+        """Updates validators and expiry of an entry after the server answered 304 Not Modified."""
+
+        cached.etag = headers.get('ETag', cached.etag)
+        cached.last_modified = headers.get('Last-Modified', cached.last_modified)
+        cached.expires = self._expires(headers, validators=bool(cached.etag or cached.last_modified))
+        meta_path, _ = self._paths(url)
+        self._write_meta(meta_path, cached)
+        return cached
+
+    def _expires(self, headers: Mapping[str, str], validators: Optional[bool] = None) -> float:
+        """
+        Returns the time until which a response is fresh.
+
+        Explicit Cache-Control max-age or Expires headers win. Otherwise a response with validators
+        is revalidated on every use, and one without falls back to default_ttl.
+        """
+
+        now = time.time()
+        cache_control = headers.get('Cache-Control', '')
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return now
+        max_age = _MAX_AGE.search(cache_control)
+        if max_age:
+            return now + int(max_age.group(1))
+        if headers.get('Expires'):
+            try:
+                return parsedate_to_datetime(headers['Expires']).timestamp()
+            except (TypeError, ValueError):
+                return now
+
+        if validators is None:
+            validators = bool(headers.get('ETag') or headers.get('Last-Modified'))
+        return now if validators else now + self.default_ttl
+
+    def _write(self, path: str, data: bytes) -> None:
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+
+    def _write_meta(self, path: str, cached: CachedResponse) -> None:
+        meta = {'etag': cached.etag, 'last_modified': cached.last_modified, 'expires': cached.expires}
+        self._write(path, json.dumps(meta).encode())
+
+    def _evict(self) -> None:
+        """Removes least recently used entries until the cached bodies fit in max_bytes."""
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.body'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (body_path, body_path[:-len('.body')] + '.json'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
@@ -0,0 +1,156 @@
+import re
+import zlib
+import hashlib
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# query parameters that only track where a click came from and don't change the article
+TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'cmpid', 'ncid', 'ocid'})
+
+
+_WORD = re.compile(r'\w+')
+
+# prime just above 2**32, the modulus of the universal hash functions, whose values are then reduced
+# modulo 2**32 to fit the uint32 signatures
+_PRIME = np.uint64(4294967311)
+_SIGNATURE_RANGE = np.uint64(2 ** 32)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes an article URL so that links to the same article compare equal.
+
+    http and https are treated alike, the host is lower-cased and loses its www. prefix, default
+    ports, fragments, utm_* and other tracking parameters and trailing slashes are dropped, and the
+    remaining query parameters are sorted.
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = 'https' if parts.scheme.lower() == 'http' else parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS)
+    path = parts.path.rstrip('/') or '/'
+
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def url_hash(url: str) -> str:
+    """Returns the hex SHA-1 of the normalized URL, used as the article's identity in market_news."""
+
+    return hashlib.sha1(normalize_url(url).encode()).hexdigest()
+
+
+def shingles(text: str, size: int = 2) -> set:
+    """Returns the set of lower-cased word size-grams of text, or the whole text if it is shorter."""
+
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures of shingle sets with num_perm universal hash functions at once.
+
+    The share of equal positions in two signatures estimates the Jaccard similarity of the sets.
+    The hash functions are derived from seed, so signatures from different runs are comparable.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1) -> None:
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = generator.randint(0, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, shingle_set: Iterable[str]) -> np.ndarray:
+        """Returns the uint32 signature of the shingles; an empty set gets the all-max signature."""
+
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingle_set), dtype=np.uint64)
+        if not len(hashes):
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        # a and the hashes are below 2**32, so a * hash + b never overflows uint64
+        permuted = (self._a * hashes[np.newaxis, :] + self._b) % _PRIME % _SIGNATURE_RANGE
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimates the Jaccard similarity of two MinHash signatures."""
+
+    return float(np.mean(first == second))
+
+
+class MinHashLSH:
+    """
+    Locality sensitive hashing index of MinHash signatures.
+
+    Signatures are split into bands and every band is hashed to a bucket. Two signatures become
+    candidates if they share a bucket in at least one band, which is likely for similar sets and
+    unlikely for different ones, so finding candidates takes roughly constant time per signature.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: Dict[Tuple[int, bytes], List[Hashable]] = defaultdict(list)
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def insert(self, key: Hashable, signature: np.ndarray) -> None:
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].append(key)
+
+    def query(self, signature: np.ndarray, threshold: float) -> List[Hashable]:
+        """Returns keys of indexed signatures with estimated similarity of at least threshold."""
+
+        candidates = {key for band_key in self._band_keys(signature) for key in self._buckets.get(band_key, ())}
+        return [key for key in candidates if similarity(self._signatures[key], signature) >= threshold]
+
+
+def drop_near_duplicates(news: Sequence[tuple], known_signatures: Iterable[Tuple[str, bytes]],
+                         threshold: float = 0.7, num_perm: int = 128, bands: int = 32) -> Tuple[list, list]:
+    """
+    Collapses near-duplicate articles to one canonical row.
+
+    Articles are compared on the shingles of their title and description. An article whose estimated
+    similarity to a known article, or to an earlier article in news, reaches threshold is dropped, so
+    each cluster keeps the article seen first.
+
+    Args:
+        news: market_news rows, with title, description and url_hash at positions 0, 1 and 8.
+        known_signatures: (url_hash, signature bytes) of articles already loaded.
+        threshold: Estimated Jaccard similarity from which two articles are duplicates.
+
+    Returns:
+        The kept rows and the (url_hash, signature bytes) of the kept rows.
+    """
+
+    hasher = MinHasher(num_perm)
+    index = MinHashLSH(num_perm, bands)
+    for key, signature in known_signatures:
+        index.insert(key, np.frombuffer(signature, dtype='<u4'))
+
+    kept, kept_signatures = [], []
+    for row in news:
+        signature = hasher.signature(shingles(f"{row[0] or ''} {row[1] or ''}"))
+        if index.query(signature, threshold):
+            continue
+        index.insert(row[8], signature)
+        kept.append(row)
+        kept_signatures.append((row[8], signature.astype('<u4').tobytes()))
+
+    return kept, kept_signatures
@@ -0,0 +1,220 @@
+import numpy as np
+from datetime import date
+from typing import Iterator, Mapping, Optional, Sequence
+from src.scripts.parsing import SeriesBatch
+from config.derived import DERIVED_METRICS
+
+
+# days a lagged or window start observation may lie before its target date, by series frequency:
+# daily series skip weekends and holidays, weekly ones are a month apart on different weekdays,
+# the others are aligned to their period so only month length differences remain
+TOLERANCE_DAYS = {'D': 5, 'W': 6, 'M': 3, 'Q': 3, 'A': 3}
+
+# fewest observations a rolling window needs
+MIN_WINDOW_OBSERVATIONS = 2
+
+
+class DerivedBatch:
+    """
+    Column batch of derived indicator values, one entry per (ticker_name, metric, dates) point.
+
+    Iterating the batch yields derived_indicators rows, NaN values come back as None.
+
+    Attributes:
+        tickers: Object array with the ticker name of each point.
+        metrics: Object array with the metric name of each point.
+        dates: datetime64[D] array with the observation dates.
+        values: float64 array with the derived values, NaN where the metric is undefined.
+        date_computed: Date the values were computed on.
+    """
+
+    __slots__ = ('tickers', 'metrics', 'dates', 'values', 'date_computed')
+
+    def __init__(self, tickers: np.ndarray, metrics: np.ndarray, dates: np.ndarray, values: np.ndarray,
+                 date_computed: date) -> None:
+        self.tickers = tickers
+        self.metrics = metrics
+        self.dates = dates
+        self.values = values
+        self.date_computed = date_computed
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __iter__(self) -> Iterator[tuple]:
+        for ticker, metric, day, value in zip(self.tickers.tolist(), self.metrics.tolist(), self.dates.tolist(),
+                                              self.values.tolist()):
+            yield ticker, metric, day, None if value != value else value, self.date_computed
+
+
+def shift_months(dates: np.ndarray, months: int) -> np.ndarray:
+    """
+    Moves datetime64[D] dates the given number of calendar months back, or forward if months is negative.
+
+    Days past the end of the target month are clamped to its last day, so 2023-03-31 moves to 2023-02-28.
+    """
+
+    month = dates.astype('datetime64[M]')
+    day_of_month = dates - month.astype('datetime64[D]')
+    target = month - months
+    last_day = (target + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+    return np.minimum(target.astype('datetime64[D]') + day_of_month, last_day)
+
+
+class _SortedSeries:
+    """
+    Points of all series sorted by ticker and date, with sortable integer keys for vectorized lookups.
+
+    A key is the ticker's code times a band width plus the day number, so a single searchsorted call
+    finds dates within each point's own series. Bands are padded by pad_days on both sides so dates
+    shifted by up to pad_days never leave the band of their series.
+    """
+
+    def __init__(self, batch: SeriesBatch, pad_days: int) -> None:
+        self.names, codes = np.unique(batch.tickers, return_inverse=True)
+        order = np.lexsort((batch.dates, codes))
+        self.codes = codes[order]
+        self.tickers = batch.tickers[order]
+        self.dates = batch.dates[order]
+        self.values = batch.values[order]
+        self.days = self.dates.astype(np.int64)
+
+        self._origin = self.days.min() - pad_days
+        self._band = self.days.max() + pad_days + 1 - self._origin
+        self.keys = self.key(self.codes, self.dates)
+
+        starts = np.flatnonzero(np.r_[True, self.codes[1:] != self.codes[:-1]])
+        self.group_start = np.repeat(starts, np.diff(np.r_[starts, len(self.codes)]))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def key(self, codes: np.ndarray, dates: np.ndarray) -> np.ndarray:
+        return codes * self._band + (dates.astype(np.int64) - self._origin)
+
+    def group_means(self) -> np.ndarray:
+        """Returns the mean of each point's series, ignoring NaN values."""
+        valid = ~np.isnan(self.values)
+        sums = np.bincount(self.codes, weights=np.where(valid, self.values, 0), minlength=len(self.names))
+        counts = np.bincount(self.codes, weights=valid, minlength=len(self.names))
+        return (sums / np.maximum(counts, 1))[self.codes]
+
+
+def _change(series: _SortedSeries, months: int, tolerance: np.ndarray) -> np.ndarray:
+    """Percent change of every point against the observation the given months earlier."""
+
+    target = shift_months(series.dates, months)
+    position = np.searchsorted(series.keys, series.key(series.codes, target), side='right') - 1
+    found = position >= series.group_start
+    position = np.where(found, position, 0)
+    found &= target.astype(np.int64) - series.days[position] <= tolerance
+
+    lagged = series.values[position]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(found & (lagged != 0), (series.values - lagged) / np.abs(lagged) * 100, np.nan)
+
+
+def _rolling(series: _SortedSeries, months: int, tolerance: np.ndarray, zscore: bool) -> np.ndarray:
+    """
+    Mean, or standard score, of every point over the observations in its trailing window.
+
+    Window sums come from cumulative sums, so every window costs two lookups whatever its length.
+    Values are centered on their series mean first, which keeps the sums of squares small.
+    """
+
+    start = shift_months(series.dates, months)
+    low = np.searchsorted(series.keys, series.key(series.codes, start), side='right')
+    high = np.arange(1, len(series) + 1)
+    covered = series.days[series.group_start] <= start.astype(np.int64) + tolerance
+
+    means = series.group_means()
+    valid = ~np.isnan(series.values)
+    centered = np.where(valid, series.values - means, 0)
+    sums = np.r_[0, np.cumsum(centered)]
+    squares = np.r_[0, np.cumsum(centered ** 2)]
+    counts = np.r_[0, np.cumsum(valid)]
+
+    count = counts[high] - counts[low]
+    total = sums[high] - sums[low]
+    enough = covered & (count >= MIN_WINDOW_OBSERVATIONS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        window_mean = total / count
+        if not zscore:
+            return np.where(enough, window_mean + means, np.nan)
+        variance = (squares[high] - squares[low] - total * window_mean) / (count - 1)
+        return np.where(enough & valid & (variance > 0), (centered - window_mean) / np.sqrt(variance), np.nan)
+
+
+def _affected(series: _SortedSeries, touched: Mapping[str, Sequence[date]], months: int,
+              tolerance: np.ndarray) -> np.ndarray:
+    """
+    Marks the points whose metric value depends on a touched observation.
+
+    A metric over the trailing months reads observations up to that many months back, so a touched
+    observation affects the points of its series from its own date to the same span later.
+    """
+
+    codes = {name: code for code, name in enumerate(series.names.tolist())}
+    pairs = [(codes[ticker], day) for ticker, days in touched.items() if ticker in codes for day in days]
+    if not pairs:
+        return np.zeros(len(series), dtype=bool)
+
+    touched_codes = np.array([code for code, _ in pairs])
+    touched_dates = np.array([day for _, day in pairs], dtype='datetime64[D]')
+    first = np.searchsorted(series.keys, series.key(touched_codes, touched_dates), side='left')
+    last = np.searchsorted(series.keys, series.key(touched_codes, shift_months(touched_dates, -months))
+                           + tolerance[np.searchsorted(series.codes, touched_codes)], side='right')
+
+    # +1 where an affected range starts and -1 past its end, points with a positive running sum are affected
+    boundaries = np.zeros(len(series) + 1, dtype=np.int64)
+    np.add.at(boundaries, first, 1)
+    np.add.at(boundaries, last, -1)
+    return np.cumsum(boundaries[:-1]) > 0
+
+
+def compute_derived(batch: SeriesBatch, frequencies: Mapping[str, str], metrics: Mapping[str, dict] = DERIVED_METRICS,
+                    touched: Optional[Mapping[str, Sequence[date]]] = None) -> DerivedBatch:
+    """
+    Computes derived metrics of every series in a batch at once.
+
+    Lags and windows are calendar months, and a lagged or window start observation is accepted within
+    the tolerance of its series' frequency, so the same metric works on daily to annual series.
+
+    Args:
+        batch: Full history of the series, as fetched.
+        frequencies: Frequency of every ticker, D(aily) where missing.
+        metrics: Metric definitions by name, see config/derived.py.
+        touched: New or revised observation dates by ticker. When given, only the points whose metric
+            values depend on them are returned, otherwise every point is.
+
+    Returns:
+        A DerivedBatch, with NaN where a metric is undefined, e.g. when there is too little history.
+    """
+
+    if not len(batch):
+        return DerivedBatch(np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty(0, dtype='datetime64[D]'),
+                            np.empty(0, dtype=np.float64), batch.date_created)
+
+    pad_days = max(metric['months'] for metric in metrics.values()) * 31 + 31 + max(TOLERANCE_DAYS.values())
+    series = _SortedSeries(batch, pad_days)
+    series_frequencies = np.array([frequencies.get(name, 'D') for name in series.names.tolist()], dtype=object)
+    tolerance = np.array([TOLERANCE_DAYS[frequency] for frequency in series_frequencies])[series.codes]
+
+    tickers, names, dates, values = [], [], [], []
+    for name, metric in metrics.items():
+        if metric['kind'] == 'change':
+            result = _change(series, metric['months'], tolerance)
+        else:
+            result = _rolling(series, metric['months'], tolerance, zscore=metric['kind'] == 'zscore')
+
+        keep = np.isin(series_frequencies, list(metric.get('frequencies', TOLERANCE_DAYS)))[series.codes]
+        if touched is not None:
+            keep &= _affected(series, touched, metric['months'], tolerance)
+
+        tickers.append(series.tickers[keep])
+        names.append(np.full(np.count_nonzero(keep), name, dtype=object))
+        dates.append(series.dates[keep])
+        values.append(result[keep])
+
+    return DerivedBatch(np.concatenate(tickers), np.concatenate(names), np.concatenate(dates),
+                        np.concatenate(values), batch.date_created)
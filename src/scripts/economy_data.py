@@ -1,40 +1,152 @@
-import aiohttp
 import asyncio
-from src.scripts.utils import get_response_data
-from config.urls import INDICATORS
+import logging
+import aiohttp
+from functools import partial
+from typing import AsyncIterator, Iterable, List, Optional, Sequence
+from src.metrics import span, increment
+from src.scripts.cache import ResponseCache
+from src.scripts.fetch import Fetcher, session_scope
+from src.scripts.parsing import SeriesBatch, parse_series
+from src.scripts.registry import batched
+from src.scripts.schemas import EconSeries, EconSeriesPage
+from config.urls import INDICATORS, ECONDB_SERIES_URL, ECONDB_MULTI_SERIES_URL
 from datetime import datetime
 
 
-async def get_all_indicators_data() -> tuple:
+logger = logging.getLogger(__name__)
+
+
+def multi_series_url(symbols: Sequence[str]) -> str:
+    """Returns the URL of the econdb request fetching all given series at once."""
+
+    return f"{ECONDB_MULTI_SERIES_URL}?tickers=[{','.join(symbols)}]&format=json"
+
+
+async def _fetch_single(fetcher: Fetcher, indicators: List[dict]) -> List[EconSeries]:
+    """Fetches every indicator with a request of its own, returns the series that could be fetched."""
+
+    if not indicators:
+        return []
+    results = await fetcher.fetch_all({indicator['symbol']: indicator['url'] for indicator in indicators})
+    return [result.data for result in results if result.ok]
+
+
+async def _fetch_pages(fetcher: Fetcher, source: str, url: str) -> List[EconSeries]:
+    """Fetches a multi-series response and the pages following it."""
+
+    series = []
+    while url:
+        result = await fetcher.fetch(source, url, schema=EconSeriesPage)
+        if not result.ok:
+            logger.error(f"Couldn't fetch {source} after {result.attempts} attempt(s): {result.error}")
+            break
+        series += result.data.results
+        url = result.data.next
+    return series
+
+
+async def _fetch_multi(fetcher: Fetcher, indicators: List[dict], tickers_per_request: int) -> List[EconSeries]:
     """
-    Asynchronously fetches data from the URLs associates with each indicator and returns a tuple of all fetched records.
+    Fetches econdb indicators tickers_per_request at a time from the multi-series endpoint.
 
-    Returns:
-        A tuple with all the records from URLs.
+    Indicators with a URL of their own, not the econdb series URL of their symbol, are fetched one by one.
+    """
+
+    econdb, others = [], []
+    for indicator in indicators:
+        is_econdb = indicator['url'] == ECONDB_SERIES_URL.format(symbol=indicator['symbol'])
+        (econdb if is_econdb else others).append(indicator)
+
+    groups = [[indicator['symbol'] for indicator in group] for group in batched(econdb, tickers_per_request)]
+    pages = await asyncio.gather(
+        *[_fetch_pages(fetcher, f"{group[0]}..{group[-1]}", multi_series_url(group)) for group in groups],
+        _fetch_single(fetcher, others),
+    )
+    series = [item for page in pages for item in page]
+
+    missing = {indicator['symbol'] for indicator in indicators} - {item.ticker for item in series}
+    if missing:
+        logger.warning(f"{len(missing)} series missing from the responses: {', '.join(sorted(missing)[:20])}")
+    return series
+
+
+async def iter_indicator_batches(cache: Optional[ResponseCache] = None,
+                                 session: Optional[aiohttp.ClientSession] = None,
+                                 indicators: Iterable[dict] = INDICATORS, batch_size: int = 200,
+                                 multi_series: bool = False,
+                                 tickers_per_request: int = 50) -> AsyncIterator[SeriesBatch]:
     """
+    Fetches indicators batch_size at a time and yields the records of every batch as soon as they are parsed.
+
+    The next batch is downloaded while the caller loads the current one, so at most two batches are held
+    in memory whatever the number of indicators. Indicators that still fail after retries are logged and
+    left out.
 
-    indicators = INDICATORS
+    Args:
+        cache: Optional ResponseCache used to avoid downloading series that did not change.
+        session: Optional shared aiohttp.ClientSession, a new one is created and closed when not given.
+        indicators: Indicators to fetch, consumed lazily. All of config.urls.INDICATORS by default.
+        batch_size: Number of indicators per batch.
+        multi_series: Whether econdb series are fetched with the multi-series endpoint, several per request.
+        tickers_per_request: Number of series per multi-series request.
 
-    async with aiohttp.ClientSession() as session:
-        all_records = []
+    Yields:
+        A SeriesBatch per batch of indicators, holding complete series.
+
+    Raises:
+        ConnectionError: If none of the indicators could be fetched.
+    """
 
+    async with session_scope(session) as session:
+        fetcher = Fetcher(session, cache=cache, schema=EconSeries)
+        fetch = partial(_fetch_multi, fetcher, tickers_per_request=tickers_per_request) if multi_series \
+            else partial(_fetch_single, fetcher)
+        chunks = batched(indicators, batch_size)
+        today = datetime.today().date()
+        fetched_any = False
+
+        first = next(chunks, None)
+        pending = asyncio.create_task(fetch(first)) if first is not None else None
         try:
-            responses = await asyncio.gather(
-                *[get_response_data(session, indicator['url']) for indicator in indicators], return_exceptions=True)
-            today = datetime.today().date()
-
-            error_count = 0
-            for response in responses:
-                if not isinstance(response, ConnectionError):
-                    records = [(response['ticker'], datetime.strptime(record[0], '%Y-%m-%d').date(), record[1], today)
-                               for record in zip(response['data']['dates'], response['data']['values'])]
-                    all_records += records
-                else:
-                    error_count += 1
-
-            if error_count != 0:
-                raise ConnectionError("Error in connection in one of the urls.")
-        except Exception as error:
-            raise ConnectionError(error)
-
-        return tuple(all_records)
+            while pending is not None:
+                series = await pending
+                following = next(chunks, None)
+                pending = asyncio.create_task(fetch(following)) if following is not None else None
+
+                with span('parse_economy', series=len(series)):
+                    batch = SeriesBatch.concat([parse_series(item, today) for item in series], today)
+                increment('rows.parsed', len(batch))
+                fetched_any = fetched_any or bool(series)
+                if len(batch):
+                    yield batch
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+        if not fetched_any:
+            raise ConnectionError("Couldn't fetch any of the indicators.")
+
+
+async def get_all_indicators_data(cache: Optional[ResponseCache] = None,
+                                  session: Optional[aiohttp.ClientSession] = None,
+                                  indicators: Sequence[dict] = INDICATORS) -> SeriesBatch:
+    """
+    Asynchronously fetches data from the URLs associates with each indicator and returns a batch of all fetched records.
+
+    Indicators that still fail after retries are logged and left out, so the records of the others can be loaded.
+
+    Args:
+        cache: Optional ResponseCache used to avoid downloading series that did not change.
+        session: Optional shared aiohttp.ClientSession, a new one is created and closed when not given.
+        indicators: Indicators to fetch, all of config.urls.INDICATORS by default.
+
+    Returns:
+        A SeriesBatch with all the records from URLs.
+
+    Raises:
+        ConnectionError: If none of the indicators could be fetched.
+    """
+
+    batches = [batch async for batch in iter_indicator_batches(cache, session, indicators,
+                                                               batch_size=max(len(indicators), 1))]
+    return SeriesBatch.concat(batches, datetime.today().date())
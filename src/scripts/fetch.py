@@ -0,0 +1,149 @@
+import random
+import asyncio
+import logging
+import aiohttp
+from yarl import URL
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
+from src.metrics import span
+from src.scripts.cache import ResponseCache
+from src.scripts.schemas import PayloadError
+from src.scripts.utils import get_response_data, HTTPStatusError
+
+
+logger = logging.getLogger(__name__)
+
+# status codes worth retrying, anything else is reported as a failure straight away
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a single source."""
+
+    source: str
+    url: str
+    data: Any = None
+    error: Optional[Exception] = None
+    status: Optional[int] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@asynccontextmanager
+async def session_scope(session: Optional[aiohttp.ClientSession] = None) -> AsyncIterator[aiohttp.ClientSession]:
+    """Yields given shared session as is, or a new session that is closed on exit when none is given."""
+
+    if session is not None:
+        yield session
+    else:
+        async with aiohttp.ClientSession() as new_session:
+            yield new_session
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Returns True for throttling, server side errors, timeouts and connection failures."""
+
+    if isinstance(error, HTTPStatusError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error.__cause__, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class Fetcher:
+    """
+    Fetches many sources concurrently on top of get_response_data, without letting one failure fail the rest.
+
+    Every host gets its own semaphore so a slow or throttling API does not starve the others. Throttled,
+    server side and network errors are retried with jittered exponential backoff, honouring Retry-After.
+
+    Args:
+        session: aiohttp.ClientSession used for all requests.
+        cache: Optional ResponseCache passed to get_response_data.
+        per_host_limit: Maximum number of requests in flight per host.
+        timeout: Total timeout of a single request in seconds.
+        retries: Number of retries after the first attempt.
+        backoff_base: Upper bound of the first backoff delay in seconds, doubled on every retry.
+        backoff_max: Upper bound of any backoff delay in seconds.
+        schema: Optional payload schema the responses are decoded into. Malformed payloads are
+            reported as failures without retrying.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, cache: Optional[ResponseCache] = None,
+                 per_host_limit: int = 4, timeout: float = 30, retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 30, schema: Optional[type] = None) -> None:
+        self.session = session
+        self.cache = cache
+        self.per_host_limit = per_host_limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.schema = schema
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = URL(url).host
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._semaphores[host]
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def fetch(self, source: str, url: str, schema: Optional[type] = None) -> FetchResult:
+        """
+        Fetches a single source, retrying retryable errors, and returns its FetchResult.
+
+        The payload is decoded into schema when given, into the fetcher's schema otherwise.
+        """
+
+        result = FetchResult(source=source, url=url)
+        with span('fetch', source=source) as fetch_span:
+            for attempt in range(self.retries + 1):
+                result.attempts = fetch_span['attempts'] = attempt + 1
+                try:
+                    async with self._semaphore(url):
+                        result.data = await get_response_data(self.session, url, self.cache, self.timeout,
+                                                              schema or self.schema)
+                    result.error = result.status = None
+                    break
+                except (ConnectionError, PayloadError) as error:
+                    result.error = error
+                    result.status = getattr(error, 'status', None)
+                    if attempt == self.retries or not _is_retryable(error):
+                        break
+                    delay = self._backoff(attempt, error)
+                    logger.warning(f"Fetching {source} failed ({error}), retrying in {delay:.1f}s.")
+                    await asyncio.sleep(delay)
+            fetch_span['ok'] = result.ok
+
+        return result
+
+    async def fetch_all(self, sources: Mapping[str, str]) -> List[FetchResult]:
+        """
+        Fetches all sources concurrently.
+
+        Args:
+            sources: Mapping of source name to URL. Names are used in logs instead of URLs,
+                which may carry API keys.
+
+        Returns:
+            A FetchResult per source, in the order of sources.
+        """
+
+        results = await asyncio.gather(*[self.fetch(source, url) for source, url in sources.items()])
+
+        failed = [result for result in results if not result.ok]
+        for result in failed:
+            logger.error(f"Couldn't fetch {result.source} after {result.attempts} attempt(s): {result.error}")
+        logger.info(f"Fetched {len(results) - len(failed)} of {len(results)} sources.")
+
+        return results
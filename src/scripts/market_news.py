@@ -1,60 +1,91 @@
-import os
 import aiohttp
-import asyncio
-from datetime import datetime
-from src.scripts.utils import get_response_data
-from dotenv import load_dotenv
+from typing import Dict, Mapping, Optional
+from datetime import date, datetime
+from src.metrics import span, increment
+from src.scripts.dedup import url_hash
+from src.scripts.fetch import Fetcher, session_scope
+from src.scripts.schemas import NewsPage
+from config.settings import get_settings
+from config.urls import NEWS_URL, NEWS_CATEGORIES, NEWS_PAGE_SIZE
 
-load_dotenv()
-API_KEY = os.environ['API_KEY']
 
+def news_page_urls(categories: Mapping[str, int], page_size: int = NEWS_PAGE_SIZE,
+                   base_url: str = NEWS_URL, day: Optional[date] = None,
+                   api_key: Optional[str] = None) -> Dict[str, str]:
+    """
+    Returns the URL of every page to fetch, keyed by 'category:offset'.
+
+    Args:
+        categories: Mapping of category to the number of newest articles to fetch for it.
+        page_size: Maximum number of articles per request.
+        base_url: URL of the mediastack news endpoint.
+        day: Past day to fetch the news of, the latest news when not given.
+        api_key: mediastack access key, the API_KEY setting when not given.
+    """
 
-async def get_news_data() -> tuple:
+    api_key = api_key or get_settings().api_key
+    day_filter = f"&date={day.isoformat()}" if day is not None else ''
+    return {
+        f"{category}:{offset}": (f"{base_url}"
+                                 f"?access_key={api_key}"
+                                 f"&categories={category}"
+                                 f"&limit={min(page_size, depth - offset)}&offset={offset}"
+                                 f"&sort=published_desc{day_filter}")
+        for category, depth in categories.items()
+        for offset in range(0, depth, page_size)
+    }
+
+
+async def get_news_data(session: Optional[aiohttp.ClientSession] = None,
+                        categories: Mapping[str, int] = NEWS_CATEGORIES, base_url: str = NEWS_URL,
+                        day: Optional[date] = None, api_key: Optional[str] = None) -> tuple:
     """
-    Asynchronously fetches data from the URLs associates with each category and returns a tuple of all fetched records.
+    Asynchronously fetches all pages of each category concurrently and returns a tuple of all fetched records.
+
+    Pages that still fail after retries are logged and left out, so the news of the others can be loaded.
+    An article listed more than once, under several categories or pages, is kept once, under the first
+    category it was found in; articles are identified by the hash of their normalized URL.
+
+    Args:
+        session: Optional shared aiohttp.ClientSession, a new one is created and closed when not given.
+        categories: Mapping of category to the number of newest articles to fetch for it.
+        base_url: URL of the mediastack news endpoint.
+        day: Past day to fetch the news of, as a snapshot of that day. Today's news when not given.
+        api_key: mediastack access key, the API_KEY setting when not given.
 
     Returns:
         A tuple with all the records from URLs.
+
+    Raises:
+        ConnectionError: If none of the pages could be fetched.
     """
 
-    categories = ['technology', 'science', 'business', 'health']
-
-    news_urls = [f"http://api.mediastack.com/v1/news"
-                 f"?access_key={API_KEY}"
-                 f"&categories={category}"
-                 f"&limit=50&sort=published_desc"
-                 for category in categories]
-
-    async with aiohttp.ClientSession() as session:
-        all_news = []
-
-        try:
-            responses = await asyncio.gather(*[get_response_data(session, news_url) for news_url in news_urls],
-                                             return_exceptions=True)
-            today = datetime.today().date()
-            error_count = 0
-            for response in responses:
-                if not isinstance(response, ConnectionError):
-                    data = response['data']
-                    news = [
-                        (n['title'],
-                         n['description'],
-                         n['url'],
-                         n['source'],
-                         n['image'],
-                         n['category'],
-                         n['language'],
-                         n['country'],
-                         today)
-                        for n in data
-                    ]
-                    all_news += news
-                else:
-                    error_count += 1
-
-            if error_count != 0:
-                raise ConnectionError("Error in connection in one of the urls.")
-        except Exception as error:
-            raise ConnectionError(error)
-
-        return tuple(all_news)
+    async with session_scope(session) as session:
+        all_news = {}
+
+        urls = news_page_urls(categories, base_url=base_url, day=day, api_key=api_key)
+        results = await Fetcher(session, schema=NewsPage).fetch_all(urls)
+        today = day or datetime.today().date()
+
+        with span('parse_news'):
+            for result in results:
+                if result.ok:
+                    for n in result.data.data:
+                        key = url_hash(n.url)
+                        if key not in all_news:
+                            all_news[key] = (n.title,
+                                             n.description,
+                                             n.url,
+                                             n.source,
+                                             n.image,
+                                             n.category,
+                                             n.language,
+                                             n.country,
+                                             key,
+                                             today)
+        increment('rows.parsed', len(all_news))
+
+        if not any(result.ok for result in results):
+            raise ConnectionError("Couldn't fetch news for any of the categories.")
+
+        return tuple(all_news.values())
@@ -0,0 +1,102 @@
+import numpy as np
+from datetime import date
+from typing import Iterator, Sequence
+from src.copy_format import format_copy_value
+from src.scripts.schemas import EconSeries
+
+
+class SeriesBatch:
+    """
+    Column batch of economy observations, one entry per (ticker_name, dates) point.
+
+    Dates are held as datetime64[D] and values as float64 with NaN for missing values, which takes a
+    fraction of the memory of a tuple per point. The DB loader reads the columns directly through
+    copy_lines(); iterating the batch yields economy_data rows for code that needs tuples.
+
+    Attributes:
+        tickers: Object array with the ticker name of each point.
+        dates: datetime64[D] array with the observation dates.
+        values: float64 array with the observed values, NaN where the source had none.
+        date_created: Date the batch was fetched on.
+    """
+
+    __slots__ = ('tickers', 'dates', 'values', 'date_created')
+
+    def __init__(self, tickers: np.ndarray, dates: np.ndarray, values: np.ndarray, date_created: date) -> None:
+        self.tickers = tickers
+        self.dates = dates
+        self.values = values
+        self.date_created = date_created
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __iter__(self) -> Iterator[tuple]:
+        values = self.values.tolist()
+        for ticker, day, value in zip(self.tickers.tolist(), self.dates.tolist(), values):
+            yield ticker, day, None if value != value else value, self.date_created
+
+    @classmethod
+    def empty(cls, date_created: date) -> 'SeriesBatch':
+        return cls(np.empty(0, dtype=object), np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=np.float64),
+                   date_created)
+
+    @classmethod
+    def concat(cls, batches: Sequence['SeriesBatch'], date_created: date) -> 'SeriesBatch':
+        """Joins batches fetched on the same date into one."""
+        if not batches:
+            return cls.empty(date_created)
+        return cls(
+            np.concatenate([batch.tickers for batch in batches]),
+            np.concatenate([batch.dates for batch in batches]),
+            np.concatenate([batch.values for batch in batches]),
+            date_created,
+        )
+
+    def as_of(self, day: date) -> 'SeriesBatch':
+        """Returns the points observed on or before day, as a batch fetched on day."""
+        keep = self.dates <= np.datetime64(day, 'D')
+        return SeriesBatch(self.tickers[keep], self.dates[keep], self.values[keep], day)
+
+    def last_dates(self) -> dict:
+        """Returns the latest observation date of every ticker in the batch."""
+        if not len(self):
+            return {}
+        # points of a ticker are contiguous, so runs start wherever the ticker changes
+        starts = np.concatenate(([0], np.flatnonzero(self.tickers[1:] != self.tickers[:-1]) + 1))
+        latest = np.maximum.reduceat(self.dates, starts)
+        return dict(zip(self.tickers[starts].tolist(), latest.tolist()))
+
+    def copy_lines(self, chunk_rows: int = 10000) -> Iterator[str]:
+        """
+        Renders the batch to the COPY text format of economy_data, chunk_rows rows at a time.
+
+        Columns are converted to text with vectorized NumPy operations, NaN values become NULL.
+        """
+        tickers = np.array([format_copy_value(ticker) for ticker in self.tickers.tolist()], dtype=object)
+        date_created = format_copy_value(self.date_created)
+        for start in range(0, len(self), chunk_rows):
+            end = start + chunk_rows
+            values = self.values[start:end]
+            value_text = np.where(np.isnan(values), '\\N', values.astype(str))
+            date_text = np.datetime_as_string(self.dates[start:end], unit='D')
+            yield ''.join(
+                f"{ticker}\t{day}\t{value}\t{date_created}\n"
+                for ticker, day, value in zip(tickers[start:end].tolist(), date_text.tolist(), value_text.tolist())
+            )
+
+
+def parse_series(response: EconSeries, date_created: date) -> SeriesBatch:
+    """
+    Converts an econdb series response to a SeriesBatch in one pass per column.
+
+    Args:
+        response: Decoded econdb series payload.
+        date_created: Date the series was fetched on.
+    """
+
+    dates = np.array(response.data.dates, dtype='datetime64[D]')
+    values = np.array(response.data.values, dtype=np.float64)
+    tickers = np.full(len(dates), response.ticker, dtype=object)
+
+    return SeriesBatch(tickers, dates, values, date_created)
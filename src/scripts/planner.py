@@ -0,0 +1,127 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import List, Mapping, Optional, Sequence, Tuple
+from psycopg2.extensions import connection
+from src.database.db_utils import get_fetch_state, get_latest_date_created
+
+
+logger = logging.getLogger(__name__)
+
+# days between two observations of a series
+FREQUENCY_DAYS = {'D': 1, 'W': 7, 'M': 31, 'Q': 92, 'A': 366}
+
+# days between fetches of a series while no new observation is due, to pick up revisions
+DEFAULT_REFRESH_DAYS = {'D': 1, 'W': 1, 'M': 7, 'Q': 14, 'A': 30}
+
+
+@dataclass
+class FetchPlan:
+    """Sources due for fetching in this run, and the reasons the others were skipped."""
+
+    indicators: List[dict] = field(default_factory=list)
+    fetch_news: bool = True
+    skipped: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def indicator_decision(indicator: dict, last_fetched: Optional[datetime], last_observation: Optional[date],
+                       now: datetime) -> Tuple[bool, str]:
+    """
+    Decides whether an indicator is due for fetching.
+
+    A series is due if it was never fetched, if its next observation may have been published since
+    the last one we have, or if it wasn't fetched for refresh_days, to pick up revisions. A series
+    already fetched today is never due.
+
+    Returns:
+        Whether the indicator is due and why.
+    """
+
+    frequency = indicator.get('frequency', 'D')
+    if last_fetched is None:
+        return True, "never fetched"
+    if last_fetched.date() >= now.date():
+        return False, "already fetched today"
+    if last_observation is None:
+        return True, "no observation loaded yet"
+
+    next_observation = last_observation + timedelta(days=FREQUENCY_DAYS[frequency])
+    if now.date() >= next_observation:
+        return True, f"new observation expected since {next_observation}"
+
+    refresh_days = indicator.get('refresh_days', DEFAULT_REFRESH_DAYS[frequency])
+    days_since_fetch = (now - last_fetched).days
+    if days_since_fetch >= refresh_days:
+        return True, f"not fetched for {days_since_fetch} days"
+
+    return False, (f"next observation not expected before {next_observation}, "
+                   f"last fetched {days_since_fetch} day(s) ago")
+
+
+def plan_fetches(conn: connection, indicators: Sequence[dict], now: datetime, incremental: bool) -> FetchPlan:
+    """
+    Checks the state of every source in the database and returns which ones need fetching.
+
+    A snapshot load needs every series, so in snapshot mode indicators are either all due or, when
+    today's snapshot already exists, all skipped. In incremental mode every indicator is planned on
+    its own with indicator_decision. News is skipped when today's news snapshot already exists.
+    """
+
+    today = now.date()
+    plan = FetchPlan()
+
+    if incremental:
+        states: Mapping[str, tuple] = get_fetch_state(conn)
+        for indicator in indicators:
+            due, reason = indicator_decision(indicator, *states.get(indicator['symbol'], (None, None)), now=now)
+            if due:
+                plan.indicators.append(indicator)
+            else:
+                plan.skipped.append((indicator['symbol'], reason))
+    elif get_latest_date_created(conn=conn, table_name='economy_data', date_column='date_created') != today:
+        plan.indicators = list(indicators)
+    else:
+        plan.skipped += [(indicator['symbol'], "today's economy snapshot already exists")
+                         for indicator in indicators]
+
+    if get_latest_date_created(conn=conn, table_name='market_news', date_column='date_created') == today:
+        plan.fetch_news = False
+        plan.skipped.append(('news', "today's news snapshot already exists"))
+
+    return plan
+
+
+@dataclass
+class BackfillChunk:
+    """Consecutive days of a source one backfill worker loads."""
+
+    source: str
+    days: List[date]
+
+
+def plan_backfill(sources: Sequence[str], start: date, end: date, done: Mapping[str, set],
+                  chunk_days: int) -> List[BackfillChunk]:
+    """
+    Splits the days between start and end, both inclusive, still missing for every source into chunks.
+
+    Args:
+        sources: Sources to backfill.
+        done: Days every source already has, which are left out.
+        chunk_days: Maximum number of days per chunk. Days of a chunk are consecutive, so a day
+            already done splits a run of missing days into separate chunks.
+    """
+
+    chunks = []
+    for source in sources:
+        chunk = None
+        day = start
+        while day <= end:
+            if day in done.get(source, ()):
+                chunk = None
+            elif chunk is not None and len(chunk.days) < chunk_days:
+                chunk.days.append(day)
+            else:
+                chunk = BackfillChunk(source, [day])
+                chunks.append(chunk)
+            day += timedelta(days=1)
+    return chunks
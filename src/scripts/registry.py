@@ -0,0 +1,78 @@
+import json
+import logging
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence
+from config.urls import INDICATORS, ECONDB_SERIES_URL
+
+
+logger = logging.getLogger(__name__)
+
+
+class RegistryError(Exception):
+    """Custom exception for malformed indicator registry entries."""
+
+    def __init__(self, message) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+def normalize_indicator(indicator: dict) -> dict:
+    """Fills in the fields an indicator entry may leave out: the econdb URL of its symbol and a D(aily) frequency."""
+
+    if 'symbol' not in indicator:
+        raise RegistryError(f"Indicator entry without a symbol: {indicator}")
+    return {
+        **indicator,
+        'url': indicator.get('url') or ECONDB_SERIES_URL.format(symbol=indicator['symbol']),
+        'frequency': indicator.get('frequency', 'D'),
+    }
+
+
+class IndicatorRegistry:
+    """
+    Indicators to track, read lazily from a JSON lines file or taken from config.urls.INDICATORS.
+
+    Every line of the file is one indicator entry in the format of config.urls.INDICATORS, where url
+    may be left out for econdb series. The file is only read when the registry is iterated, one line
+    at a time, so registries of thousands of series are never held in memory as a whole.
+
+    Args:
+        path: JSON lines file with the indicators, config.urls.INDICATORS is used when not given.
+        default: Indicators used when no path is given.
+    """
+
+    def __init__(self, path: Optional[str] = None, default: Sequence[dict] = INDICATORS) -> None:
+        self.path = path
+        self.default = default
+        self._frequencies: Optional[dict] = None
+
+    def __iter__(self) -> Iterator[dict]:
+        if self.path is None:
+            yield from map(normalize_indicator, self.default)
+            return
+
+        with open(self.path) as registry_file:
+            for line_number, line in enumerate(registry_file, 1):
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                try:
+                    yield normalize_indicator(json.loads(line))
+                except (ValueError, RegistryError) as error:
+                    raise RegistryError(f"Invalid indicator at {self.path}:{line_number}: {error}")
+
+    def frequencies(self) -> dict:
+        """Returns the frequency of every indicator keyed by symbol, read once and kept."""
+        if self._frequencies is None:
+            self._frequencies = {indicator['symbol']: indicator['frequency'] for indicator in self}
+        return self._frequencies
+
+
+def batched(indicators: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    """Splits indicators into lists of at most size entries, consuming them lazily."""
+
+    iterator = iter(indicators)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,182 @@
+"""
+Recording and replay of HTTP responses, for reproducing runs offline.
+
+A Recording activated in record mode makes get_response_data store every response it receives, its
+status, a few headers, the gzip compressed body and the time it took, or the network error it ended
+with. In replay mode the same requests are answered from the recording instead of the network, in
+the order they were recorded, so retries of a failed request see the same failures again. The
+parse and load stages then run on identical inputs, at full speed or, with latency_scale, with the
+recorded response times.
+
+Like the metrics, the active recording is held in a context variable, so the fetchers pick it up
+without having to pass it along. The response cache is bypassed while a recording is active.
+"""
+import os
+import json
+import gzip
+import time
+import asyncio
+import hashlib
+import aiohttp
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Mapping, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# query parameters holding credentials, never written to disk
+REDACTED_PARAMETERS = ('access_key', 'api_key', 'apikey', 'token')
+
+# response headers the fetchers read, the others are not recorded
+RECORDED_HEADERS = ('Content-Type', 'Retry-After', 'ETag', 'Last-Modified', 'Cache-Control')
+
+_recording: ContextVar[Optional['Recording']] = ContextVar('recording', default=None)
+
+
+class ReplayError(Exception):
+    """Custom exception for requests a recording has no response for."""
+
+    def __init__(self, message) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+@dataclass
+class RecordedResponse:
+    """A recorded response, or the network error a request ended with."""
+
+    url: str
+    status: Optional[int]
+    headers: dict
+    body: bytes
+    elapsed: float
+    error: Optional[str] = None
+    timeout: bool = False
+
+    def raise_error(self) -> None:
+        """Raises the recorded network error again, as the aiohttp error the fetchers would have seen."""
+        if self.timeout:
+            raise asyncio.TimeoutError()
+        if self.error is not None:
+            raise aiohttp.ClientConnectionError(self.error)
+
+
+def redact_url(url: str, parameters: Sequence[str] = REDACTED_PARAMETERS) -> str:
+    """Returns url with the values of credential query parameters replaced by REDACTED."""
+
+    parts = urlsplit(url)
+    query = [(name, 'REDACTED' if name.lower() in parameters else value)
+             for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe='[],:')))
+
+
+class Recording:
+    """
+    Directory of recorded HTTP responses.
+
+    Every response is stored as a JSON metadata file and a gzip compressed body file, named after the
+    hash of the redacted URL and the number of earlier requests to that URL in the run.
+
+    Args:
+        directory: Directory holding the recording, created if missing.
+        mode: RECORD to store responses, REPLAY to serve them.
+        latency_scale: In replay mode, responses are delayed by their recorded time multiplied by
+            latency_scale, 0 serves them right away.
+
+    Methods:
+        activate(): Makes this the recording get_response_data uses.
+        record(): Stores a response or network error.
+        replay(): Returns the next recorded response of a URL.
+    """
+
+    def __init__(self, directory: str, mode: str, latency_scale: float = 0) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown recording mode {mode!r}, expected {RECORD!r} or {REPLAY!r}.")
+        self.directory = directory
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._requests = defaultdict(int)
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    @contextmanager
+    def activate(self) -> Iterator['Recording']:
+        token = _recording.set(self)
+        try:
+            yield self
+        finally:
+            _recording.reset(token)
+
+    def _paths(self, url: str, number: int) -> tuple:
+        key = f"{hashlib.sha256(url.encode()).hexdigest()}-{number}"
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body.gz")
+
+    def _next(self, url: str) -> int:
+        number = self._requests[url]
+        self._requests[url] += 1
+        return number
+
+    def record(self, url: str, status: Optional[int], headers: Mapping[str, str], body: bytes, elapsed: float,
+               error: Optional[Exception] = None) -> None:
+        """Stores the response to url, or the network error the request ended with."""
+
+        url = redact_url(url)
+        meta_path, body_path = self._paths(url, self._next(url))
+        meta = {
+            'url': url,
+            'status': status,
+            'headers': {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+            'elapsed': elapsed,
+            'error': None if error is None else str(error),
+            'timeout': isinstance(error, asyncio.TimeoutError),
+            'recorded_at': time.time(),
+        }
+        self._write(body_path, gzip.compress(body))
+        self._write(meta_path, json.dumps(meta).encode())
+
+    async def replay(self, url: str) -> RecordedResponse:
+        """
+        Returns the next recorded response to url, after its recorded time scaled by latency_scale.
+
+        Once the recorded responses to url are used up, the last one is served again.
+
+        Raises:
+            ReplayError: If nothing was recorded for url.
+        """
+
+        url = redact_url(url)
+        number = self._next(url)
+        while number >= 0 and not os.path.exists(self._paths(url, number)[0]):
+            number -= 1
+        if number < 0:
+            raise ReplayError(f"No recorded response for {url}")
+
+        meta_path, body_path = self._paths(url, number)
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        with open(body_path, 'rb') as body_file:
+            body = gzip.decompress(body_file.read())
+
+        if self.latency_scale:
+            await asyncio.sleep(meta['elapsed'] * self.latency_scale)
+        return RecordedResponse(url=meta['url'], status=meta['status'], headers=meta['headers'], body=body,
+                                elapsed=meta['elapsed'], error=meta['error'], timeout=meta['timeout'])
+
+    def _write(self, path: str, data: bytes) -> None:
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+
+
+def active_recording() -> Optional[Recording]:
+    """Returns the active recording, if any."""
+    return _recording.get()
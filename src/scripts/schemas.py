@@ -0,0 +1,172 @@
+"""
+Typed schemas of the econdb and mediastack payloads.
+
+When msgspec is installed payloads are decoded straight into msgspec Structs, which validates them
+while parsing. Otherwise the JSON is parsed with orjson, or the standard library json module, and
+validated into equivalent slotted classes. Either way a malformed payload raises PayloadError.
+"""
+import json
+from typing import List, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PayloadError(ValueError):
+    """Custom exception for payloads that don't match their schema."""
+
+    def __init__(self, message) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+def decode_json(body: bytes):
+    """Parses JSON into plain Python objects with the fastest available library."""
+
+    try:
+        if orjson is not None:
+            return orjson.loads(body)
+        if msgspec is not None:
+            return msgspec.json.decode(body)
+        return json.loads(body)
+    except ValueError as error:
+        raise PayloadError(f"Invalid JSON: {error}")
+
+
+if msgspec is not None:
+
+    class EconSeriesData(msgspec.Struct):
+        dates: List[str]
+        values: List[Optional[float]]
+
+    class EconSeries(msgspec.Struct):
+        ticker: str
+        data: EconSeriesData
+
+    class EconSeriesPage(msgspec.Struct):
+        results: List[EconSeries]
+        next: Optional[str] = None
+
+    class NewsArticle(msgspec.Struct):
+        url: str
+        title: Optional[str] = None
+        description: Optional[str] = None
+        source: Optional[str] = None
+        image: Optional[str] = None
+        category: Optional[str] = None
+        language: Optional[str] = None
+        country: Optional[str] = None
+
+    class NewsPage(msgspec.Struct):
+        data: List[NewsArticle]
+
+    def decode_payload(body: bytes, schema: type):
+        """Decodes JSON body into given schema, raising PayloadError if it doesn't match."""
+
+        try:
+            return msgspec.json.decode(body, type=schema)
+        except (msgspec.ValidationError, msgspec.DecodeError) as error:
+            raise PayloadError(f"Invalid {schema.__name__} payload: {error}")
+
+else:
+
+    def _field(obj, name: str, types: tuple, path: str, required: bool = True):
+        if not isinstance(obj, dict):
+            raise PayloadError(f"Expected an object at `{path}`")
+        if name not in obj:
+            if required:
+                raise PayloadError(f"Object missing required field `{name}` at `{path}`")
+            return None
+        value = obj[name]
+        if not isinstance(value, types):
+            raise PayloadError(f"Unexpected type {type(value).__name__} at `{path}.{name}`")
+        return value
+
+    class EconSeriesData:
+        __slots__ = ('dates', 'values')
+
+        def __init__(self, dates: List[str], values: List[Optional[float]]) -> None:
+            self.dates = dates
+            self.values = values
+
+        @classmethod
+        def from_obj(cls, obj, path: str = '$') -> 'EconSeriesData':
+            dates = _field(obj, 'dates', (list,), path)
+            values = _field(obj, 'values', (list,), path)
+            if not all(isinstance(day, str) for day in dates):
+                raise PayloadError(f"Expected str items at `{path}.dates`")
+            if not all(value is None or isinstance(value, (int, float)) for value in values):
+                raise PayloadError(f"Expected number or null items at `{path}.values`")
+            return cls(dates, values)
+
+    class EconSeries:
+        __slots__ = ('ticker', 'data')
+
+        def __init__(self, ticker: str, data: EconSeriesData) -> None:
+            self.ticker = ticker
+            self.data = data
+
+        @classmethod
+        def from_obj(cls, obj, path: str = '$') -> 'EconSeries':
+            return cls(_field(obj, 'ticker', (str,), path),
+                       EconSeriesData.from_obj(_field(obj, 'data', (dict,), path), f"{path}.data"))
+
+    class EconSeriesPage:
+        __slots__ = ('results', 'next')
+
+        def __init__(self, results: List[EconSeries], next: Optional[str] = None) -> None:
+            self.results = results
+            self.next = next
+
+        @classmethod
+        def from_obj(cls, obj, path: str = '$') -> 'EconSeriesPage':
+            results = _field(obj, 'results', (list,), path)
+            return cls([EconSeries.from_obj(series, f"{path}.results[{i}]") for i, series in enumerate(results)],
+                       _field(obj, 'next', (str, type(None)), path, required=False))
+
+    class NewsArticle:
+        __slots__ = ('url', 'title', 'description', 'source', 'image', 'category', 'language', 'country')
+
+        def __init__(self, url: str, title: Optional[str] = None, description: Optional[str] = None,
+                     source: Optional[str] = None, image: Optional[str] = None, category: Optional[str] = None,
+                     language: Optional[str] = None, country: Optional[str] = None) -> None:
+            self.url = url
+            self.title = title
+            self.description = description
+            self.source = source
+            self.image = image
+            self.category = category
+            self.language = language
+            self.country = country
+
+        @classmethod
+        def from_obj(cls, obj, path: str = '$') -> 'NewsArticle':
+            optional = {name: _field(obj, name, (str, type(None)), path, required=False)
+                        for name in cls.__slots__[1:]}
+            return cls(_field(obj, 'url', (str,), path), **optional)
+
+    class NewsPage:
+        __slots__ = ('data',)
+
+        def __init__(self, data: List[NewsArticle]) -> None:
+            self.data = data
+
+        @classmethod
+        def from_obj(cls, obj, path: str = '$') -> 'NewsPage':
+            articles = _field(obj, 'data', (list,), path)
+            return cls([NewsArticle.from_obj(article, f"{path}.data[{i}]") for i, article in enumerate(articles)])
+
+    def decode_payload(body: bytes, schema: type):
+        """Decodes JSON body into given schema, raising PayloadError if it doesn't match."""
+
+        try:
+            return schema.from_obj(decode_json(body))
+        except PayloadError as error:
+            raise PayloadError(f"Invalid {schema.__name__} payload: {error}")
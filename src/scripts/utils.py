@@ -1,23 +1,120 @@
+import time
+import asyncio
 import aiohttp
-from typing import Coroutine
+from typing import Coroutine, Optional
+from src.metrics import annotate, increment
+from src.scripts.cache import ResponseCache
+from src.scripts.replay import Recording, active_recording
+from src.scripts.schemas import PayloadError, decode_json, decode_payload
 
 
-async def get_response_data(session: aiohttp.ClientSession, url: str) -> Coroutine:
+# errors of a request that are recorded, to be raised again on replay
+_NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class HTTPStatusError(ConnectionError):
+    """Custom exception for responses with an error status code."""
+
+    def __init__(self, message, status: int, retry_after: Optional[float] = None) -> None:
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+
+def _decode(body: bytes, schema: Optional[type]):
+    return decode_payload(body, schema) if schema else decode_json(body)
+
+
+async def _replay(recording: Recording, url: str, schema: Optional[type]):
+    """Answers a request from the active recording, the same way the recorded response was handled."""
+
+    recorded = await recording.replay(url)
+    annotate(replayed=True)
+    recorded.raise_error()
+    annotate(status=recorded.status)
+    if recorded.status >= 400:
+        raise HTTPStatusError(f"Server responded with status {recorded.status}.", recorded.status,
+                              _retry_after(recorded.headers.get('Retry-After')))
+    return _decode(recorded.body, schema)
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses the delay-seconds form of a Retry-After header."""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+async def get_response_data(session: aiohttp.ClientSession, url: str,
+                            cache: Optional[ResponseCache] = None,
+                            timeout: Optional[aiohttp.ClientTimeout] = None,
+                            schema: Optional[type] = None) -> Coroutine:
     """
     Asynchronously fetches data from the specified URL using the provided aiohttp.ClientSession object.
 
     Args:
         session: An aiohttp.ClientSession object used to establish the connection and send the request.
         url: A string representing the URL to fetch data from.
+        cache: Optional ResponseCache. Fresh cached responses are returned without a request, stale ones
+            are revalidated with a conditional request and reused when the server answers 304.
+        timeout: Optional aiohttp.ClientTimeout for this request, defaults to the session's timeout.
+        schema: Optional payload schema from src.scripts.schemas to decode the JSON into.
+
+    When a recording is active, see src/scripts/replay.py, responses are recorded to it or replayed
+    from it, and the cache is not used.
 
     Returns:
-        A coroutine that will return the JSON data retrieved from the specified URL.
+        A coroutine that will return the JSON data retrieved from the specified URL, as an instance of
+        schema when one is given.
 
     Raises:
-        ConnectionError: If an error occurs while fetching data from the URL.
+        PayloadError: If the body isn't valid JSON or doesn't match schema.
+        HTTPStatusError: If the server answers with an error status code.
+        ConnectionError: If any other error occurs while fetching data from the URL.
     """
+    request_options = {'timeout': timeout} if timeout else {}
+    recording = active_recording()
+    if recording is not None:
+        # every request has to reach the recording, none may be answered from the cache
+        cache = None
+    started = time.perf_counter()
     try:
-        async with session.get(url) as response:
-            return await response.json(content_type=None)
+        if recording is not None and recording.replaying:
+            return await _replay(recording, url, schema)
+
+        cached = cache.get(url) if cache else None
+        if cached and cached.is_fresh():
+            annotate(cache='fresh')
+            return _decode(cached.body, schema)
+
+        headers = cached.conditional_headers() if cached else None
+        async with session.get(url, headers=headers, **request_options) as response:
+            increment('http.requests')
+            annotate(status=response.status)
+            if cached and response.status == 304:
+                annotate(cache='revalidated')
+                return _decode(cache.refresh(url, cached, response.headers).body, schema)
+            if response.status >= 400:
+                if recording is not None:
+                    recording.record(url, response.status, response.headers, b'', time.perf_counter() - started)
+                raise HTTPStatusError(f"Server responded with status {response.status}.", response.status,
+                                      _retry_after(response.headers.get('Retry-After')))
+
+            body = await response.read()
+            annotate(bytes=len(body))
+            increment('http.bytes', len(body), unit='Bytes')
+            if recording is not None:
+                recording.record(url, response.status, response.headers, body, time.perf_counter() - started)
+            # decode before caching so a malformed body is never served from the cache
+            data = _decode(body, schema)
+            if cache and response.status == 200:
+                cache.put(url, body, response.headers)
+            return data
+    except (HTTPStatusError, PayloadError):
+        raise
     except Exception as error:
-        raise ConnectionError(f"Error while fetching data from url: {error}.")
+        if recording is not None and not recording.replaying and isinstance(error, _NETWORK_ERRORS):
+            recording.record(url, None, {}, b'', time.perf_counter() - started, error=error)
+        raise ConnectionError(f"Error while fetching data from url: {error}.") from error
@@ -0,0 +1,50 @@
+import pytest
+from datetime import date
+from src.database.archive import write_snapshot, read_archive, snapshot_path
+
+pytest.importorskip('pyarrow')
+
+
+def write_economy_snapshots(root: str) -> None:
+    """Archives two daily economy snapshots, the second one revising a value."""
+
+    first = [('CPIUS', date(2023, 1, 1), 299.0), ('CPIUS', date(2023, 2, 1), 300.0), ('GDPUS', date(2023, 1, 1), 1.5)]
+    second = [('CPIUS', date(2023, 1, 1), 299.0), ('CPIUS', date(2023, 2, 1), 300.5), ('GDPUS', date(2023, 1, 1), 1.5)]
+    # one row group per batch
+    write_snapshot([first[:2], first[2:]], root, 'economy_data', date(2023, 4, 7))
+    write_snapshot([second], root, 'economy_data', date(2023, 4, 8))
+
+
+def test_archive_keeps_revision_history(tmp_path):
+    """Test that every archived snapshot can be read back with its date."""
+
+    write_economy_snapshots(str(tmp_path))
+
+    history = read_archive(str(tmp_path), 'economy_data', tickers=['CPIUS'], start=date(2023, 2, 1),
+                           date_column='dates').sort_by('date_created').to_pylist()
+
+    assert [(row['date_created'], row['values']) for row in history] == [(date(2023, 4, 7), 300.0),
+                                                                          (date(2023, 4, 8), 300.5)]
+
+
+def test_archive_reader_filters_snapshot_days(tmp_path):
+    """Test that a date_created range reads only the snapshots inside it."""
+
+    write_economy_snapshots(str(tmp_path))
+
+    table = read_archive(str(tmp_path), 'economy_data', start=date(2023, 4, 8), columns=['ticker_name', 'date_created'])
+
+    assert table.num_rows == 3
+    assert set(table.column('date_created').to_pylist()) == {date(2023, 4, 8)}
+
+
+def test_archiving_a_day_again_replaces_its_file(tmp_path):
+    """Test that a snapshot archived twice, e.g. after a rolled back publish, isn't read twice."""
+
+    rows = [('CPIUS', date(2023, 1, 1), 299.0)]
+    write_snapshot([rows], str(tmp_path), 'economy_data', date(2023, 4, 7))
+    write_snapshot([rows], str(tmp_path), 'economy_data', date(2023, 4, 7))
+
+    assert read_archive(str(tmp_path), 'economy_data').num_rows == 1
+    assert [path.name for path in (tmp_path / snapshot_path('', 'economy_data', date(2023, 4, 7)).lstrip('/'))
+            .iterdir()] == ['part-0.parquet']
@@ -0,0 +1,82 @@
+import time
+import asyncio
+from datetime import date
+import pytest
+import main
+from src.database.async_db import AsyncDatabase
+from src.scripts import economy_data
+from src.scripts.schemas import EconSeries, EconSeriesData
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """AsyncDatabase running its calls on the database thread with a fake connection."""
+
+    db = AsyncDatabase({})
+    conn = FakeConnection()
+    monkeypatch.setattr(db, '_connection', lambda: conn)
+    yield db
+    db.close()
+
+
+def test_transaction_commits_or_rolls_back(db):
+    """Test that a call is committed when it returns and rolled back when it raises."""
+
+    def fail(conn):
+        raise ValueError('bad row')
+
+    async def run():
+        assert await db.transaction(lambda value, conn: value * 2, 21) == 42
+        with pytest.raises(ValueError):
+            await db.transaction(fail)
+
+    asyncio.run(run())
+    conn = db._connection()
+
+    assert (conn.commits, conn.rollbacks) == (1, 1)
+
+
+def test_batches_load_while_the_next_one_downloads(db, monkeypatch):
+    """Test that the next batch is fetched on the event loop while the current one loads on the database thread."""
+
+    fetches, loads = [], []
+
+    async def fetch(fetcher, indicators):
+        started = time.monotonic()
+        await asyncio.sleep(0.1)
+        fetches.append((started, time.monotonic()))
+        return [EconSeries(ticker=indicator['symbol'], data=EconSeriesData(dates=['2023-01-01'], values=[1.0]))
+                for indicator in indicators]
+
+    def store(batch, conn, today, target):
+        started = time.monotonic()
+        time.sleep(0.1)
+        loads.append((started, time.monotonic()))
+
+    monkeypatch.setattr(economy_data, '_fetch_single', fetch)
+    monkeypatch.setattr(main, 'store_economy_data', store)
+    indicators = [{'symbol': f"S{number}", 'url': f"https://example.com/S{number}"} for number in range(3)]
+
+    async def run():
+        batches = economy_data.iter_indicator_batches(indicators=indicators, batch_size=1)
+        return await main.load_economy_batches(db, batches, date(2023, 4, 7), None)
+
+    rows = asyncio.run(run())
+
+    assert rows == 3
+    assert len(fetches) == len(loads) == 3
+    # the second download starts before the first batch is loaded, and runs while it loads
+    assert fetches[1][0] < loads[0][1]
+    assert fetches[1][1] > loads[0][0]
@@ -1,8 +1,14 @@
 import pytest
 import os
+import time
 from datetime import datetime
-from src.database.db import Database
-from src.database.db_utils import insert_data, delete_old_data
+from src.database.db import Database, DatabaseOperationError, try_advisory_lock, advisory_unlock
+from src.database.db_utils import (insert_data, copy_data, merge_data, upsert_observations, delete_old_data,
+                                  replace_snapshot, upsert_derived, begin_snapshot, carry_over_series,
+                                  publish_snapshot, get_partitions, ECONOMY_DATA_COLUMNS, MARKET_NEWS_COLUMNS)
+from src.database.shards import enqueue_shards, claim_shard, finish_shard, publish_run, MAX_SHARD_ATTEMPTS
+from src.database.queries import (create_latest_values_view, refresh_latest_values, get_latest_values, get_series,
+                                  search_news, LatestValue, Observation)
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -44,17 +50,71 @@ def db_connection():
         );
     '''
 
+    test_economy_observations_table = '''
+        CREATE TABLE IF NOT EXISTS test_economy_observations (
+            ticker_name VARCHAR(40) NOT NULL,
+            dates DATE NOT NULL,
+            values FLOAT,
+            first_seen DATE NOT NULL,
+            last_revised DATE NOT NULL,
+            PRIMARY KEY (ticker_name, dates)
+        );
+    '''
+
     cur.execute(test_economy_data_table)
+    cur.execute(test_economy_observations_table)
     conn.commit()
 
     yield conn
 
     cur.execute("DROP TABLE test_economy_data")
+    cur.execute("DROP TABLE test_economy_observations")
     conn.commit()
     cur.close()
     conn.close()
 
 
+def test_reconnect_takes_advisory_locks_again(db_connection):
+    """Test that a lost connection is replaced with its advisory locks, and an open transaction is left alone."""
+
+    db = Database(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD, port=DB_PORT)
+    conn = db.get_connection()
+    assert try_advisory_lock(conn, 'test_lock')
+    conn.commit()
+
+    conn.cursor().execute("SELECT 1")
+    with pytest.raises(DatabaseOperationError):
+        db.is_alive()
+    assert db.ensure_connection(max_idle=0) is conn
+    conn.rollback()
+
+    # the server ends the session, its lock goes with it
+    cur = db_connection.cursor()
+    cur.execute("SELECT pg_terminate_backend(%s)", (conn.get_backend_pid(),))
+    db_connection.commit()
+    # pg_stat_activity is read once per transaction, poll it in new ones
+    cur.execute("SELECT 1 FROM pg_stat_activity WHERE pid = %s", (conn.get_backend_pid(),))
+    while cur.fetchone():
+        db_connection.commit()
+        time.sleep(0.01)
+        cur.execute("SELECT 1 FROM pg_stat_activity WHERE pid = %s", (conn.get_backend_pid(),))
+    db_connection.commit()
+    replaced = db.ensure_connection(max_idle=0)
+
+    assert replaced is not conn
+    assert not try_advisory_lock(db_connection, 'test_lock')
+
+    advisory_unlock(replaced, 'test_lock')
+    replaced.commit()
+
+    assert try_advisory_lock(db_connection, 'test_lock')
+
+    advisory_unlock(db_connection, 'test_lock')
+    db_connection.commit()
+    cur.close()
+    db.disconnect()
+
+
 def test_insert_data(db_connection):
     """Test the data insert operation."""
 
@@ -81,6 +141,50 @@ def test_insert_data(db_connection):
     cur.close()
 
 
+def test_copy_data(db_connection):
+    """Test the COPY based bulk load, including NULLs and characters that need escaping."""
+
+    today = datetime.today().date()
+    test_data = (
+        ('test\tticker\\1', datetime(year=2023, month=4, day=6), 7, today),
+        ('test\nticker_2', datetime(year=2023, month=4, day=6), None, today),
+        ('test_ticker_3', datetime(year=2023, month=4, day=6), 2889.5, today),
+    )
+
+    copy_data(data=test_data, conn=db_connection, table_name='test_economy_data',
+              columns=('ticker_name', 'dates', 'values', 'date_created'))
+
+    cur = db_connection.cursor()
+    cur.execute("SELECT ticker_name, values FROM test_economy_data ORDER BY ticker_name")
+    records = cur.fetchall()
+
+    assert records == sorted((row[0], row[2]) for row in test_data)
+
+    cur.execute("DELETE FROM test_economy_data")
+    db_connection.commit()
+    cur.close()
+
+
+def test_merge_data_is_idempotent(db_connection):
+    """Test that merging the same rows twice only inserts them once."""
+
+    today = datetime.today().date()
+    test_data = (
+        ('test_ticker_1', datetime(year=2023, month=4, day=6), 7, today),
+        ('test_ticker_2', datetime(year=2023, month=4, day=6), 3.8, today),
+    )
+    columns = ('ticker_name', 'dates', 'values', 'date_created')
+    conflict_columns = ('ticker_name', 'dates', 'date_created')
+
+    assert merge_data(test_data, db_connection, 'test_economy_data', columns, conflict_columns) == len(test_data)
+    assert merge_data(test_data, db_connection, 'test_economy_data', columns, conflict_columns) == 0
+
+    cur = db_connection.cursor()
+    cur.execute("DELETE FROM test_economy_data")
+    db_connection.commit()
+    cur.close()
+
+
 def test_delete_old_data(db_connection):
     """Test the old data operation."""
 
@@ -112,3 +216,321 @@ def test_delete_old_data(db_connection):
     cur.execute("DELETE FROM test_economy_data")
     db_connection.commit()
     cur.close()
+
+
+def test_upsert_observations(db_connection):
+    """Test that only new or revised observations are written by the incremental load."""
+
+    first_day = datetime(year=2023, month=4, day=7).date()
+    second_day = datetime(year=2023, month=4, day=8).date()
+    first_load = [
+        ('test_ticker_1', datetime(year=2023, month=1, day=1), 7, first_day),
+        ('test_ticker_1', datetime(year=2023, month=2, day=1), 8, first_day),
+    ]
+    second_load = [
+        ('test_ticker_1', datetime(year=2023, month=1, day=1), 7, second_day),
+        ('test_ticker_1', datetime(year=2023, month=2, day=1), 8.5, second_day),
+        ('test_ticker_1', datetime(year=2023, month=3, day=1), 9, second_day),
+    ]
+
+    assert upsert_observations(first_load, db_connection, table_name='test_economy_observations') == 2
+    assert upsert_observations(second_load, db_connection, table_name='test_economy_observations') == 2
+
+    cur = db_connection.cursor()
+    cur.execute("SELECT values, first_seen, last_revised FROM test_economy_observations ORDER BY dates")
+    records = cur.fetchall()
+
+    assert records == [(7, first_day, first_day), (8.5, first_day, second_day), (9, second_day, second_day)]
+
+    cur.execute("DELETE FROM test_economy_observations")
+    db_connection.commit()
+    cur.close()
+
+
+def test_replace_snapshot_partitioned(db_connection):
+    """Test that a new snapshot is attached as a partition and old partitions are dropped."""
+
+    cur = db_connection.cursor()
+    cur.execute('''
+        CREATE TABLE test_partitioned_economy_data (
+            ticker_name VARCHAR(40) NOT NULL,
+            dates DATE NOT NULL,
+            values FLOAT,
+            date_created DATE NOT NULL,
+            PRIMARY KEY (ticker_name, dates, date_created)
+        ) PARTITION BY LIST (date_created)
+    ''')
+
+    old_day = datetime(year=2023, month=4, day=7).date()
+    new_day = datetime(year=2023, month=4, day=8).date()
+    old_data = [('test_ticker_1', datetime(year=2023, month=4, day=6), 7, old_day)]
+    new_data = [
+        ('test_ticker_1', datetime(year=2023, month=4, day=6), 7, new_day),
+        ('test_ticker_2', datetime(year=2023, month=4, day=6), 3.8, new_day),
+    ]
+
+    replace_snapshot(old_data, db_connection, 'test_partitioned_economy_data', ECONOMY_DATA_COLUMNS, day=old_day)
+    replace_snapshot(new_data, db_connection, 'test_partitioned_economy_data', ECONOMY_DATA_COLUMNS, day=new_day)
+
+    cur.execute("SELECT COUNT(*), MIN(date_created) FROM test_partitioned_economy_data")
+
+    assert cur.fetchone() == (len(new_data), new_day)
+    assert get_partitions(db_connection, 'test_partitioned_economy_data') == ['test_partitioned_economy_data_20230408']
+
+    cur.execute("DROP TABLE test_partitioned_economy_data")
+    db_connection.commit()
+    cur.close()
+
+
+def test_snapshot_of_table_not_partitioned_is_staged(db_connection):
+    """Test that a snapshot of a table that isn't partitioned stays out of it until it is published."""
+
+    today = datetime.today().date()
+    old_day = datetime(year=2023, month=4, day=7).date()
+    observed = datetime(year=2023, month=4, day=6).date()
+    cur = db_connection.cursor()
+    cur.execute("INSERT INTO test_economy_data VALUES ('test_ticker_1', %s, 7, %s)", (observed, old_day))
+
+    target = begin_snapshot(db_connection, 'test_economy_data', today)
+    copy_data([('test_ticker_1', observed, 7.5, today)], db_connection, target, ECONOMY_DATA_COLUMNS)
+    cur.execute("SELECT values FROM test_economy_data")
+
+    assert target != 'test_economy_data'
+    assert cur.fetchall() == [(7,)]
+
+    publish_snapshot(db_connection, 'test_economy_data', target, today)
+    cur.execute("SELECT values, date_created FROM test_economy_data")
+
+    assert cur.fetchall() == [(7.5, today)]
+    cur.execute("SELECT to_regclass(%s)", (target,))
+    assert cur.fetchone() == (None,)
+
+    cur.execute("DELETE FROM test_economy_data")
+    db_connection.commit()
+    cur.close()
+
+
+def test_carry_over_series_missing_from_snapshot(db_connection):
+    """Test that series missing from a new snapshot are copied from the previous one, and only those."""
+
+    cur = db_connection.cursor()
+    cur.execute('''
+        CREATE TABLE test_carried_economy_data (
+            ticker_name VARCHAR(40) NOT NULL,
+            dates DATE NOT NULL,
+            values FLOAT,
+            date_created DATE NOT NULL,
+            PRIMARY KEY (ticker_name, dates, date_created)
+        ) PARTITION BY LIST (date_created)
+    ''')
+
+    old_day = datetime(year=2023, month=4, day=7).date()
+    new_day = datetime(year=2023, month=4, day=8).date()
+    observed = datetime(year=2023, month=4, day=6).date()
+    old_data = [('fetched', observed, 1, old_day), ('failed', observed, 2, old_day), ('dropped', observed, 3, old_day)]
+    replace_snapshot(old_data, db_connection, 'test_carried_economy_data', ECONOMY_DATA_COLUMNS, day=old_day)
+    target = begin_snapshot(db_connection, 'test_carried_economy_data', new_day)
+    copy_data([('fetched', observed, 1.5, new_day)], db_connection, target, ECONOMY_DATA_COLUMNS)
+
+    carried = carry_over_series(db_connection, 'test_carried_economy_data', target, new_day, ['fetched', 'failed'])
+    publish_snapshot(db_connection, 'test_carried_economy_data', target, new_day)
+    cur.execute("SELECT ticker_name, values, date_created FROM test_carried_economy_data ORDER BY ticker_name")
+
+    assert carried == 1
+    assert cur.fetchall() == [('failed', 2, new_day), ('fetched', 1.5, new_day)]
+
+    cur.execute("DROP TABLE test_carried_economy_data")
+    db_connection.commit()
+    cur.close()
+
+
+def test_latest_values_and_series_queries(db_connection):
+    """Test that the latest values view and series query pick the newest observation and version."""
+
+    old_day = datetime(year=2023, month=4, day=7).date()
+    new_day = datetime(year=2023, month=4, day=8).date()
+    test_data = [
+        ('test_ticker_1', datetime(year=2023, month=1, day=1), 7, old_day),
+        ('test_ticker_1', datetime(year=2023, month=1, day=1), 7.5, new_day),
+        ('test_ticker_1', datetime(year=2023, month=2, day=1), 8, new_day),
+        ('test_ticker_1', datetime(year=2023, month=3, day=1), None, new_day),
+        ('test_ticker_2', datetime(year=2023, month=1, day=1), 3.8, new_day),
+    ]
+    copy_data(test_data, db_connection, 'test_economy_data', ECONOMY_DATA_COLUMNS)
+
+    create_latest_values_view(db_connection, 'test_economy_data', 'date_created')
+    refresh_latest_values(db_connection, 'test_economy_data')
+
+    assert get_latest_values(db_connection, tickers=['test_ticker_1'], table_name='test_economy_data') == [
+        LatestValue('test_ticker_1', datetime(year=2023, month=2, day=1).date(), 8)
+    ]
+    assert get_series(db_connection, 'test_ticker_1', end=datetime(year=2023, month=2, day=1).date(),
+                      table_name='test_economy_data') == [
+        Observation(datetime(year=2023, month=1, day=1).date(), 7.5),
+        Observation(datetime(year=2023, month=2, day=1).date(), 8),
+    ]
+
+    cur = db_connection.cursor()
+    cur.execute("DROP MATERIALIZED VIEW test_economy_data_latest")
+    cur.execute("DROP INDEX test_economy_data_series_idx")
+    cur.execute("DELETE FROM test_economy_data")
+    db_connection.commit()
+    cur.close()
+
+
+def test_upsert_derived_writes_only_changes(db_connection):
+    """Test that unchanged derived values cost no writes and undefined ones remove the stored value."""
+
+    cur = db_connection.cursor()
+    cur.execute('''
+        CREATE TABLE test_derived_indicators (
+            ticker_name VARCHAR(40) NOT NULL,
+            metric VARCHAR(20) NOT NULL,
+            dates DATE NOT NULL,
+            value FLOAT NOT NULL,
+            date_computed DATE NOT NULL,
+            PRIMARY KEY (ticker_name, metric, dates)
+        )
+    ''')
+
+    first_day = datetime(year=2023, month=4, day=7).date()
+    second_day = datetime(year=2023, month=4, day=8).date()
+    january, february = datetime(year=2023, month=1, day=1).date(), datetime(year=2023, month=2, day=1).date()
+    first_run = [('test_ticker_1', 'yoy', january, 2.5, first_day), ('test_ticker_1', 'yoy', february, 3, first_day)]
+    second_run = [('test_ticker_1', 'yoy', january, 2.5, second_day), ('test_ticker_1', 'yoy', february, None, second_day)]
+
+    assert upsert_derived(first_run, db_connection, table_name='test_derived_indicators') == 2
+    assert upsert_derived(second_run, db_connection, table_name='test_derived_indicators') == 1
+
+    cur.execute("SELECT dates, value, date_computed FROM test_derived_indicators")
+
+    assert cur.fetchall() == [(january, 2.5, first_day)]
+
+    cur.execute("DROP TABLE test_derived_indicators")
+    db_connection.commit()
+    cur.close()
+
+
+def test_shards_are_claimed_once_and_reclaimed_from_dead_workers(db_connection):
+    """Test that a running shard is skipped while its worker lives, and claimed again once it's gone."""
+
+    day = datetime(year=2000, month=1, day=1).date()
+    cur = db_connection.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_shards (
+            run_date DATE NOT NULL,
+            shard INT NOT NULL,
+            sources TEXT[] NOT NULL,
+            target VARCHAR(63),
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            worker VARCHAR(100),
+            attempts INT NOT NULL DEFAULT 0,
+            claimed_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            error TEXT,
+            PRIMARY KEY (run_date, shard)
+        )
+    ''')
+    enqueue_shards(db_connection, day, [(['test_ticker_1'], None), (['test_ticker_2'], None)])
+    db_connection.commit()
+
+    other = Database(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD, port=DB_PORT)
+    other_connection = other.get_connection()
+    first = claim_shard(other_connection, day, worker='first')
+    other_connection.commit()
+
+    second = claim_shard(db_connection, day, worker='second')
+    db_connection.commit()
+
+    assert (first.shard, second.shard) == (0, 1)
+    assert claim_shard(db_connection, day, worker='second') is None
+
+    # the first worker dies, its session and advisory lock go with it
+    other.disconnect()
+    reclaimed = claim_shard(db_connection, day, worker='second')
+    finish_shard(db_connection, reclaimed)
+    db_connection.commit()
+
+    assert (reclaimed.shard, reclaimed.attempts) == (0, 2)
+    assert not publish_run(db_connection, day)
+
+    finish_shard(db_connection, second)
+
+    assert publish_run(db_connection, day)
+
+    cur.execute("DELETE FROM ingest_shards WHERE run_date = %s", (day,))
+    db_connection.commit()
+    cur.close()
+
+
+def test_shard_failing_for_good_drops_its_staging_table(db_connection):
+    """Test that the staging table of a shard is dropped once the shard has failed MAX_SHARD_ATTEMPTS times."""
+
+    day = datetime(year=2000, month=1, day=2).date()
+    cur = db_connection.cursor()
+    cur.execute("CREATE TABLE test_shard_staging (LIKE test_economy_data)")
+    enqueue_shards(db_connection, day, [(['test_ticker_1'], 'test_shard_staging')])
+    db_connection.commit()
+
+    for attempt in range(MAX_SHARD_ATTEMPTS):
+        shard = claim_shard(db_connection, day, worker='worker')
+        finish_shard(db_connection, shard, error=ValueError('bad payload'))
+        db_connection.commit()
+
+    cur.execute("SELECT status FROM ingest_shards WHERE run_date = %s", (day,))
+    assert cur.fetchone() == ('failed',)
+    cur.execute("SELECT to_regclass('test_shard_staging')")
+    assert cur.fetchone() == (None,)
+    assert claim_shard(db_connection, day, worker='worker') is None
+
+    cur.execute("DELETE FROM ingest_shards WHERE run_date = %s", (day,))
+    db_connection.commit()
+    cur.close()
+
+
+def test_search_news_ranks_title_matches_first(db_connection):
+    """Test that search matches stemmed words, ranks title matches above description ones and filters."""
+
+    cur = db_connection.cursor()
+    cur.execute('''
+        CREATE TABLE test_market_news (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            description TEXT,
+            url TEXT,
+            source TEXT,
+            image TEXT,
+            category VARCHAR(20),
+            language VARCHAR(10),
+            country VARCHAR(5),
+            url_hash CHAR(40),
+            date_created DATE NOT NULL,
+            search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            ) STORED
+        )
+    ''')
+
+    old_day = datetime(year=2023, month=4, day=7).date()
+    new_day = datetime(year=2023, month=4, day=8).date()
+    test_data = [
+        ('Markets rally', 'Central banks signal rate cuts', 'url_1', None, None, 'business', 'en', 'us', None, new_day),
+        ('Rate cuts ahead', 'Markets rally', 'url_2', None, None, 'business', 'en', 'us', None, new_day),
+        ('Rate cuts ahead', None, 'url_3', None, None, 'general', 'en', 'us', None, old_day),
+        ('Chip makers report', 'Earnings beat estimates', 'url_4', None, None, 'business', 'en', 'us', None, new_day),
+    ]
+    copy_data(test_data, db_connection, 'test_market_news', MARKET_NEWS_COLUMNS)
+
+    matches = search_news(db_connection, 'cutting rates', table_name='test_market_news')
+
+    assert [match.url for match in matches] == ['url_2', 'url_3', 'url_1']
+    assert matches[0].rank > matches[-1].rank
+    assert [match.url for match in search_news(db_connection, 'rate -rally', category='general',
+                                               table_name='test_market_news')] == ['url_3']
+    assert search_news(db_connection, 'rate', since=new_day, until=new_day, limit=1,
+                       table_name='test_market_news')[0].url == 'url_2'
+
+    cur.execute("DROP TABLE test_market_news")
+    db_connection.commit()
+    cur.close()
@@ -0,0 +1,67 @@
+import zlib
+from src.scripts.dedup import MinHasher, normalize_url, url_hash, drop_near_duplicates
+
+
+def article(title: str, description: str, key: str) -> tuple:
+    return (title, description, f"https://example.com/{key}", 'example', None, 'business', 'en', 'us', key, None)
+
+
+def test_normalize_url_drops_tracking_and_cosmetic_differences():
+    """Test that links to the same article normalize to the same URL."""
+
+    variants = [
+        'https://www.example.com/markets/story-1/',
+        'http://example.com/markets/story-1?utm_source=feed&utm_medium=rss',
+        'HTTPS://EXAMPLE.COM:443/markets/story-1#comments',
+    ]
+
+    assert {normalize_url(url) for url in variants} == {'https://example.com/markets/story-1'}
+
+
+def test_url_hash_keeps_meaningful_query_parameters():
+    """Test that query parameters other than tracking ones still tell articles apart."""
+
+    assert url_hash('https://example.com/story?id=1&page=2') == url_hash('https://example.com/story?page=2&id=1')
+    assert url_hash('https://example.com/story?id=1') != url_hash('https://example.com/story?id=2')
+    assert len(url_hash('https://example.com/story?id=1')) == 40
+
+
+def test_near_duplicates_collapse_to_first_article():
+    """Test that syndicated copies with slightly different text collapse to the first one seen."""
+
+    news = [
+        article('Fed raises interest rates by a quarter point',
+                'Markets rally as inflation cools, the central bank said in Washington on Wednesday.', 'a'),
+        article('Fed raises interest rates by a quarter point.',
+                'Markets rally as inflation cools, the central bank said in Washington Wednesday.', 'b'),
+        article('Apple unveils new iPhone', 'The phone has a longer battery life and a faster chip.', 'c'),
+    ]
+
+    kept, signatures = drop_near_duplicates(news, [])
+
+    assert [row[8] for row in kept] == ['a', 'c']
+    assert [key for key, _ in signatures] == ['a', 'c']
+
+
+def test_articles_similar_to_known_ones_are_dropped():
+    """Test that articles are also compared with the signatures of articles loaded before."""
+
+    first = article('Oil prices jump after supply cut', 'Brent crude rose five percent on Monday.', 'a')
+    _, known = drop_near_duplicates([first], [])
+
+    kept, _ = drop_near_duplicates([article(first[0], first[1], 'b')], known)
+
+    assert kept == []
+
+
+def test_minhash_signature_matches_the_hash_functions():
+    """Test that every position is the minimum of ((a * h + b) mod p) mod 2**32, computed without overflow."""
+
+    hasher = MinHasher(num_perm=16)
+    shingle_set = {'rate cuts', 'cuts ahead', 'central banks'}
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingle_set]
+
+    expected = [min((int(a) * h + int(b)) % 4294967311 % 2 ** 32 for h in hashes)
+                for a, b in zip(hasher._a[:, 0], hasher._b[:, 0])]
+
+    assert hasher.signature(shingle_set).tolist() == expected
@@ -0,0 +1,82 @@
+import numpy as np
+from datetime import date
+from src.scripts.parsing import SeriesBatch
+from src.scripts.derived import compute_derived, shift_months
+
+
+def batch(series: dict) -> SeriesBatch:
+    """Builds a batch from {ticker: (dates, values)}."""
+    tickers, dates, values = [], [], []
+    for ticker, (ticker_dates, ticker_values) in series.items():
+        tickers += [ticker] * len(ticker_dates)
+        dates += ticker_dates
+        values += ticker_values
+    return SeriesBatch(np.array(tickers, dtype=object), np.array(dates, dtype='datetime64[D]'),
+                       np.array(values, dtype=np.float64), date(2023, 4, 7))
+
+
+def monthly(start: str, months: int) -> list:
+    return np.arange(start, np.datetime64(start) + months, dtype='datetime64[M]').astype('datetime64[D]').tolist()
+
+
+def values_of(derived, metric: str) -> dict:
+    return {(ticker, day): value for ticker, name, day, value, _ in derived if name == metric}
+
+
+def test_shift_months_clamps_to_month_end():
+    """Test that shifting by calendar months keeps the day of month where it exists."""
+
+    dates = np.array(['2023-03-31', '2024-03-29', '2023-01-15'], dtype='datetime64[D]')
+
+    assert shift_months(dates, 1).tolist() == [date(2023, 2, 28), date(2024, 2, 29), date(2022, 12, 15)]
+    assert shift_months(dates, -1).tolist() == [date(2023, 4, 30), date(2024, 4, 29), date(2023, 2, 15)]
+
+
+def test_changes_and_rolling_mean_follow_frequency():
+    """Test that YoY uses the observation a year back whatever the frequency, and MoM skips quarterly series."""
+
+    data = batch({
+        'CPIUS': (monthly('2021-01', 14), [100 + i for i in range(14)]),
+        'RGDPUS': ([date(2021, 1, 1), date(2021, 4, 1), date(2021, 7, 1), date(2021, 10, 1), date(2022, 1, 1)],
+                   [1, 2, 3, 4, 2]),
+    })
+
+    derived = compute_derived(data, {'CPIUS': 'M', 'RGDPUS': 'Q'})
+    yoy, mom, mean = values_of(derived, 'yoy'), values_of(derived, 'mom'), values_of(derived, 'mean_12m')
+
+    assert yoy[('CPIUS', date(2022, 1, 1))] == 12
+    assert yoy[('CPIUS', date(2021, 12, 1))] is None
+    assert yoy[('RGDPUS', date(2022, 1, 1))] == 100
+    assert mom[('CPIUS', date(2021, 2, 1))] == 1
+    assert not any(ticker == 'RGDPUS' for ticker, _ in mom)
+    assert mean[('CPIUS', date(2022, 1, 1))] == 106.5
+    assert mean[('RGDPUS', date(2022, 1, 1))] == 2.75
+
+
+def test_zscore_matches_window_statistics():
+    """Test that the z-score equals the standard score over the trailing window, ignoring missing values."""
+
+    rng = np.random.default_rng(7)
+    dates = monthly('2010-01', 120)
+    values = rng.normal(1e6, 10, 120)
+    values[100] = np.nan
+    derived = compute_derived(batch({'CPIUS': (dates, values.tolist())}), {'CPIUS': 'M'},
+                              metrics={'zscore_5y': {'kind': 'zscore', 'months': 60}})
+
+    window = values[59:119][~np.isnan(values[59:119])]
+    expected = (values[118] - window.mean()) / window.std(ddof=1)
+
+    assert np.isclose(values_of(derived, 'zscore_5y')[('CPIUS', dates[118])], expected)
+
+
+def test_touched_points_limit_recomputed_windows():
+    """Test that only points whose window contains a revised observation are returned."""
+
+    data = batch({'CPIUS': (monthly('2020-01', 36), list(range(1, 37))),
+                  'PPIUS': (monthly('2020-01', 36), list(range(1, 37)))})
+
+    derived = compute_derived(data, {'CPIUS': 'M', 'PPIUS': 'M'},
+                              metrics={'yoy': {'kind': 'change', 'months': 12}},
+                              touched={'CPIUS': [date(2021, 6, 1)]})
+
+    assert list(values_of(derived, 'yoy')) == [('CPIUS', day) for day in monthly('2021-06', 13)]
@@ -0,0 +1,122 @@
+import random
+import asyncio
+import aiohttp
+import pytest
+from src.scripts import fetch
+from src.scripts.fetch import Fetcher, _is_retryable
+from src.scripts.utils import HTTPStatusError
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: bytes = b'{}', headers: dict = None) -> None:
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def read(self) -> bytes:
+        return self.body
+
+    async def __aenter__(self) -> 'FakeResponse':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+
+class FakeSession:
+    """Answers every URL with its scripted responses in order, an exception in the script is raised instead."""
+
+    def __init__(self, responses: dict) -> None:
+        self.responses = {url: list(answers) for url, answers in responses.items()}
+        self.requests = []
+
+    def get(self, url: str, headers=None, **options):
+        self.requests.append(url)
+        answer = self.responses[url].pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list:
+    """Records the backoff delays instead of waiting them out."""
+
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(fetch.asyncio, 'sleep', sleep)
+    return delays
+
+
+def test_retryable_errors():
+    """Test that throttling, server errors and network failures are retried, other errors aren't."""
+
+    network_error = ConnectionError('reset')
+    network_error.__cause__ = aiohttp.ClientConnectionError()
+
+    assert _is_retryable(HTTPStatusError('throttled', 429))
+    assert _is_retryable(HTTPStatusError('unavailable', 503))
+    assert _is_retryable(network_error)
+    assert not _is_retryable(HTTPStatusError('not found', 404))
+    assert not _is_retryable(ConnectionError('invalid URL'))
+
+
+def test_backoff_is_jittered_and_capped():
+    """Test that delays stay under the doubling bound and backoff_max, and that Retry-After raises them."""
+
+    fetcher = Fetcher(None, backoff_base=1, backoff_max=4)
+    random.seed(0)
+
+    delays = [fetcher._backoff(attempt, HTTPStatusError('unavailable', 503)) for attempt in range(6)]
+
+    assert all(0 <= delay <= min(4, 2 ** attempt) for attempt, delay in enumerate(delays))
+    assert len(set(delays)) == len(delays)
+    assert fetcher._backoff(0, HTTPStatusError('throttled', 429, retry_after=3)) >= 3
+    assert fetcher._backoff(0, HTTPStatusError('throttled', 429, retry_after=60)) <= 4
+
+
+def test_fetch_retries_until_success_honouring_retry_after(sleeps):
+    """Test that a throttled request waits Retry-After and a failing one is retried until it succeeds."""
+
+    url = 'https://api.example.com/a'
+    session = FakeSession({url: [FakeResponse(429, headers={'Retry-After': '2'}),
+                                 aiohttp.ClientConnectionError('reset'),
+                                 FakeResponse(200, b'{"a": 1}')]})
+
+    result = asyncio.run(Fetcher(session, backoff_base=0).fetch('a', url))
+
+    assert result.ok
+    assert (result.data, result.attempts) == ({'a': 1}, 3)
+    assert sleeps == [2, 0]
+
+
+def test_fetch_gives_up_on_client_errors_and_bad_payloads(sleeps):
+    """Test that client errors and malformed payloads fail on the first attempt."""
+
+    session = FakeSession({'https://api.example.com/missing': [FakeResponse(404)],
+                           'https://api.example.com/broken': [FakeResponse(200, b'{not json')]})
+    fetcher = Fetcher(session)
+
+    missing = asyncio.run(fetcher.fetch('missing', 'https://api.example.com/missing'))
+    broken = asyncio.run(fetcher.fetch('broken', 'https://api.example.com/broken'))
+
+    assert (missing.ok, missing.status, missing.attempts) == (False, 404, 1)
+    assert (broken.ok, broken.attempts) == (False, 1)
+    assert sleeps == []
+
+
+def test_fetch_all_keeps_the_sources_that_succeeded(sleeps):
+    """Test that one source failing after its retries leaves the results of the others in order."""
+
+    session = FakeSession({'https://api.example.com/a': [FakeResponse(500), FakeResponse(500)],
+                           'https://api.example.com/b': [FakeResponse(200, b'{"b": 2}')]})
+
+    results = asyncio.run(Fetcher(session, retries=1, backoff_base=0).fetch_all(
+        {'a': 'https://api.example.com/a', 'b': 'https://api.example.com/b'}))
+
+    assert [(result.source, result.ok, result.attempts) for result in results] == [('a', False, 2), ('b', True, 1)]
+    assert results[0].status == 500
+    assert results[1].data == {'b': 2}
@@ -0,0 +1,60 @@
+import io
+import json
+import asyncio
+from src.metrics import Metrics, span, annotate, increment, traced
+
+
+def test_helpers_do_nothing_without_active_metrics():
+    """Test that instrumented code runs unchanged when no Metrics object is active."""
+
+    with span('stage') as stage:
+        annotate(status=200)
+        increment('rows.parsed', 10)
+
+    assert 'duration_ms' not in stage
+
+
+def test_spans_and_counters_are_emitted_as_one_emf_record():
+    """Test that spans, annotations and counters end up in a single EMF line."""
+
+    metrics = Metrics(dimensions={'Function': 'test'})
+    with metrics.activate():
+        with span('fetch', source='CPIUS'):
+            annotate(status=200)
+            increment('http.bytes', 512, unit='Bytes')
+        with span('fetch', source='GDPUS'):
+            pass
+        increment('rows.parsed', 3)
+
+    stream = io.StringIO()
+    metrics.emit(stream)
+    record = json.loads(stream.getvalue())
+
+    assert record['Function'] == 'test'
+    assert record['http.bytes'] == 512
+    assert record['rows.parsed'] == 3
+    assert record['fetch.duration'] >= 0
+    assert [span_record['source'] for span_record in record['spans']] == ['CPIUS', 'GDPUS']
+    assert record['spans'][0]['status'] == 200
+    names = {definition['Name']: definition['Unit']
+             for definition in record['_aws']['CloudWatchMetrics'][0]['Metrics']}
+    assert names == {'fetch.duration': 'Milliseconds', 'http.bytes': 'Bytes', 'rows.parsed': 'Count'}
+
+
+def test_span_records_errors_and_traced_tasks():
+    """Test that a failing span keeps the error type, and that traced tasks record into the active metrics."""
+
+    metrics = Metrics()
+
+    async def failing():
+        raise ValueError("bad payload")
+
+    async def run():
+        await asyncio.gather(asyncio.create_task(traced('fetch_news', asyncio.sleep(0))),
+                             asyncio.create_task(traced('fetch_economy', failing())), return_exceptions=True)
+
+    with metrics.activate():
+        asyncio.run(run())
+
+    errors = {span_record['name']: span_record.get('error') for span_record in metrics.spans}
+    assert errors == {'fetch_news': None, 'fetch_economy': 'ValueError'}
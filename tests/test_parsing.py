@@ -0,0 +1,45 @@
+from datetime import date
+from src.scripts.parsing import SeriesBatch, parse_series
+from src.scripts.schemas import EconSeries, EconSeriesData
+
+
+def series(ticker: str, dates: list, values: list) -> EconSeries:
+    return EconSeries(ticker=ticker, data=EconSeriesData(dates=dates, values=values))
+
+
+def test_parse_series_replaces_null_values_with_nan():
+    """Test that null values are parsed to NaN and come back as None when iterated."""
+
+    today = date(2023, 4, 7)
+    response = series('CPIUS', ['2023-01-01', '2023-02-01'], [299.17, None])
+
+    batch = parse_series(response, today)
+
+    assert len(batch) == 2
+    assert list(batch) == [('CPIUS', date(2023, 1, 1), 299.17, today), ('CPIUS', date(2023, 2, 1), None, today)]
+
+
+def test_copy_lines_renders_copy_text_format():
+    """Test that the batch renders to COPY text with NULL markers, in chunks."""
+
+    today = date(2023, 4, 7)
+    batch = SeriesBatch.concat([
+        parse_series(series('A', ['2023-01-01'], [1.5]), today),
+        parse_series(series('B', ['2023-01-01'], [None]), today),
+    ], today)
+
+    chunks = list(batch.copy_lines(chunk_rows=1))
+
+    assert chunks == ['A\t2023-01-01\t1.5\t2023-04-07\n', 'B\t2023-01-01\t\\N\t2023-04-07\n']
+
+
+def test_as_of_keeps_observations_up_to_the_day():
+    """Test that a past day's snapshot holds the observations dated up to that day, created on it."""
+
+    batch = parse_series(series('CPIUS', ['2023-01-01', '2023-02-01', '2023-03-01'], [1.0, 2.0, 3.0]),
+                         date(2023, 4, 7))
+
+    assert list(batch.as_of(date(2023, 2, 1))) == [
+        ('CPIUS', date(2023, 1, 1), 1.0, date(2023, 2, 1)),
+        ('CPIUS', date(2023, 2, 1), 2.0, date(2023, 2, 1)),
+    ]
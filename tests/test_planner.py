@@ -0,0 +1,47 @@
+from datetime import date, datetime
+from src.scripts.planner import indicator_decision, plan_backfill
+
+
+MONTHLY = {'symbol': 'CPIUS', 'frequency': 'M'}
+NOW = datetime(2023, 4, 20, 6, 0)
+
+
+def test_never_fetched_indicator_is_due():
+    """Test that an indicator without state is fetched."""
+
+    assert indicator_decision(MONTHLY, None, None, NOW)[0]
+
+
+def test_indicator_fetched_today_is_skipped():
+    """Test that an indicator is fetched at most once a day."""
+
+    assert not indicator_decision(MONTHLY, datetime(2023, 4, 20, 1, 0), date(2023, 1, 1), NOW)[0]
+
+
+def test_indicator_with_expected_observation_is_due():
+    """Test that an indicator is fetched once its next observation may have been published."""
+
+    due, reason = indicator_decision(MONTHLY, datetime(2023, 4, 19), date(2023, 3, 1), NOW)
+
+    assert due
+    assert reason == "new observation expected since 2023-04-01"
+
+
+def test_recently_fetched_indicator_is_skipped_until_refresh():
+    """Test that an up to date indicator is only refetched after refresh_days."""
+
+    assert not indicator_decision(MONTHLY, datetime(2023, 4, 15), date(2023, 4, 1), NOW)[0]
+    assert indicator_decision(MONTHLY, datetime(2023, 4, 12), date(2023, 4, 1), NOW)[0]
+    assert indicator_decision(dict(MONTHLY, refresh_days=3), datetime(2023, 4, 15), date(2023, 4, 1), NOW)[0]
+
+
+def test_backfill_skips_done_days_and_splits_the_rest_into_chunks():
+    """Test that a resumed backfill plans only the missing days, in chunks of consecutive days."""
+
+    done = {'economy': {date(2023, 4, 3)}, 'news': set()}
+    chunks = plan_backfill(['economy', 'news'], date(2023, 4, 1), date(2023, 4, 6), done, chunk_days=2)
+
+    assert [(chunk.source, [day.day for day in chunk.days]) for chunk in chunks] == [
+        ('economy', [1, 2]), ('economy', [4, 5]), ('economy', [6]),
+        ('news', [1, 2]), ('news', [3, 4]), ('news', [5, 6]),
+    ]
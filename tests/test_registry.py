@@ -0,0 +1,78 @@
+import json
+import asyncio
+import pytest
+from aiohttp import web
+from src.scripts.registry import IndicatorRegistry, RegistryError, batched
+from src.scripts import economy_data
+
+
+def test_registry_reads_file_lazily_and_fills_defaults(tmp_path):
+    """Test that file entries get the econdb URL and a frequency, and that blank and comment lines are skipped."""
+
+    path = tmp_path / 'indicators.jsonl'
+    path.write_text('# tracked series\n{"symbol": "CPIUS", "frequency": "M"}\n\n'
+                    '{"symbol": "X", "url": "https://example.com/x"}\n')
+    registry = IndicatorRegistry(str(path))
+
+    indicators = list(registry)
+
+    assert indicators[0]['url'] == 'https://www.econdb.com/api/series/CPIUS/?format=json'
+    assert indicators[1] == {'symbol': 'X', 'url': 'https://example.com/x', 'frequency': 'D'}
+    assert registry.frequencies() == {'CPIUS': 'M', 'X': 'D'}
+
+
+def test_registry_reports_invalid_line(tmp_path):
+    """Test that a malformed entry names its line."""
+
+    path = tmp_path / 'indicators.jsonl'
+    path.write_text('{"symbol": "CPIUS"}\n{"frequency": "M"}\n')
+
+    with pytest.raises(RegistryError, match='indicators.jsonl:2'):
+        list(IndicatorRegistry(str(path)))
+
+
+def test_batched_splits_lazily():
+    """Test that batches are taken from the iterator as they are requested."""
+
+    batches = batched(iter(range(5)), 2)
+
+    assert next(batches) == [0, 1]
+    assert list(batches) == [[2, 3], [4]]
+
+
+def test_batches_are_streamed_from_multi_series_pages(monkeypatch):
+    """Test that multi-series responses and their following pages are parsed into one batch per chunk."""
+
+    requested = []
+
+    async def series(request: web.Request) -> web.Response:
+        requested.append(request.query_string)
+        tickers = request.query['tickers'].strip('[]').split(',')
+        page = int(request.query.get('page', 1))
+        # every response holds one series, the rest of the group comes in following pages
+        following = None
+        if page < len(tickers):
+            following = str(request.url.update_query(page=page + 1))
+        body = {'next': following, 'results': [
+            {'ticker': tickers[page - 1], 'data': {'dates': ['2023-01-01', '2023-02-01'], 'values': [1, 2]}}]}
+        return web.Response(body=json.dumps(body), content_type='application/json')
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/api/series/', series)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        monkeypatch.setattr(economy_data, 'ECONDB_MULTI_SERIES_URL', f"http://127.0.0.1:{port}/api/series/")
+        indicators = [{'symbol': symbol, 'url': economy_data.ECONDB_SERIES_URL.format(symbol=symbol)}
+                      for symbol in ['A', 'B', 'C']]
+        try:
+            return [sorted(set(batch.tickers.tolist())) async for batch in economy_data.iter_indicator_batches(
+                indicators=indicators, batch_size=2, multi_series=True, tickers_per_request=2)]
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == [['A', 'B'], ['C']]
+    assert len(requested) == 3
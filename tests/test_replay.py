@@ -0,0 +1,75 @@
+import os
+import asyncio
+import aiohttp
+import pytest
+from aiohttp import web
+from src.scripts.fetch import Fetcher
+from src.scripts.replay import Recording, RECORD, REPLAY, redact_url
+
+
+def test_redact_url_hides_credentials():
+    """Test that credential query parameters are masked and the others kept."""
+
+    assert redact_url('https://api.example.com/v1/news?access_key=secret&categories=business&limit=100') == \
+        'https://api.example.com/v1/news?access_key=REDACTED&categories=business&limit=100'
+
+
+def test_replay_serves_recorded_responses_and_failures_offline(tmp_path):
+    """Test that a replayed run sees the recorded failures and data in order, without the server."""
+
+    requests = []
+
+    async def news(request: web.Request) -> web.Response:
+        requests.append(request.query_string)
+        if len(requests) == 1:
+            return web.Response(status=503, headers={'Retry-After': '0'})
+        return web.json_response({'data': [{'title': 'Rates'}]})
+
+    async def fetch(mode: str, url: str):
+        with Recording(str(tmp_path), mode).activate():
+            async with aiohttp.ClientSession() as session:
+                return await Fetcher(session, backoff_base=0).fetch('news', url)
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/v1/news', news)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/v1/news?access_key=secret&limit=10"
+        try:
+            recorded = await fetch(RECORD, url)
+        finally:
+            await runner.cleanup()
+        return recorded, await fetch(REPLAY, url)
+
+    recorded, replayed = asyncio.run(run())
+
+    assert len(requests) == 2
+    assert (recorded.data, recorded.attempts) == ({'data': [{'title': 'Rates'}]}, 2)
+    assert (replayed.data, replayed.attempts) == (recorded.data, recorded.attempts)
+    for name in os.listdir(tmp_path):
+        assert b'secret' not in (tmp_path / name).read_bytes()
+
+
+def test_replay_without_recording_fails(tmp_path):
+    """Test that a request missing from the recording fails instead of reaching the network."""
+
+    async def fetch():
+        with Recording(str(tmp_path), REPLAY).activate():
+            async with aiohttp.ClientSession() as session:
+                return await Fetcher(session).fetch('news', 'http://127.0.0.1:1/v1/news')
+
+    result = asyncio.run(fetch())
+
+    assert not result.ok
+    assert result.attempts == 1
+    assert 'No recorded response' in str(result.error)
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    """Test that a misspelled mode is reported rather than silently recording nothing."""
+
+    with pytest.raises(ValueError):
+        Recording(str(tmp_path), 'replay-all')
@@ -0,0 +1,56 @@
+import os
+import time
+from src.scripts.cache import ResponseCache
+
+
+def test_validators_make_response_revalidate(tmp_path):
+    """Test that a response with an ETag is stored but revalidated on next use."""
+
+    cache = ResponseCache(str(tmp_path))
+    cache.put('https://example.com/a', b'{"a": 1}', {'ETag': '"v1"'})
+
+    cached = cache.get('https://example.com/a')
+
+    assert cached.body == b'{"a": 1}'
+    assert not cached.is_fresh()
+    assert cached.conditional_headers() == {'If-None-Match': '"v1"'}
+
+
+def test_response_without_validators_uses_default_ttl(tmp_path):
+    """Test that a response without validators or caching headers stays fresh for default_ttl."""
+
+    cache = ResponseCache(str(tmp_path), default_ttl=60)
+    cache.put('https://example.com/a', b'{}', {})
+
+    assert cache.get('https://example.com/a').is_fresh()
+
+
+def test_refresh_after_not_modified(tmp_path):
+    """Test that a 304 answer keeps the body and takes the new expiry."""
+
+    cache = ResponseCache(str(tmp_path))
+    cached = cache.put('https://example.com/a', b'{}', {'ETag': '"v1"'})
+    cache.refresh('https://example.com/a', cached, {'Cache-Control': 'max-age=60'})
+
+    cached = cache.get('https://example.com/a')
+
+    assert cached.is_fresh()
+    assert cached.etag == '"v1"'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    """Test that the least recently used entry is evicted once max_bytes is exceeded."""
+
+    cache = ResponseCache(str(tmp_path), max_bytes=20)
+    cache.put('https://example.com/a', b'a' * 10, {})
+    cache.put('https://example.com/b', b'b' * 10, {})
+    body_path = cache._paths('https://example.com/a')[1]
+    past = time.time() - 60
+    os.utime(body_path, (past, past))
+    cache.get('https://example.com/b')
+
+    cache.put('https://example.com/c', b'c' * 10, {})
+
+    assert cache.get('https://example.com/a') is None
+    assert cache.get('https://example.com/b') is not None
+    assert cache.get('https://example.com/c') is not None
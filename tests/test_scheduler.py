@@ -0,0 +1,68 @@
+import asyncio
+from src.scheduler import Scheduler
+
+
+def test_jobs_run_on_their_own_intervals():
+    """Test that a fast job keeps refreshing while a slow one waits for its own interval."""
+
+    async def run():
+        scheduler = Scheduler()
+        fast = scheduler.add('fast', 0.01, lambda: asyncio.sleep(0))
+        slow = scheduler.add('slow', 60, lambda: asyncio.sleep(0))
+        asyncio.get_running_loop().call_later(0.1, scheduler.stop)
+        await scheduler.run()
+        return fast.runs, slow.runs
+
+    fast_runs, slow_runs = asyncio.run(run())
+
+    assert fast_runs >= 5
+    assert slow_runs == 1
+
+
+def test_refreshes_never_overlap_and_triggers_are_coalesced():
+    """Test that triggers arriving during a refresh result in a single refresh after it."""
+
+    async def run():
+        scheduler = Scheduler()
+        running, overlaps = [], []
+
+        async def refresh():
+            overlaps.append(bool(running))
+            running.append(True)
+            await asyncio.sleep(0.05)
+            running.pop()
+
+        job = scheduler.add('news', 60, refresh)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.01)
+        for _ in range(3):
+            scheduler.trigger('news')
+        await asyncio.sleep(0.2)
+        scheduler.stop()
+        await task
+        return job.runs, overlaps
+
+    runs, overlaps = asyncio.run(run())
+
+    assert runs == 2
+    assert not any(overlaps)
+
+
+def test_stop_lets_running_refreshes_finish_and_cancels_late_ones():
+    """Test that shutdown waits for refreshes up to the timeout and cancels those still running."""
+
+    async def run():
+        scheduler = Scheduler(shutdown_timeout=0.05)
+        finished = []
+
+        async def refresh(name, duration):
+            await asyncio.sleep(duration)
+            finished.append(name)
+
+        scheduler.add('quick', 60, lambda: refresh('quick', 0.02))
+        scheduler.add('stuck', 60, lambda: refresh('stuck', 10))
+        asyncio.get_running_loop().call_later(0.01, scheduler.stop)
+        await scheduler.run()
+        return finished
+
+    assert asyncio.run(run()) == ['quick']
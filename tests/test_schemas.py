@@ -0,0 +1,40 @@
+import pytest
+from src.scripts.schemas import EconSeries, NewsPage, PayloadError, decode_payload
+
+
+def test_decode_econdb_series():
+    """Test that an econdb payload is decoded into typed fields, ignoring unknown ones."""
+
+    body = b'{"ticker": "CPIUS", "description": "CPI", "data": {"dates": ["2023-01-01"], "values": [299]}}'
+
+    series = decode_payload(body, EconSeries)
+
+    assert series.ticker == 'CPIUS'
+    assert series.data.dates == ['2023-01-01']
+    assert series.data.values == [299]
+
+
+def test_decode_news_page_with_null_fields():
+    """Test that optional mediastack fields may be null."""
+
+    body = b'{"pagination": {}, "data": [{"url": "https://example.com/a", "title": "A", "image": null}]}'
+
+    page = decode_payload(body, NewsPage)
+
+    assert page.data[0].url == 'https://example.com/a'
+    assert page.data[0].image is None
+
+
+@pytest.mark.parametrize('body', [
+    b'{"ticker": "CPIUS"}',
+    b'{"ticker": "CPIUS", "data": {"dates": ["2023-01-01"], "values": ["x"]}}',
+    b'{"error": {"code": "usage_limit_reached"}}',
+    b'not json',
+])
+def test_malformed_payload_is_rejected(body):
+    """Test that payloads not matching the schema raise PayloadError."""
+
+    schema = NewsPage if b'error' in body else EconSeries
+
+    with pytest.raises(PayloadError):
+        decode_payload(body, schema)
@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+import pytest
+from config.settings import ConfigError, load_settings
+from benchmarks.bench_import import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REQUIRED = {'DB_HOST': 'localhost', 'DB_NAME': 'news', 'DB_PORT': '5432', 'DB_USER': 'user', 'DB_PASSWORD': 'secret',
+            'API_KEY': 'key'}
+
+
+def test_settings_defaults_and_parsing():
+    """Test that unset settings get their defaults and set ones are parsed to their types."""
+
+    settings = load_settings({**REQUIRED, 'ECONDB_MULTI_SERIES': 'true', 'INGEST_SHARDS': '4', 'ARCHIVE_ROOT': ''})
+
+    assert settings.db_params == dict(host='localhost', database='news', user='user', password='secret', port=5432)
+    assert settings.econdb_multi_series is True
+    assert settings.ingest_shards == 4
+    assert settings.economy_load_mode == 'snapshot'
+    assert settings.archive_root is None
+
+
+def test_settings_report_every_problem_at_once():
+    """Test that missing and invalid settings are all listed in a single error."""
+
+    environ = {**REQUIRED, 'DB_PORT': 'five', 'ECONOMY_LOAD_MODE': 'full', 'HTTP_POOL_LIMIT': '0',
+               'PROFILE_RUN': 'maybe'}
+    del environ['API_KEY']
+
+    with pytest.raises(ConfigError) as error:
+        load_settings(environ)
+
+    for name in ('API_KEY', 'DB_PORT', 'ECONOMY_LOAD_MODE', 'HTTP_POOL_LIMIT', 'PROFILE_RUN'):
+        assert name in error.value.message
+
+
+def test_importing_main_defers_heavy_modules():
+    """Test that importing the handler needs no settings and loads none of the heavy modules of bench_import."""
+
+    script = f"import sys, main; print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env={'PATH': os.environ.get('PATH', '')},
+                            stdout=subprocess.PIPE, universal_newlines=True, check=True)
+
+    assert result.stdout.strip() == ''